@@ -0,0 +1,5 @@
+"""
+Бенчмарки производительности бота.
+
+Запуск из корня проекта: python -m benchmarks.<имя_скрипта>
+"""
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест бота целиком: синтетические обновления Telegram через Dispatcher.
+
+Генератор строит обновления по сценариям разговоров (текстовый диалог,
+просмотр списков с кнопками category_* и пагинацией, команды) и подает их
+в Dispatcher.feed_update с заданной интенсивностью (поток Пуассона, открытая
+нагрузка). Bot работает на заглушке сессии, LLM - на локальном моке OpenRouter.
+
+В отчете: пропускная способность, p50/p99 по типам обработчиков, доля
+попаданий в кэш, рост памяти и задержка event loop.
+
+Примеры:
+  python -m benchmarks.bench_load
+  python -m benchmarks.bench_load --users 2000 --rate 500 --updates 20000 \\
+      --shape chat=0.5,browse=0.4,commands=0.1 --llm-latency lognormal:0.8,0.4 --rate-429 0.02
+  python -m benchmarks.bench_load --llm-url http://127.0.0.1:8099/api/v1
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+# Приглушаем логи, уводим кэш во временную папку и не пишем трейсы до импорта сервисов
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="bench_cache_"))
+os.environ.setdefault("TRACE_EXPORTER", "none")
+# Лимиты Telegram на заглушке не нужны - меряем сам бот
+for name in ("DELIVERY_GLOBAL_RATE", "DELIVERY_CHAT_RATE", "DELIVERY_CHAT_BURST"):
+    os.environ.setdefault(name, "1000000000")
+
+from aiogram.types import Update  # noqa: E402
+
+from benchmarks.mock_openrouter import MockOpenRouter, ModelProfile  # noqa: E402
+from benchmarks.telegram_stub import callback_update, make_stub_bot, message_update  # noqa: E402
+from src.bot import create_dispatcher  # noqa: E402
+from src.services.llm_service import llm_service  # noqa: E402
+from src.services.pagination_service import encode_callback, pagination_service  # noqa: E402
+from src.utils.loop_watchdog import LoopWatchdog, loop_lag_seconds  # noqa: E402
+from src.utils.metrics import metrics  # noqa: E402
+
+# Задержка обработки по типу обработчика
+handle_seconds = metrics.histogram(
+    "loadtest_handle_seconds", "Время feed_update в нагрузочном тесте", ("handler",)
+)
+
+# Фразы повторяются у разных пользователей - первые сообщения диалога попадают в кэш
+PHRASES = (
+    "Хочу что-то с драками",
+    "Ищу романтическое аниме",
+    "Покажи что-то смешное",
+    "Посоветуй аниме про космос",
+    "Что-нибудь мрачное и взрослое",
+    "Аниме как Ванпанчмен",
+    "Хочу короткий сериал на вечер",
+    "Что посмотреть про спорт",
+)
+FOLLOW_UPS = (
+    "А еще?",
+    "Что-то поновее",
+    "Без романтики",
+    "А из старого?",
+    "Покороче бы",
+)
+CATEGORIES = ("category_top", "category_new", "category_classic", "category_personal")
+COMMANDS = ("/start", "/help", "/top", "/new", "/classic")
+
+# Страницы синтетического списка у каждого пользователя
+LIST_ITEMS = 30
+LIST_PER_PAGE = 3
+
+
+def make_items(count: int) -> List[Dict[str, str]]:
+    """Список аниме для сессий пагинации."""
+    return [
+        {"title": f"Аниме {i}", "year": str(2000 + i % 25), "rating": f"{7 + (i % 30) / 10:.1f}",
+         "description": "Ладно, смотреть можно. " * 4}
+        for i in range(count)
+    ]
+
+
+def parse_shape(spec: str) -> Dict[str, float]:
+    """Веса сценариев из строки вида chat=0.6,browse=0.3,commands=0.1."""
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"неизвестный сценарий: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def chat_scenario(rng: random.Random, turns: int) -> List[str]:
+    """Диалог: сброс истории, популярный запрос и уточнения с растущим контекстом."""
+    steps = ["/reset", rng.choice(PHRASES)]
+    steps.extend(rng.choice(FOLLOW_UPS) for _ in range(turns - 1))
+    return steps
+
+
+def browse_scenario(rng: random.Random, turns: int) -> List[str]:
+    """Просмотр: команда, кнопка категории и листание списка."""
+    steps = ["/top", rng.choice(CATEGORIES)]
+    steps.extend(f"page:{rng.randint(1, 10)}" for _ in range(turns))
+    # Кнопка из старого сообщения в формате page_N
+    steps.append(f"page_{rng.randint(1, 5)}")
+    return steps
+
+
+def commands_scenario(rng: random.Random, turns: int) -> List[str]:
+    """Случайные команды."""
+    return [rng.choice(COMMANDS) for _ in range(turns)]
+
+
+SCENARIOS = {
+    "chat": chat_scenario,
+    "browse": browse_scenario,
+    "commands": commands_scenario,
+}
+
+
+class TrafficGenerator:
+    """Поток обновлений от множества пользователей, каждый идет по своему сценарию."""
+
+    def __init__(self, users: int, shape: Dict[str, float], turns: Tuple[int, int],
+                 sessions: Dict[int, str], seed: int = None):
+        """
+        Args:
+            users: Количество пользователей
+            shape: Веса сценариев разговоров
+            turns: Минимум и максимум шагов в сценарии
+            sessions: Сессия пагинации каждого пользователя
+            seed: Зерно генератора
+        """
+        self.rng = random.Random(seed)
+        self.users = users
+        self.scenarios = list(shape)
+        self.weights = [shape[name] for name in self.scenarios]
+        self.turns = turns
+        self.sessions = sessions
+        self.pending: Dict[int, List[str]] = {}
+        self.update_id = 0
+
+    def next_update(self) -> Tuple[str, dict]:
+        """Следующее обновление и тип обработчика для отчета."""
+        user_id = self.rng.randint(1, self.users)
+        steps = self.pending.get(user_id)
+        if not steps:
+            scenario = self.rng.choices(self.scenarios, self.weights)[0]
+            steps = SCENARIOS[scenario](self.rng, self.rng.randint(*self.turns))
+            self.pending[user_id] = steps
+        step = steps.pop(0)
+
+        self.update_id += 1
+        if step.startswith("page:"):
+            data = encode_callback(self.sessions[user_id], int(step[5:]))
+            return "page", callback_update(self.update_id, user_id, data)
+        if step.startswith("page_"):
+            return "page_legacy", callback_update(self.update_id, user_id, step)
+        if step.startswith("category_"):
+            return "category", callback_update(self.update_id, user_id, step)
+        if step.startswith("/"):
+            return step, message_update(self.update_id, user_id, step)
+        return "text", message_update(self.update_id, user_id, step)
+
+
+def rss_bytes() -> int:
+    """Текущая память процесса (psutil) или пиковая, если psutil не установлен."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def counter_value(name: str, *labels) -> float:
+    """Значение счетчика из реестра метрик (0, если метрики нет)."""
+    metric = metrics.get(name)
+    return metric.labels(*labels).get() if metric is not None else 0.0
+
+
+async def run_load(args, bot) -> Tuple[float, int, int]:
+    """Подать обновления с заданной интенсивностью, вернуть время, число обновлений и ошибок."""
+    dp = create_dispatcher()
+
+    sessions = {}
+    items = make_items(LIST_ITEMS)
+    for user_id in range(1, args.users + 1):
+        state = await pagination_service.create_pagination(user_id, items, LIST_PER_PAGE)
+        sessions[user_id] = state.session_id
+
+    generator = TrafficGenerator(args.users, args.shape, (args.min_turns, args.max_turns),
+                                 sessions, args.seed)
+    arrivals = random.Random(args.seed)
+    errors = 0
+
+    async def process(handler: str, raw: dict) -> None:
+        nonlocal errors
+        update = Update.model_validate(raw, context={"bot": bot})
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception:
+            errors += 1
+        handle_seconds.labels(handler).observe(time.perf_counter() - started)
+
+    tasks = []
+    started = time.perf_counter()
+    next_arrival = started
+    for _ in range(args.updates):
+        next_arrival += arrivals.expovariate(args.rate)
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        handler, raw = generator.next_update()
+        tasks.append(asyncio.create_task(process(handler, raw)))
+
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started, len(tasks), errors
+
+
+def report(args, elapsed: float, count: int, errors: int, memory: Tuple[int, int], mock) -> None:
+    """Напечатать итоговый отчет."""
+    print(f"📊 Нагрузочный тест: {count} обновлений, {args.users} пользователей, "
+          f"целевая интенсивность {args.rate:g}/с")
+    print("=" * 72)
+    print(f"Пропускная способность: {count / elapsed:8.1f} обновлений/с за {elapsed:.1f} с, ошибок: {errors}")
+    print()
+    print(f"{'обработчик':<14} {'n':>7} {'p50, мс':>10} {'p99, мс':>10} {'max, мс':>10}")
+    for (handler,), child in sorted(handle_seconds._children.items()):
+        print(f"{handler:<14} {child.count:>7} {child.quantile(0.5) * 1000:>10.1f} "
+              f"{child.quantile(0.99) * 1000:>10.1f} {child.max * 1000:>10.1f}")
+    print()
+
+    hits = counter_value("cache_lookups_total", "hit")
+    lookups = hits + counter_value("cache_lookups_total", "miss") + counter_value("cache_lookups_total", "expired")
+    ratio = hits / lookups if lookups else 0.0
+    print(f"Кэш LLM ответов: {ratio:.1%} попаданий ({hits:.0f} из {lookups:.0f})")
+
+    lag = loop_lag_seconds.labels()
+    print(f"Задержка event loop: p50 {lag.quantile(0.5) * 1000:.1f} мс, "
+          f"p99 {lag.quantile(0.99) * 1000:.1f} мс, max {lag.max * 1000:.1f} мс")
+
+    before, after = memory
+    stats = pagination_service.get_stats()
+    print(f"Память: {before / 1024 / 1024:.1f} -> {after / 1024 / 1024:.1f} МБ "
+          f"(рост {(after - before) / 1024 / 1024:+.1f} МБ); пагинация: {stats['sessions']} сессий, "
+          f"~{stats['total_bytes'] / 1024:.0f} КБ")
+    if mock is not None:
+        print(f"Запросы к моку LLM: {mock.stats.requests} {mock.stats.by_outcome}")
+
+
+async def main():
+    """Точка входа нагрузочного теста."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500, help="количество пользователей")
+    parser.add_argument("--rate", type=float, default=200, help="обновлений в секунду")
+    parser.add_argument("--updates", type=int, default=5000, help="всего обновлений")
+    parser.add_argument("--shape", type=parse_shape, default=parse_shape("chat=0.5,browse=0.35,commands=0.15"),
+                        help="веса сценариев: chat, browse, commands")
+    parser.add_argument("--min-turns", type=int, default=2, help="минимум шагов в сценарии")
+    parser.add_argument("--max-turns", type=int, default=6, help="максимум шагов в сценарии")
+    parser.add_argument("--send-ms", type=float, default=0, help="задержка Bot API на заглушке")
+    parser.add_argument("--llm-url", help="внешний мок OpenRouter вместо встроенного")
+    parser.add_argument("--llm-latency", default="lognormal:0.3,0.5", help="задержка встроенного мока")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="доля 429 у встроенного мока")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="доля 5xx у встроенного мока")
+    parser.add_argument("--seed", type=int, default=1, help="зерно генераторов")
+    args = parser.parse_args()
+
+    mock = None
+    if args.llm_url:
+        base_url = args.llm_url
+    else:
+        mock = MockOpenRouter(default=ModelProfile(
+            latency=args.llm_latency, rate_429=args.rate_429, rate_5xx=args.rate_5xx, retry_after=0
+        ), seed=args.seed)
+        await mock.start()
+        base_url = mock.base_url
+    llm_service.client = llm_service.client.with_options(base_url=base_url, api_key="loadtest")
+
+    bot = make_stub_bot(send_latency=args.send_ms / 1000)
+    # Порог выше обычного: под нагрузкой стеки каждого зависания только засоряют вывод
+    watchdog = LoopWatchdog(interval=0.01, threshold=1.0)
+    await watchdog.start()
+    memory_before = rss_bytes()
+    try:
+        elapsed, count, errors = await run_load(args, bot)
+    finally:
+        await watchdog.stop()
+        if mock is not None:
+            await mock.stop()
+    report(args, elapsed, count, errors, (memory_before, rss_bytes()), mock)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Микробенчмарк стоимости записи метрик (цель - меньше ~1 мкс на событие)"""
+
+import argparse
+import sys
+import time
+
+from src.utils.metrics import MetricsRegistry
+
+
+def measure(name: str, operation, iterations: int) -> float:
+    """Выполняет операцию iterations раз и возвращает наносекунды на вызов."""
+    # Прогрев: создание бакетов и дочерних значений не входит в замер
+    for _ in range(1000):
+        operation()
+
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        operation()
+    elapsed = time.perf_counter_ns() - started
+
+    # Вычитаем стоимость пустого цикла с вызовом функции
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        _empty()
+    overhead = time.perf_counter_ns() - started
+
+    ns_per_op = max(elapsed - overhead, 0) / iterations
+    print(f"{name:<40} {ns_per_op:8.0f} нс")
+    return ns_per_op
+
+
+def _empty():
+    return None
+
+
+def main():
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=1_000_000, help="вызовов на операцию")
+    parser.add_argument("--max-ns", type=float, default=1000, help="порог стоимости записи события")
+    parser.add_argument("--series", type=int, default=1000, help="рядов для замера экспорта")
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    counter = registry.counter("bench_total", "bench")
+    labeled = registry.counter("bench_labeled_total", "bench", ("model", "outcome"))
+    gauge = registry.gauge("bench_gauge", "bench")
+    histogram = registry.histogram("bench_seconds", "bench")
+    labeled_histogram = registry.histogram("bench_labeled_seconds", "bench", ("model", "outcome"))
+    child = labeled_histogram.labels("gpt", "ok")
+
+    values = [i * 0.000137 % 3.0 for i in range(1024)]
+    position = [0]
+
+    def next_value() -> float:
+        position[0] = (position[0] + 1) & 1023
+        return values[position[0]]
+
+    print(f"📊 Запись метрик: {args.iterations} вызовов на операцию")
+    print("=" * 50)
+    results = {
+        "counter.inc()": measure("counter.inc()", counter.inc, args.iterations),
+        "counter.labels().inc()": measure(
+            "counter.labels(model, outcome).inc()",
+            lambda: labeled.labels("gpt", "ok").inc(), args.iterations
+        ),
+        "gauge.set()": measure("gauge.set()", lambda: gauge.set(1.0), args.iterations),
+        "histogram.observe()": measure(
+            "histogram.observe()", lambda: histogram.observe(0.0421), args.iterations
+        ),
+        "labels().observe()": measure(
+            "histogram.labels(...).observe()",
+            lambda: labeled_histogram.labels("gpt", "ok").observe(0.0421), args.iterations
+        ),
+        "observe(разные значения)": measure(
+            "child.observe(разные значения)",
+            lambda: child.observe(next_value()), args.iterations
+        ),
+        "with histogram.time()": measure("with histogram.time()", lambda: _timed(histogram), args.iterations),
+    }
+
+    # Экспорт не на горячем пути, но должен оставаться дешевым при многих рядах
+    many = registry.histogram("bench_many_seconds", "bench", ("series",))
+    for series in range(args.series):
+        for value in values[:64]:
+            many.labels(series).observe(value)
+    started = time.perf_counter()
+    text = registry.render()
+    render_ms = (time.perf_counter() - started) * 1000
+    print("=" * 50)
+    print(f"render(): {render_ms:.1f} мс, {len(text.splitlines())} строк, {args.series} рядов гистограммы")
+
+    p99 = child.quantile(0.99)
+    print(f"p99 по гистограмме: {p99:.4f} с (точное значение ~{sorted(values)[int(len(values) * 0.99)]:.4f} с)")
+
+    slow = {name: ns for name, ns in results.items() if ns > args.max_ns}
+    if slow:
+        print(f"❌ Дороже {args.max_ns:.0f} нс: {', '.join(slow)}")
+        sys.exit(1)
+    print(f"✅ Все операции дешевле {args.max_ns:.0f} нс")
+
+
+def _timed(histogram) -> None:
+    with histogram.time():
+        pass
+
+
+if __name__ == "__main__":
+    main()
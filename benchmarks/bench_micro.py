@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарки сервисов и утилит сообщений с порогами регрессии.
+
+Каждый случай калибруется на --min-time секунд, повторяется --repeat раз,
+в зачет идет лучший повтор (как в timeit: шум только замедляет). Результаты можно сохранить как
+базовую линию и сравнивать с ней на следующих коммитах: случай считается
+регрессией, если он медленнее базовой линии больше чем в threshold раз
+(порог общий или свой у случая в файле базовой линии).
+
+Перед каждым случаем меряется эталонная нагрузка на чистом Python, и
+отношение к базовой линии делится на отношение эталонов. Так сравнение
+переживает разную частоту процессора и шумных соседей на общих машинах.
+
+Примеры:
+  python -m benchmarks.bench_micro                       - сравнить с базовой линией
+  python -m benchmarks.bench_micro --save                - обновить базовую линию
+  python -m benchmarks.bench_micro --filter cache --min-time 0.5
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Union
+
+# Приглушаем логи, уводим кэш во временную папку и не пишем трейсы до импорта сервисов
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="bench_cache_"))
+os.environ.setdefault("TRACE_EXPORTER", "none")
+
+from src.services.cache_service import CacheService  # noqa: E402
+from src.services.catalog_service import CatalogService, parse_catalog_query  # noqa: E402
+from src.services.intent_service import IntentClassifier  # noqa: E402
+from src.services.pagination_service import PaginationService  # noqa: E402
+from src.services.user_state_service import UserStateService  # noqa: E402
+from src.utils.message_utils import (  # noqa: E402
+    format_anime_list,
+    split_long_message,
+    truncate_message,
+)
+
+BASELINE_FILE = Path(__file__).parent / "baselines" / "micro.json"
+DEFAULT_THRESHOLD = 1.3
+
+Operation = Callable[[], Union[Any, Awaitable[Any]]]
+
+# Реестр случаев: имя -> фабрика (async), возвращающая операцию
+CASES: Dict[str, Callable[[], Awaitable[Tuple[Operation, bool]]]] = {}
+
+
+def case(name: str):
+    """Зарегистрировать фабрику случая (возвращает операцию и флаг async)."""
+    def decorator(factory):
+        CASES[name] = factory
+        return factory
+    return decorator
+
+
+def make_cache(entries: int) -> CacheService:
+    """Кэш с заданным числом свежих записей в собственной временной папке."""
+    cache = CacheService()
+    cache.cache_dir = Path(tempfile.mkdtemp(prefix="bench_cache_"))
+    cache.cache_file = cache.cache_dir / "llm_cache.json"
+    cache.cache = {}
+    now = int(time.time())
+    for i in range(entries):
+        query = f"запрос номер {i}"
+        cache.cache[cache._generate_hash(query)] = {
+            "query": query,
+            "response": "Ладно, посмотри Ванпанчмен. " * 8,
+            "timestamp": now,
+            "model": "openai/gpt-3.5-turbo",
+        }
+    return cache
+
+
+def make_items(count: int) -> List[Dict[str, str]]:
+    """Список аниме с описаниями."""
+    return [
+        {"title": f"Аниме {i}", "year": str(2000 + i % 25), "rating": f"{7 + (i % 30) / 10:.1f}",
+         "description": "Ладно, смотреть можно, но ничего особенного. " * 3}
+        for i in range(count)
+    ]
+
+
+def _register_cache_cases(size: int, label: str) -> None:
+    @case(f"cache.get_hit[{label}]")
+    async def get_hit():
+        cache = make_cache(size)
+        query = f"запрос номер {size // 2}"
+        return (lambda: cache.get_cached_response(query)), True
+
+    @case(f"cache.get_miss[{label}]")
+    async def get_miss():
+        cache = make_cache(size)
+        return (lambda: cache.get_cached_response("такого запроса нет")), True
+
+    @case(f"cache.save[{label}]")
+    async def save():
+        cache = make_cache(size)
+        return (lambda: cache.save_response("новый запрос", "ответ", "model")), True
+
+    @case(f"cache.load[{label}]")
+    async def load():
+        cache = make_cache(size)
+        cache._save_cache()
+        return cache._load_cache, False
+
+
+for _size, _label in ((1_000, "1k"), (100_000, "100k")):
+    _register_cache_cases(_size, _label)
+
+
+def _register_context_case(history: int) -> None:
+    @case(f"user_state.get_context[{history}]")
+    async def get_context():
+        service = UserStateService()
+        for i in range(history):
+            role = "user" if i % 2 == 0 else "assistant"
+            await service.add_message_to_history(1, role, f"Сообщение {i}. " + "Текст диалога. " * 10)
+        return (lambda: service.get_conversation_context(1)), True
+
+
+for _history in (100, 10_000):
+    _register_context_case(_history)
+
+
+def _register_pagination_cases(items: int, per_page: int) -> None:
+    label = f"{items}x{per_page}"
+
+    @case(f"pagination.get_page[{label}]")
+    async def get_page():
+        service = PaginationService()
+        state = await service.create_pagination(1, make_items(items), per_page)
+        pages = state.total_pages
+        counter = iter(range(10 ** 9))
+        return (lambda: service.get_page(state.session_id, 1 + next(counter) % pages)), True
+
+    @case(f"pagination.build_keyboard[{label}]")
+    async def build_keyboard():
+        service = PaginationService()
+        state = await service.create_pagination(1, make_items(items), per_page)
+        pages = state.total_pages
+        return (lambda: service._build_keyboard(state.session_id, pages // 2 or 1, pages)), False
+
+
+for _items, _per_page in ((30, 3), (300, 10)):
+    _register_pagination_cases(_items, _per_page)
+
+
+@case("message.truncate[100KB]")
+async def truncate_large():
+    text = "Ладно, это предложение. " * 4300
+    return (lambda: truncate_message(text)), False
+
+
+@case("message.split[100KB]")
+async def split_large():
+    text = "\n".join(f"{i}. Строка ответа про аниме, ничего особенного." for i in range(2200))
+    return (lambda: split_long_message(text)), False
+
+
+@case("message.split_no_newlines[100KB]")
+async def split_single_line():
+    text = "x" * 100_000
+    return (lambda: split_long_message(text)), False
+
+
+@case("message.format_anime_list[1000]")
+async def format_list():
+    items = make_items(1000)
+    return (lambda: format_anime_list(items, "top")), False
+
+
+@case("catalog.answer[filter]")
+async def catalog_answer():
+    catalog = CatalogService()
+    await catalog.load()
+    return (lambda: catalog.answer("аниме про спорт 2010-х")), False
+
+
+@case("catalog.parse[open]")
+async def catalog_parse_open():
+    return (lambda: parse_catalog_query("посоветуй что-нибудь похожее на Стальной алхимик")), False
+
+
+@case("intent.classify[model]")
+async def intent_classify():
+    classifier = IntentClassifier()
+    await classifier.load()
+    return (lambda: classifier.classify("покажи что нибудь новое")), False
+
+
+def reference_workload() -> int:
+    """Эталонная нагрузка: словари, строки и арифметика на чистом Python."""
+    table = {f"ключ {i}": i for i in range(500)}
+    return sum(len(key) + value for key, value in table.items())
+
+
+async def measure(operation: Operation, is_async: bool, min_time: float, repeat: int) -> Tuple[float, float]:
+    """
+    Измерить время одной операции.
+
+    Returns:
+        Медиана и минимум по повторам, наносекунды на операцию
+    """
+    async def run(iterations: int) -> float:
+        started = time.perf_counter_ns()
+        if is_async:
+            for _ in range(iterations):
+                await operation()
+        else:
+            for _ in range(iterations):
+                operation()
+        return (time.perf_counter_ns() - started) / iterations
+
+    # Как в timeit: сборщик мусора не должен срабатывать посреди замера
+    gc.collect()
+    gc.disable()
+    try:
+        # Калибровка: сколько итераций занимают min_time
+        single = await run(1)
+        iterations = max(1, int(min_time * 1e9 / max(single, 1)))
+        samples = [await run(iterations) for _ in range(repeat)]
+    finally:
+        gc.enable()
+    return statistics.median(samples), min(samples)
+
+
+def load_baseline(path: Path) -> Dict[str, Any]:
+    """Базовая линия из файла или пустая, если файла нет."""
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: Path, results: Dict[str, Dict[str, float]], previous: Dict[str, Any],
+                  threshold: float) -> None:
+    """Сохранить результаты как базовую линию (свои пороги случаев сохраняются)."""
+    old_results = previous.get("results", {})
+    data = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "threshold": previous.get("threshold", threshold),
+        "results": {},
+    }
+    for name, result in results.items():
+        entry = {key: round(value, 1) for key, value in result.items()}
+        if "threshold" in old_results.get(name, {}):
+            entry["threshold"] = old_results[name]["threshold"]
+        data["results"][name] = entry
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def format_ns(value: float) -> str:
+    """Время в удобных единицах."""
+    for unit, scale in (("с", 1e9), ("мс", 1e6), ("мкс", 1e3)):
+        if value >= scale:
+            return f"{value / scale:.2f} {unit}"
+    return f"{value:.0f} нс"
+
+
+async def main() -> int:
+    """Точка входа бенчмарка (код возврата 1 при регрессии)."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="запускать только случаи с этой подстрокой")
+    parser.add_argument("--min-time", type=float, default=0.2, help="длительность одного повтора, секунды")
+    parser.add_argument("--repeat", type=int, default=5, help="количество повторов")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE, help="файл базовой линии")
+    parser.add_argument("--save", action="store_true", help="сохранить результаты как базовую линию")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help=f"допустимое замедление, раз (по умолчанию из файла или {DEFAULT_THRESHOLD})")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    threshold = args.threshold or baseline.get("threshold", DEFAULT_THRESHOLD)
+    baseline_results = baseline.get("results", {})
+
+    print(f"📊 Микробенчмарки (повтор {args.min_time:g} с x {args.repeat}, порог x{threshold:g})")
+    print("=" * 86)
+    print(f"{'случай':<40} {'медиана':>11} {'минимум':>11} {'база':>11} {'x':>6}")
+
+    results: Dict[str, Dict[str, float]] = {}
+    regressions = []
+    for name, factory in CASES.items():
+        if args.filter not in name:
+            continue
+        _, reference = await measure(reference_workload, False, args.min_time / 4, 3)
+        operation, is_async = await factory()
+        median, minimum = await measure(operation, is_async, args.min_time, args.repeat)
+        results[name] = {"ns_per_op": minimum, "reference_ns": reference}
+
+        base = baseline_results.get(name)
+        ratio_text, base_text, mark = "", "-", ""
+        if base:
+            ratio = minimum / base["ns_per_op"]
+            if base.get("reference_ns"):
+                ratio /= reference / base["reference_ns"]
+            case_threshold = base.get("threshold", threshold)
+            ratio_text = f"{ratio:.2f}"
+            base_text = format_ns(base["ns_per_op"])
+            if ratio > case_threshold:
+                mark = "  ❌"
+                regressions.append((name, ratio, case_threshold))
+        print(f"{name:<40} {format_ns(median):>11} {format_ns(minimum):>11} {base_text:>11} {ratio_text:>6}{mark}")
+
+    if args.save:
+        if args.filter:
+            # Частичный прогон дополняет базовую линию, а не заменяет ее
+            merged = {key: {field: value[field] for field in ("ns_per_op", "reference_ns") if field in value}
+                      for key, value in baseline_results.items()}
+            merged.update(results)
+            results = merged
+        save_baseline(args.baseline, results, baseline, threshold)
+        print(f"\n💾 Базовая линия сохранена: {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"\n❌ Регрессии: {len(regressions)}")
+        for name, ratio, case_threshold in regressions:
+            print(f"  {name}: x{ratio:.2f} (порог x{case_threshold:g})")
+        return 1
+    if baseline_results:
+        print("\n✅ Регрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
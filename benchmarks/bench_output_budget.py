@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк адаптивного лимита длины ответа (max_tokens) против фиксированного.
+
+Мок OpenRouter генерирует ответы с длиной из распределения (--tokens) и
+временем на токен (--token-seconds), часть ответов "заговаривается" до
+max_tokens (--runaway). Один и тот же поток запросов прогоняется дважды:
+с фиксированным потолком класса (OUTPUT_BUDGET_ENABLED=false) и с лимитом
+по квантилю фактических длин. Обрезанные ответы в обоих режимах
+дозапрашиваются продолжением.
+
+В отчете: сгенерировано токенов (с продолжениями), задержка p50/p99,
+доля обрезанных ответов, итоговый лимит и экономия токенов и времени.
+
+Примеры:
+  python -m benchmarks.bench_output_budget
+  python -m benchmarks.bench_output_budget --requests 2000 --tokens lognormal:120,0.6 --runaway 0.01
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# Приглушаем логи и не пишем трейсы до импорта сервисов
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="bench_cache_"))
+os.environ.setdefault("TRACE_EXPORTER", "none")
+
+from benchmarks.mock_openrouter import CHARS_PER_TOKEN, MockOpenRouter, ModelProfile  # noqa: E402
+from src.services.llm_service import llm_service  # noqa: E402
+from src.services.model_router import (  # noqa: E402
+    ROUTE_RECOMMENDATION, ModelRouter, default_routes, output_truncated
+)
+from src.utils.config import config  # noqa: E402
+
+MODEL = "mock/model"
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по отсортированной выборке."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(mock: MockOpenRouter, adaptive: bool, args) -> Dict[str, float]:
+    """Прогон потока запросов в одном режиме."""
+    config.OUTPUT_BUDGET_ENABLED = adaptive
+    routes = default_routes()
+    routes[ROUTE_RECOMMENDATION].max_tokens = args.ceiling
+    llm_service.router = ModelRouter([MODEL], routes, seed=args.seed)
+    llm_service.model_failures.clear()
+    mock.rng.seed(args.seed)
+    messages = [{"role": "user", "content": "посоветуй аниме"}]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one() -> tuple:
+        async with semaphore:
+            started = time.perf_counter()
+            response, _ = await llm_service._make_api_request(messages, route=ROUTE_RECOMMENDATION)
+            return time.perf_counter() - started, len(response) // CHARS_PER_TOKEN
+
+    # Прогрев: лимит успевает подстроиться, в отчет не входит
+    await asyncio.gather(*(one() for _ in range(args.warmup)))
+    truncated = output_truncated.labels(ROUTE_RECOMMENDATION)
+    truncated_before = truncated.get()
+    results = await asyncio.gather(*(one() for _ in range(args.requests)))
+    latencies = [latency for latency, _ in results]
+    return {
+        "tokens": sum(count for _, count in results),
+        "p50": statistics.median(latencies),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies),
+        "mean": statistics.mean(latencies),
+        "truncated": (truncated.get() - truncated_before) / args.requests,
+        "cap": llm_service.router.budgets[ROUTE_RECOMMENDATION].cap,
+    }
+
+
+async def main_async(args) -> int:
+    profile = ModelProfile(
+        latency=f"fixed:{args.latency}", response_tokens=args.tokens,
+        token_seconds=args.token_seconds, rate_runaway=args.runaway,
+    )
+    llm_service.retry_delays = 0.01
+    async with MockOpenRouter(default=profile, seed=args.seed) as mock:
+        llm_service.client = llm_service.client.with_options(base_url=mock.base_url, api_key="bench", max_retries=0)
+        fixed = await run(mock, False, args)
+        adaptive = await run(mock, True, args)
+
+    print(f"📊 Лимит длины ответа: {args.requests} запросов, длина {args.tokens} токенов, "
+          f"{args.token_seconds * 1000:g} мс/токен, заговорившихся {args.runaway:.1%}")
+    print("=" * 72)
+    print(f"{'режим':<14} {'max_tokens':>10} {'обрезано':>9} {'токенов':>9} {'p50, с':>8} "
+          f"{'p99, с':>8} {'max, с':>8} {'среднее, с':>11}")
+    for label, result in (("фиксированный", fixed), ("адаптивный", adaptive)):
+        print(f"{label:<14} {result['cap']:>10} {result['truncated']:>9.1%} {result['tokens']:>9} "
+              f"{result['p50']:>8.3f} {result['p99']:>8.3f} {result['max']:>8.3f} {result['mean']:>11.3f}")
+    saved_tokens = fixed["tokens"] - adaptive["tokens"]
+    saved_seconds = (fixed["mean"] - adaptive["mean"]) * args.requests
+    print(f"\nЭкономия: {saved_tokens} токенов ({saved_tokens / max(fixed['tokens'], 1):.1%}), "
+          f"{saved_seconds:.1f} с суммарного ожидания, max x{fixed['max'] / max(adaptive['max'], 1e-9):.2f}")
+    return 0
+
+
+def main() -> int:
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="запросов в замере")
+    parser.add_argument("--warmup", type=int, default=200, help="запросов прогрева")
+    parser.add_argument("--tokens", default="lognormal:120,0.5", help="распределение длины ответа, токены")
+    parser.add_argument("--token-seconds", type=float, default=0.005, help="время генерации токена")
+    parser.add_argument("--runaway", type=float, default=0.005, help="доля ответов до max_tokens")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка до первого токена")
+    parser.add_argument("--ceiling", type=int, default=1000, help="потолок max_tokens класса")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    return asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Микробенчмарк задержки обработки кнопок пагинации при конкурентных нажатиях"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+
+# Приглушаем логи и уводим кэш во временную папку до импорта сервисов
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="bench_cache_"))
+# Лимиты Telegram на заглушке не нужны - меряем сам бот
+for name in ("DELIVERY_GLOBAL_RATE", "DELIVERY_CHAT_RATE", "DELIVERY_CHAT_BURST"):
+    os.environ.setdefault(name, "1000000000")
+
+from src.handlers.start import handle_pagination_callback  # noqa: E402
+from src.services.pagination_service import (  # noqa: E402
+    encode_callback,
+    pagination_service,
+)
+
+
+async def _noop(*args, **kwargs):
+    """Заглушка методов Telegram API."""
+    return None
+
+
+def make_callback(user_id: int, data: str) -> SimpleNamespace:
+    """Создает заглушку CallbackQuery с нужными полями."""
+    return SimpleNamespace(
+        from_user=SimpleNamespace(id=user_id, first_name="bench"),
+        data=data,
+        answer=_noop,
+        message=SimpleNamespace(
+            chat=SimpleNamespace(id=user_id),
+            message_id=1,
+            bot=SimpleNamespace(send_message=_noop),
+            edit_text=_noop,
+        ),
+    )
+
+
+def make_items(count: int) -> list:
+    """Генерирует список аниме для пагинации."""
+    return [
+        {
+            "title": f"Аниме {i}",
+            "year": 2000 + i % 25,
+            "rating": f"{7 + (i % 30) / 10:.1f}",
+            "description": "Ладно, смотреть можно. " * 4,
+        }
+        for i in range(count)
+    ]
+
+
+async def run_clicks(sessions: list, clicks: int, pages: int, drop_cache: bool) -> list:
+    """Запускает конкурентные нажатия и возвращает задержки в микросекундах."""
+    latencies = []
+
+    async def click(user_id: int, page: int):
+        session_id = sessions[user_id]
+        if drop_cache:
+            pagination_service.drop_rendered(session_id)
+        started = time.perf_counter()
+        await handle_pagination_callback(
+            make_callback(user_id, encode_callback(session_id, page))
+        )
+        latencies.append((time.perf_counter() - started) * 1_000_000)
+
+    for _ in range(clicks):
+        await asyncio.gather(*(
+            click(user_id, 1 + (user_id + len(latencies)) % pages)
+            for user_id in range(len(sessions))
+        ))
+
+    return latencies
+
+
+def report(name: str, latencies: list) -> None:
+    """Печатает p50/p99 задержки."""
+    ordered = sorted(latencies)
+    p50 = statistics.median(ordered)
+    p99 = ordered[int(len(ordered) * 0.99) - 1]
+    print(f"{name:<28} n={len(ordered):<7} p50={p50:8.1f} мкс  p99={p99:8.1f} мкс")
+
+
+async def main():
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--clicks", type=int, default=50)
+    parser.add_argument("--items", type=int, default=30)
+    parser.add_argument("--per-page", type=int, default=3)
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    sessions = []
+    for user_id in range(args.users):
+        state = await pagination_service.create_pagination(user_id, items, args.per_page)
+        sessions.append(state.session_id)
+    pages = state.total_pages
+
+    print("📊 Задержка обработки page_N при конкурентных нажатиях")
+    print("=" * 70)
+    report("без кэша (отрисовка)", await run_clicks(sessions, args.clicks, pages, True))
+    report("с кэшем страниц", await run_clicks(sessions, args.clicks, pages, False))
+    stats = pagination_service.get_stats()
+    print(f"Сессий: {stats['sessions']}, ~{stats['total_bytes'] / 1024:.0f} КБ, "
+          f"общих записей: {stats['pooled_items']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска кандидатов в каталоге (BM25) и размера промпта.
+
+Каталог размножается до --titles синтетических тайтлов (слова названий,
+жанры и теги берутся из встроенного каталога), строится индекс и
+меряется время ранжирования набора открытых запросов: p50/p99/max.
+
+Второй раздел - размер промпта в токенах (оценка по словам, без
+токенизатора модели): без каталога, с top-k кандидатами и с целым
+встроенным каталогом в промпте, как если бы модель выбирала из всего списка.
+
+Примеры:
+  python -m benchmarks.bench_retrieval
+  python -m benchmarks.bench_retrieval --titles 200000 --top-k 5
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+# Приглушаем логи и не пишем трейсы до импорта сервисов
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="bench_cache_"))
+os.environ.setdefault("TRACE_EXPORTER", "none")
+
+from src.services.catalog_service import CATALOG_FILE, CatalogService, query_terms  # noqa: E402
+from src.utils.bm25 import BM25_AVAILABLE  # noqa: E402
+from src.utils.prompts import RETRIEVAL_PROMPT, SYSTEM_PROMPT  # noqa: E402
+
+QUERIES = [
+    "посоветуй что-то похожее на Атаку титанов",
+    "хочу мрачное аниме про вампиров и детектив",
+    "что-нибудь как Стальной алхимик, но короче",
+    "аниме про космос и войну с роботами",
+    "смешное про школу и любовь",
+    "расскажи про Ванпанчмен",
+    "грустное аниме чтобы поплакать",
+    "фэнтези про магию и путешествия",
+    "что-то про спорт и дружбу, можно старое",
+    "психологический триллер с загадками",
+    "аниме про самураев и историю Японии",
+    "лучшие фильмы Миядзаки",
+]
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценка числа токенов: слово - токен на каждые 4 символа, знак - токен."""
+    return sum(max(1, math.ceil(len(token) / 4)) for token in _TOKEN_RE.findall(text))
+
+
+def synthetic_records(base: List[Dict[str, Any]], count: int, seed: int) -> List[Dict[str, Any]]:
+    """Синтетический каталог: встроенные записи плюс комбинации их слов и признаков."""
+    rng = random.Random(seed)
+    words = sorted({word for record in base for word in record["title"].split() if len(word) > 2})
+    genres = sorted({genre for record in base for genre in record["genres"]})
+    tags = sorted({tag for record in base for tag in record["tags"]})
+    records = list(base)
+    while len(records) < count:
+        kind = rng.choice(("tv", "tv", "tv", "movie", "ova"))
+        records.append({
+            "title": " ".join(rng.sample(words, rng.randint(1, 4))) + f" {len(records)}",
+            "synonyms": [],
+            "year": rng.randint(1970, 2025),
+            "rating": round(rng.uniform(5.0, 9.0), 2),
+            "episodes": 1 if kind == "movie" else rng.choice((6, 12, 13, 24, 26, 50, 100)),
+            "kind": kind,
+            "genres": rng.sample(genres, rng.randint(1, 4)),
+            "tags": rng.sample(tags, rng.randint(0, 2)),
+        })
+    return records[:count]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по отсортированной выборке."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main() -> int:
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titles", type=int, default=50_000, help="тайтлов в синтетическом каталоге")
+    parser.add_argument("--top-k", type=int, default=8, help="кандидатов в промпте")
+    parser.add_argument("--rounds", type=int, default=50, help="повторов набора запросов")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if not BM25_AVAILABLE:
+        print("❌ numpy не установлен: pip install \".[retrieval]\"")
+        return 1
+
+    with open(CATALOG_FILE, encoding="utf-8") as f:
+        base = json.load(f)
+
+    catalog = CatalogService()
+    started = time.perf_counter()
+    catalog.build(synthetic_records(base, args.titles, args.seed))
+    build_seconds = time.perf_counter() - started
+
+    print(f"📊 Поиск кандидатов: {args.titles} тайтлов, top-{args.top_k}, "
+          f"{len(QUERIES)} запросов x {args.rounds}")
+    print("=" * 72)
+    print(f"Построение индекса: {build_seconds:.2f} с, термов {len(catalog.bm25.vocabulary)}, "
+          f"матрица {catalog.bm25.nbytes / 1024 / 1024:.1f} МБ")
+
+    terms_seconds, rank_seconds, total_seconds = [], [], []
+    for _ in range(args.rounds):
+        for query in QUERIES:
+            started = time.perf_counter()
+            terms = query_terms(query)
+            parsed = time.perf_counter()
+            catalog.bm25.top(terms, args.top_k)
+            ranked = time.perf_counter()
+            terms_seconds.append(parsed - started)
+            rank_seconds.append(ranked - parsed)
+            total_seconds.append(ranked - started)
+
+    print(f"\n{'этап':<22} {'p50, мс':>10} {'p99, мс':>10} {'max, мс':>10}")
+    for label, values in (("термы запроса", terms_seconds), ("BM25 + top-k", rank_seconds),
+                          ("всего", total_seconds)):
+        print(f"{label:<22} {statistics.median(values) * 1000:>10.3f} "
+              f"{percentile(values, 0.99) * 1000:>10.3f} {max(values) * 1000:>10.3f}")
+
+    # Размер промпта считаем на встроенном каталоге - с ним работает бот
+    bundled = CatalogService()
+    bundled.build(base)
+    everything = bundled.format_candidates(list(range(len(bundled.titles))))
+    plain, grounded, full = [], [], []
+    for query in QUERIES:
+        candidates = bundled.format_candidates(bundled.retrieve(query, args.top_k))
+        prompt = SYSTEM_PROMPT + query
+        plain.append(estimate_tokens(prompt))
+        grounded.append(estimate_tokens(prompt + RETRIEVAL_PROMPT.format(candidates=candidates)))
+        full.append(estimate_tokens(prompt + RETRIEVAL_PROMPT.format(candidates=everything)))
+
+    print(f"\nТокены промпта (оценка), встроенный каталог {len(bundled.titles)} тайтлов:")
+    print(f"  без каталога:           {statistics.mean(plain):>8.0f}")
+    print(f"  top-{args.top_k} кандидатов:       {statistics.mean(grounded):>8.0f}")
+    print(f"  весь каталог в промпте: {statistics.mean(full):>8.0f}")
+    print(f"  сокращение против всего каталога: x{statistics.mean(full) / statistics.mean(grounded):.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
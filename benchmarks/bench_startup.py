@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк холодного старта: время от запуска процесса до первого обработанного обновления.
+
+Каждый прогон - новый процесс Python с заглушкой Telegram и файлом кэша
+заданного размера. Сравниваются фоновая загрузка кэша (по умолчанию) и
+загрузка до начала приема обновлений. Код возврата 1, если медиана времени
+до первого обновления превышает --budget.
+
+Примеры:
+  python -m benchmarks.bench_startup
+  python -m benchmarks.bench_startup --cache-entries 100000 --runs 5 --budget 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+CHILD_FLAG = "--child"
+
+
+async def sample_loop_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """Максимальная задержка event loop до установки stop."""
+    worst = 0.0
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - expected)
+    return worst
+
+
+async def child(sync_cache: bool) -> None:
+    """Процесс-участник: поднимает бота и сообщает, когда обработано первое обновление."""
+    t0 = float(os.environ["BENCH_T0"])
+    imports_started = time.time()
+
+    from benchmarks.telegram_stub import make_stub_bot, message_update
+    from src.bot import create_dispatcher
+    from src.services.cache_service import cache_service
+    from src.services.container import services
+
+    imported = time.time()
+    bot = make_stub_bot(rtt=0.01)
+    bot.session.pending_updates = [message_update(1, 1, "/start")]
+    dp = create_dispatcher()
+    if sync_cache:
+        # Старое поведение: обновления принимаются только после загрузки кэша
+        dp.startup.register(services.wait_background)
+
+    stop_sampling = asyncio.Event()
+    sampler = asyncio.create_task(sample_loop_lag(stop_sampling))
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+    await bot.session.wait_sent(1)
+    first_update = time.time()
+
+    await services.wait_background()
+    cache_loaded = time.time()
+    stop_sampling.set()
+    max_lag = await sampler
+    entries = len(cache_service.cache)
+
+    await dp.stop_polling()
+    await polling
+    print(json.dumps({
+        "interpreter": imports_started - t0,
+        "imports": imported - imports_started,
+        "first_update": first_update - t0,
+        "cache_loaded": cache_loaded - t0,
+        "cache_entries": entries,
+        "max_loop_lag": max_lag,
+    }))
+
+
+def write_cache(cache_dir: Path, entries: int) -> None:
+    """Файл кэша с заданным числом записей (формат CacheService)."""
+    now = int(time.time())
+    cache = {
+        f"{i:032x}": {
+            "query": f"запрос номер {i}",
+            "response": "Ладно, посмотри Ванпанчмен. " * 8,
+            "timestamp": now,
+            "model": "openai/gpt-3.5-turbo",
+        }
+        for i in range(entries)
+    }
+    with open(cache_dir / "llm_cache.json", "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+
+
+def run_child(cache_dir: Path, sync_cache: bool) -> dict:
+    """Запустить процесс-участник и вернуть его замеры."""
+    env = dict(os.environ)
+    env.update({
+        "BENCH_T0": repr(time.time()),
+        "CACHE_DIR": str(cache_dir),
+        "LOG_LEVEL": "WARNING",
+        "TRACE_EXPORTER": "none",
+        "OPS_PORT": "0",
+        "LOOP_WATCHDOG_ENABLED": "false",
+        "DELIVERY_GLOBAL_RATE": "1000000000",
+        "DELIVERY_CHAT_RATE": "1000000000",
+        "DELIVERY_CHAT_BURST": "1000000000",
+    })
+    command = [sys.executable, "-m", "benchmarks.bench_startup", CHILD_FLAG]
+    if sync_cache:
+        command.append("--sync-cache")
+    result = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache-entries", type=int, default=50_000, help="записей в файле кэша")
+    parser.add_argument("--runs", type=int, default=3, help="прогонов каждого режима")
+    parser.add_argument("--budget", type=float, default=3.0, help="бюджет времени до первого обновления, секунды")
+    parser.add_argument(CHILD_FLAG, action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--sync-cache", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(child(args.sync_cache))
+        return 0
+
+    cache_dir = Path(tempfile.mkdtemp(prefix="bench_startup_"))
+    write_cache(cache_dir, args.cache_entries)
+    size = (cache_dir / "llm_cache.json").stat().st_size
+
+    print(f"📊 Холодный старт: кэш {args.cache_entries} записей ({size / 1024 / 1024:.1f} МБ), "
+          f"{args.runs} прогонов, бюджет {args.budget:g} с")
+    print("=" * 90)
+    print(f"{'режим':<16} {'интерпретатор':>14} {'импорты':>9} {'1-е обновление':>15} "
+          f"{'кэш готов':>10} {'макс. лаг loop':>15}")
+
+    medians = {}
+    for label, sync_cache in (("фоновый кэш", False), ("кэш до приема", True)):
+        runs = [run_child(cache_dir, sync_cache) for _ in range(args.runs)]
+        median = {key: statistics.median(run[key] for run in runs)
+                  for key in ("interpreter", "imports", "first_update", "cache_loaded", "max_loop_lag")}
+        medians[label] = median
+        print(f"{label:<16} {median['interpreter']:>12.3f} с {median['imports']:>7.3f} с "
+              f"{median['first_update']:>13.3f} с {median['cache_loaded']:>8.3f} с "
+              f"{median['max_loop_lag'] * 1000:>12.0f} мс")
+
+    first_update = medians["фоновый кэш"]["first_update"]
+    if first_update > args.budget:
+        print(f"\n❌ Время до первого обновления {first_update:.3f} с больше бюджета {args.budget:g} с")
+        return 1
+    print(f"\n✅ Время до первого обновления {first_update:.3f} с в пределах бюджета")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
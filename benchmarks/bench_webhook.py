@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пропускной способности webhook-режима против polling.
+
+Режимы:
+  python -m benchmarks.bench_webhook                 - сравнить webhook и polling
+  python -m benchmarks.bench_webhook --post URL      - отправить записанные
+                                                       обновления на работающий сервер
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+# Приглушаем логи и уводим кэш во временную папку до импорта сервисов
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="bench_cache_"))
+# Лимиты Telegram на заглушке не нужны - меряем сам бот
+for name in ("DELIVERY_GLOBAL_RATE", "DELIVERY_CHAT_RATE", "DELIVERY_CHAT_BURST"):
+    os.environ.setdefault(name, "1000000000")
+
+import aiohttp  # noqa: E402
+from aiogram import Dispatcher  # noqa: E402
+
+from benchmarks.telegram_stub import (  # noqa: E402
+    load_recorded_updates,
+    make_stub_bot,
+    replay_updates,
+)
+from src.handlers.anime import router as anime_router  # noqa: E402
+from src.handlers.start import router as start_router  # noqa: E402
+from src.utils.webhook_server import SECRET_HEADER, WebhookServer  # noqa: E402
+
+SECRET = "bench-secret"
+
+
+def make_dispatcher() -> Dispatcher:
+    """Создает диспетчер с роутерами бота (роутер подключается только один раз)."""
+    dp = Dispatcher()
+    dp.include_router(start_router)
+    dp.include_router(anime_router)
+    return dp
+
+
+dispatcher = make_dispatcher()
+
+
+def free_port() -> int:
+    """Находит свободный локальный порт."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def post_updates(url: str, updates: list, secret: str, concurrency: int) -> dict:
+    """Отправляет обновления POST-запросами и возвращает счетчики статусов."""
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession() as session:
+        async def post(update):
+            async with semaphore:
+                async with session.post(url, json=update, headers={SECRET_HEADER: secret}) as resp:
+                    statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+        await asyncio.gather(*(post(update) for update in updates))
+
+    return statuses
+
+
+async def bench_webhook(updates: list, concurrency: int) -> float:
+    """Прогоняет обновления через webhook сервер, возвращает обновлений в секунду."""
+    bot = make_stub_bot()
+    server = WebhookServer(bot, dispatcher, path="/webhook", secret=SECRET,
+                           queue_size=len(updates), workers=32)
+    port = free_port()
+    await server.start(host="127.0.0.1", port=port)
+
+    started = time.perf_counter()
+    statuses = await post_updates(f"http://127.0.0.1:{port}/webhook", updates, SECRET, concurrency)
+    await bot.session.wait_sent(len(updates))
+    elapsed = time.perf_counter() - started
+
+    await server.stop()
+    print(f"  HTTP статусы: {statuses}")
+    return len(updates) / elapsed
+
+
+async def bench_polling(updates: list, rtt: float) -> float:
+    """Прогоняет обновления через polling, возвращает обновлений в секунду."""
+    bot = make_stub_bot(rtt=rtt)
+    bot.session.pending_updates = list(updates)
+
+    started = time.perf_counter()
+    polling = asyncio.create_task(dispatcher.start_polling(bot, handle_signals=False, polling_timeout=1))
+    await bot.session.wait_sent(len(updates))
+    elapsed = time.perf_counter() - started
+
+    await dispatcher.stop_polling()
+    await polling
+    return len(updates) / elapsed
+
+
+async def main():
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=5000, help="количество обновлений")
+    parser.add_argument("--users", type=int, default=500, help="количество пользователей")
+    parser.add_argument("--concurrency", type=int, default=50, help="параллельных POST-запросов")
+    parser.add_argument("--rtt-ms", type=float, default=50, help="RTT getUpdates для polling")
+    parser.add_argument("--recorded", type=Path, default=None, help="JSONL с записанными обновлениями")
+    parser.add_argument("--post", metavar="URL", help="отправить обновления на работающий сервер")
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""), help="секрет для --post")
+    args = parser.parse_args()
+
+    updates = replay_updates(load_recorded_updates(args.recorded), args.updates, args.users)
+
+    if args.post:
+        statuses = await post_updates(args.post, updates, args.secret, args.concurrency)
+        print(f"📨 Отправлено {len(updates)} обновлений на {args.post}: {statuses}")
+        return
+
+    print(f"📊 Пропускная способность: {len(updates)} обновлений, {args.users} пользователей")
+    print("=" * 60)
+    webhook_rate = await bench_webhook(updates, args.concurrency)
+    print(f"webhook: {webhook_rate:10.0f} обновлений/с")
+    polling_rate = await bench_polling(updates, args.rtt_ms / 1000)
+    print(f"polling: {polling_rate:10.0f} обновлений/с (RTT {args.rtt_ms:.0f} мс)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Проверка согласованной остановки при поэтапном перезапуске бота.
+
+Бот запускается настоящими процессами (python -m src.bot) против локальных
+моков Bot API (long polling) и OpenRouter (режим echo с задержкой --latency):
+
+1. экземпляр A получает первую пачку сообщений и начинает генерацию ответов;
+2. пока ответы генерируются, A получает SIGTERM, и сразу стартует экземпляр B;
+3. вторая пачка сообщений приходит уже во время перезапуска;
+4. после ответов на все сообщения B тоже останавливается по SIGTERM.
+
+Проверяется, что каждое сообщение получило ровно один ответ и что ни один
+ответ, сгенерированный LLM (и оплаченный), не потерян. Для сравнения тот же
+сценарий прогоняется без дообработки (SHUTDOWN_DRAIN_TIMEOUT=0). Код
+возврата 1, если при дообработке есть потери или дубли.
+
+Примеры:
+  python -m benchmarks.check_rolling_restart
+  python -m benchmarks.check_rolling_restart --messages 40 --latency 5 --drain 20
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import tempfile
+import time
+from contextlib import suppress
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from benchmarks.mock_openrouter import MockOpenRouter, ModelProfile
+from benchmarks.telegram_stub import STUB_TOKEN, message_update
+
+# Пометка сообщения: по ней ответ в режиме echo сопоставляется с сообщением
+MARKER = "#msg-"
+
+
+class MockBotAPI:
+    """HTTP мок Bot API: long polling с подтверждением offset и учет отправленных ответов."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.updates: List[Dict[str, Any]] = []
+        # update_id последнего подтвержденного обновления
+        self.confirmed = 0
+        # update_id -> сколько раз обновление выдано getUpdates
+        self.deliveries: Dict[int, int] = {}
+        # chat_id -> тексты отправленных ботом сообщений
+        self.replies: Dict[int, List[str]] = {}
+        self._changed = asyncio.Event()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        """Адрес для TELEGRAM_API_URL."""
+        return f"http://{self.host}:{self.port}"
+
+    def add_updates(self, updates: List[Dict[str, Any]]) -> None:
+        """Поставить обновления в очередь getUpdates."""
+        self.updates.extend(updates)
+        self._changed.set()
+
+    async def wait_for(self, condition, timeout: float) -> bool:
+        """Ждать выполнения условия (проверяется при каждом запросе к API)."""
+        deadline = time.monotonic() + timeout
+        while not condition():
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return False
+            self._changed.clear()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._changed.wait(), timeout=min(left, 0.5))
+        return True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Метод Bot API: /bot<token>/<method>."""
+        method = request.match_info["method"].lower()
+        params = dict(await request.post())
+        if method == "getupdates":
+            result = await self._get_updates(params)
+        elif method == "getme":
+            result = {"id": int(STUB_TOKEN.split(":")[0]), "is_bot": True, "first_name": "Mock", "username": "mock_bot"}
+        elif method == "sendmessage":
+            chat_id = int(params["chat_id"])
+            self.replies.setdefault(chat_id, []).append(params.get("text", ""))
+            result = {
+                "message_id": sum(len(texts) for texts in self.replies.values()),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            }
+        else:
+            result = True
+        self._changed.set()
+        return web.json_response({"ok": True, "result": result})
+
+    async def _get_updates(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        if offset:
+            # Как в Telegram: offset подтверждает все обновления с меньшим update_id
+            self.confirmed = max(self.confirmed, offset - 1)
+        limit = int(params.get("limit") or 100)
+        deadline = time.monotonic() + float(params.get("timeout") or 0)
+        while True:
+            batch = [update for update in self.updates if update["update_id"] > self.confirmed][:limit]
+            left = deadline - time.monotonic()
+            if batch or left <= 0:
+                break
+            self._changed.clear()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._changed.wait(), timeout=left)
+        for update in batch:
+            self.deliveries[update["update_id"]] = self.deliveries.get(update["update_id"], 0) + 1
+        return batch
+
+    async def __aenter__(self) -> "MockBotAPI":
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._runner.cleanup()
+
+
+async def spawn(name: str, tg: MockBotAPI, llm: MockOpenRouter, drain: float, log_dir: str):
+    """Запустить экземпляр бота процессом."""
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN=STUB_TOKEN,
+        TELEGRAM_API_URL=tg.base_url,
+        OPENROUTER_API_KEY="mock",
+        OPENROUTER_API_KEYS="",
+        OPENROUTER_BASE_URL=llm.base_url,
+        BOT_MODE="polling",
+        WORKER_PROCESSES="0",
+        SHUTDOWN_DRAIN_TIMEOUT=str(drain),
+        CACHE_DIR=os.path.join(log_dir, "cache"),
+        OPS_PORT="0",
+        TRACE_EXPORTER="none",
+        LOG_LEVEL="INFO",
+    )
+    log = open(os.path.join(log_dir, f"{name}.log"), "wb")
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "src.bot", env=env, stdout=log, stderr=asyncio.subprocess.STDOUT
+    )
+    log.close()
+    return process
+
+
+async def stop(process, timeout: float) -> float:
+    """SIGTERM и ожидание выхода процесса (по таймауту - SIGKILL). Возвращает время остановки."""
+    started = time.perf_counter()
+    process.send_signal(signal.SIGTERM)
+    try:
+        await asyncio.wait_for(process.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+    return time.perf_counter() - started
+
+
+async def scenario(drain: float, args) -> Dict[str, Any]:
+    """Поэтапный перезапуск с заданным временем дообработки."""
+    log_dir = tempfile.mkdtemp(prefix="rolling_restart_")
+    total = args.messages * 2
+    updates = [
+        message_update(update_id, 1000 + update_id, f"Посоветуй аниме на вечер {MARKER}{update_id}")
+        for update_id in range(1, total + 1)
+    ]
+    profile = ModelProfile(latency=f"fixed:{args.latency}", mode="echo")
+    async with MockOpenRouter(default=profile, seed=args.seed) as llm, MockBotAPI() as tg:
+        tg.add_updates(updates[:args.messages])
+        first = await spawn("a", tg, llm, drain, log_dir)
+        if not await tg.wait_for(lambda: len(tg.deliveries) >= args.messages, args.timeout):
+            raise RuntimeError(f"Instance A did not fetch updates, see {log_dir}/a.log")
+        # Ответы генерируются - самое неудобное время для остановки
+        await asyncio.sleep(args.latency / 2)
+
+        stopping = asyncio.create_task(stop(first, drain + args.timeout))
+        second = await spawn("b", tg, llm, drain, log_dir)
+        # A уже не принимает обновления - вторая пачка достается B
+        await asyncio.sleep(0.5)
+        tg.add_updates(updates[args.messages:])
+        stop_seconds = await stopping
+
+        await tg.wait_for(lambda: len(tg.replies) >= total, args.timeout)
+        await stop(second, drain + args.timeout)
+
+    chats = [update["message"]["chat"]["id"] for update in updates]
+    replies = [tg.replies.get(chat_id, []) for chat_id in chats]
+    echoed = sum(1 for texts in replies for text in texts if MARKER in text)
+    return {
+        "log_dir": log_dir,
+        "answered": sum(1 for texts in replies if texts),
+        "lost": sum(1 for texts in replies if not texts),
+        "duplicated": sum(1 for texts in replies if len(texts) > 1),
+        "generated": llm.stats.by_outcome.get("ok", 0),
+        "echoed": echoed,
+        "stop_seconds": stop_seconds,
+        "exit_codes": (first.returncode, second.returncode),
+    }
+
+
+async def main_async(args) -> int:
+    results = [
+        ("без дообработки", await scenario(0, args)),
+        (f"дообработка {args.drain:g} с", await scenario(args.drain, args)),
+    ]
+
+    total = args.messages * 2
+    print(f"🔁 Поэтапный перезапуск: {total} сообщений, генерация ответа {args.latency:g} с")
+    print("=" * 88)
+    print(f"{'режим':<18} {'отвечено':>9} {'без ответа':>11} {'дублей':>7} {'LLM ответов':>12} "
+          f"{'потеряно LLM':>13} {'остановка A, с':>15}")
+    for label, result in results:
+        lost_generated = max(result["generated"] - result["echoed"], 0)
+        print(f"{label:<18} {result['answered']:>9} {result['lost']:>11} {result['duplicated']:>7} "
+              f"{result['generated']:>12} {lost_generated:>13} {result['stop_seconds']:>15.1f}")
+
+    checked = results[-1][1]
+    lost_generated = max(checked["generated"] - checked["echoed"], 0)
+    if checked["lost"] or checked["duplicated"] or lost_generated:
+        print(f"\n❌ Потери при дообработке, логи экземпляров: {checked['log_dir']}")
+        return 1
+    print(f"\n✅ Все {total} сообщений получили по одному ответу, коды выхода {checked['exit_codes']}")
+    return 0
+
+
+def main() -> int:
+    """Точка входа проверки."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20, help="сообщений в каждой пачке")
+    parser.add_argument("--latency", type=float, default=3.0, help="время генерации ответа LLM")
+    parser.add_argument("--drain", type=float, default=30.0, help="SHUTDOWN_DRAIN_TIMEOUT для проверки")
+    parser.add_argument("--timeout", type=float, default=60.0, help="предел ожидания шагов сценария")
+    parser.add_argument("--seed", type=int, default=42)
+    return asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
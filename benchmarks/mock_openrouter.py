@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Локальная замена OpenRouter: OpenAI-совместимый сервер с задержками и сбоями.
+
+Запуск отдельным процессом:
+  python -m benchmarks.mock_openrouter --port 8099 --latency lognormal:0.8,0.4 --rate-429 0.05
+  OPENROUTER_BASE_URL=http://127.0.0.1:8099/api/v1 python -m src.bot
+
+Использование из кода (бенчмарки, нагрузочные тесты):
+  async with MockOpenRouter({"openai/gpt-3.5-turbo": ModelProfile(latency="fixed:0.2")}) as mock:
+      client = AsyncOpenAI(api_key="test", base_url=mock.base_url)
+
+Распределения задержки: fixed:S, uniform:MIN,MAX, normal:MEAN,STD,
+lognormal:MEDIAN,SIGMA (секунды). Сбои задаются долями запросов: 429 с
+Retry-After, 5xx, "зависание" дольше таймаута клиента. Ответы - заготовленный
+текст или эхо последнего сообщения пользователя, в том числе потоком (SSE).
+Длину ответа можно задать распределением в токенах (response_tokens) со
+временем генерации на токен и долей "заговорившихся" ответов до max_tokens;
+ответ длиннее max_tokens обрезается с finish_reason "length".
+Профили можно менять на лету: POST /_mock/config, статистика - GET /_mock/stats.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+# Префиксы, под которыми клиенты обращаются к API
+API_PREFIXES = ("", "/v1", "/api/v1")
+
+DEFAULT_CANNED_RESPONSE = (
+    "Хм... Ладно. Посмотри «Ванпанчмен» (2015, 8.7/10) - там лысый парень "
+    "побеждает всех с одного удара. Еще «Моб Психо 100» (2016, 8.5/10). "
+    "Ну, вроде неплохо."
+)
+
+# Символов в токене (для оценки usage и длины ответа)
+CHARS_PER_TOKEN = 4
+
+
+def sample_latency(spec: str, rng: random.Random) -> float:
+    """
+    Случайная задержка по описанию распределения.
+
+    Args:
+        spec: Например "fixed:0.5", "uniform:0.2,1", "normal:0.5,0.1", "lognormal:0.8,0.4"
+        rng: Генератор случайных чисел
+
+    Returns:
+        Задержка в секундах (не меньше нуля)
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+    if kind == "fixed":
+        delay = values[0] if values else 0.0
+    elif kind == "uniform":
+        delay = rng.uniform(values[0], values[1])
+    elif kind == "normal":
+        delay = rng.gauss(values[0], values[1])
+    elif kind == "lognormal":
+        # Параметры - медиана и sigma логарифма
+        delay = rng.lognormvariate(math.log(values[0]), values[1])
+    else:
+        raise ValueError(f"Неизвестное распределение задержки: {spec}")
+    return max(delay, 0.0)
+
+
+@dataclass
+class ModelProfile:
+    """Поведение мока для одной модели."""
+    latency: str = "fixed:0.05"
+    # Задержка между чанками потокового ответа
+    stream_chunk_delay: float = 0.01
+    rate_429: float = 0.0
+    retry_after: float = 1.0
+    rate_5xx: float = 0.0
+    rate_timeout: float = 0.0
+    # Сколько "висеть" при имитации таймаута
+    timeout_seconds: float = 120.0
+    # canned - заготовленный текст, echo - повтор сообщения пользователя
+    mode: str = "canned"
+    canned_response: str = DEFAULT_CANNED_RESPONSE
+    # Длина ответа в токенах - распределение как у latency (пусто - текст как есть)
+    response_tokens: str = ""
+    # Время генерации одного токена ответа, секунды
+    token_seconds: float = 0.0
+    # Доля ответов, которые генерируются до max_tokens
+    rate_runaway: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ModelProfile":
+        """Профиль из словаря (неизвестные ключи игнорируются)."""
+        known = {key: value for key, value in data.items() if key in cls.__dataclass_fields__}
+        return cls(**known)
+
+
+@dataclass
+class MockStats:
+    """Счетчики запросов к моку."""
+    requests: int = 0
+    by_outcome: Dict[str, int] = field(default_factory=dict)
+    by_model: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, model: str, outcome: str) -> None:
+        self.requests += 1
+        self.by_outcome[outcome] = self.by_outcome.get(outcome, 0) + 1
+        self.by_model[model] = self.by_model.get(model, 0) + 1
+
+
+class MockOpenRouter:
+    """OpenAI-совместимый мок OpenRouter на aiohttp."""
+
+    def __init__(self, profiles: Dict[str, ModelProfile] = None, default: ModelProfile = None,
+                 host: str = "127.0.0.1", port: int = 0, seed: Optional[int] = None):
+        """
+        Args:
+            profiles: Профили по имени модели
+            default: Профиль для моделей без своего профиля
+            host: Адрес для прослушивания
+            port: Порт (0 - свободный)
+            seed: Зерно генератора для воспроизводимых прогонов
+        """
+        self.profiles = dict(profiles or {})
+        self.default = default or ModelProfile()
+        self.host = host
+        self.port = port
+        self.rng = random.Random(seed)
+        self.stats = MockStats()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        """Базовый URL для клиента OpenAI (OPENROUTER_BASE_URL)."""
+        return f"http://{self.host}:{self.port}/api/v1"
+
+    def profile_for(self, model: str) -> ModelProfile:
+        """Профиль модели или профиль по умолчанию."""
+        return self.profiles.get(model, self.default)
+
+    def create_app(self) -> web.Application:
+        """aiohttp приложение с API и служебными эндпоинтами мока."""
+        app = web.Application()
+        for prefix in API_PREFIXES:
+            app.router.add_post(f"{prefix}/chat/completions", self.handle_chat)
+            app.router.add_get(f"{prefix}/models", self.handle_models)
+        app.router.add_get("/_mock/stats", self.handle_stats)
+        app.router.add_post("/_mock/config", self.handle_config)
+        return app
+
+    async def start(self) -> None:
+        """Запустить сервер (при port=0 выбирается свободный порт)."""
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Остановить сервер."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MockOpenRouter":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    # --- Обработчики ---
+
+    async def handle_models(self, request: web.Request) -> web.Response:
+        """GET /models - список моделей с профилями."""
+        models = sorted(set(self.profiles) | {"mock/default"})
+        return web.json_response({"data": [{"id": model, "object": "model"} for model in models]})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        """GET /_mock/stats - счетчики запросов."""
+        return web.json_response(asdict(self.stats))
+
+    async def handle_config(self, request: web.Request) -> web.Response:
+        """
+        POST /_mock/config - заменить профили на лету.
+
+        Тело: {"default": {...}, "models": {"имя": {...}}}
+        """
+        data = await request.json()
+        if "default" in data:
+            self.default = ModelProfile.from_dict(data["default"])
+        for model, profile in data.get("models", {}).items():
+            self.profiles[model] = ModelProfile.from_dict(profile)
+        return web.json_response({"ok": True})
+
+    async def handle_chat(self, request: web.Request) -> web.StreamResponse:
+        """POST /chat/completions - ответ с задержкой, сбоем или потоком."""
+        body = await request.json()
+        model = body.get("model", "mock/default")
+        profile = self.profile_for(model)
+
+        await asyncio.sleep(sample_latency(profile.latency, self.rng))
+
+        # Сбои разыгрываем одним броском, чтобы доли не пересекались
+        roll = self.rng.random()
+        if roll < profile.rate_429:
+            self.stats.record(model, "429")
+            return web.json_response(
+                {"error": {"message": "Rate limit exceeded", "code": 429}},
+                status=429, headers={"Retry-After": f"{profile.retry_after:g}"}
+            )
+        roll -= profile.rate_429
+        if roll < profile.rate_5xx:
+            self.stats.record(model, "5xx")
+            return web.json_response(
+                {"error": {"message": "Upstream provider error", "code": 502}}, status=502
+            )
+        roll -= profile.rate_5xx
+        if roll < profile.rate_timeout:
+            self.stats.record(model, "timeout")
+            await asyncio.sleep(profile.timeout_seconds)
+            return web.json_response({"error": {"message": "Timed out", "code": 504}}, status=504)
+
+        content = self._make_content(profile, body.get("messages", []))
+        content, finish_reason = self._fit_length(profile, content, body.get("max_tokens"))
+        if profile.token_seconds:
+            await asyncio.sleep(len(content) // CHARS_PER_TOKEN * profile.token_seconds)
+        self.stats.record(model, "ok")
+        if body.get("stream"):
+            return await self._stream(request, model, content, profile)
+        return web.json_response(self._completion(model, content, body.get("messages", []), finish_reason))
+
+    # --- Ответы ---
+
+    @staticmethod
+    def _make_content(profile: ModelProfile, messages: List[Dict[str, Any]]) -> str:
+        if profile.mode == "echo":
+            user_messages = [m.get("content", "") for m in messages if m.get("role") == "user"]
+            return f"Эхо: {user_messages[-1] if user_messages else ''}"
+        return profile.canned_response
+
+    def _fit_length(self, profile: ModelProfile, content: str, max_tokens: Optional[int]) -> Tuple[str, str]:
+        """Длина ответа по профилю и обрезка по max_tokens: (текст, finish_reason)."""
+        tokens = None
+        if profile.rate_runaway and max_tokens and self.rng.random() < profile.rate_runaway:
+            tokens = max_tokens + 1
+        elif profile.response_tokens:
+            tokens = max(1, int(sample_latency(profile.response_tokens, self.rng)))
+        if tokens is not None:
+            chars = tokens * CHARS_PER_TOKEN
+            content = (content + " ") * (chars // (len(content) + 1) + 1)
+            content = content[:chars]
+        if max_tokens and len(content) // CHARS_PER_TOKEN > max_tokens:
+            return content[:max_tokens * CHARS_PER_TOKEN], "length"
+        return content, "stop"
+
+    @staticmethod
+    def _completion(model: str, content: str, messages: List[Dict[str, Any]],
+                    finish_reason: str = "stop") -> Dict[str, Any]:
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // CHARS_PER_TOKEN
+        completion_tokens = len(content) // CHARS_PER_TOKEN
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    async def _stream(self, request: web.Request, model: str, content: str,
+                      profile: ModelProfile) -> web.StreamResponse:
+        """Потоковый ответ в формате SSE, по несколько слов в чанке."""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        words = content.split(" ")
+        pieces = [" ".join(words[i:i + 3]) + (" " if i + 3 < len(words) else "")
+                  for i in range(0, len(words), 3)]
+
+        for index, piece in enumerate(pieces):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"role": "assistant", "content": piece} if index == 0 else {"content": piece},
+                    "finish_reason": None,
+                }],
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            await asyncio.sleep(profile.stream_chunk_delay)
+
+        final = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        await response.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+def load_profiles(path: str) -> Dict[str, ModelProfile]:
+    """
+    Профили моделей из JSON файла вида {"модель": {"latency": "...", "rate_429": 0.1}}.
+
+    Args:
+        path: Путь к файлу
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {model: ModelProfile.from_dict(profile) for model, profile in data.items()}
+
+
+async def serve(mock: MockOpenRouter) -> None:
+    """Работать до Ctrl+C."""
+    await mock.start()
+    print(f"🧪 Mock OpenRouter: {mock.base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await mock.stop()
+
+
+def main():
+    """Точка входа мока."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--profiles", help="JSON файл с профилями моделей")
+    parser.add_argument("--latency", default="fixed:0.05", help="распределение задержки по умолчанию")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After для 429, секунды")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="доля ответов 502")
+    parser.add_argument("--rate-timeout", type=float, default=0.0, help="доля зависших запросов")
+    parser.add_argument("--mode", choices=("canned", "echo"), default="canned", help="тип ответа")
+    parser.add_argument("--seed", type=int, default=None, help="зерно случайных чисел")
+    args = parser.parse_args()
+
+    default = ModelProfile(
+        latency=args.latency, rate_429=args.rate_429, retry_after=args.retry_after,
+        rate_5xx=args.rate_5xx, rate_timeout=args.rate_timeout, mode=args.mode
+    )
+    profiles = load_profiles(args.profiles) if args.profiles else {}
+    mock = MockOpenRouter(profiles, default, host=args.host, port=args.port, seed=args.seed)
+
+    try:
+        asyncio.run(serve(mock))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
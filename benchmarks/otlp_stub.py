@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка OTLP/HTTP коллектора для проверки экспорта трейсов.
+
+Запуск:
+  python -m benchmarks.otlp_stub --port 4318
+  TRACE_EXPORTER=otlp TRACE_OTLP_ENDPOINT=http://127.0.0.1:4318 python -m src.bot
+
+Каждый полученный трейс печатается деревом span'ов с длительностями.
+"""
+
+import argparse
+from collections import defaultdict
+
+from aiohttp import web
+
+
+def format_trace(spans: list) -> str:
+    """Дерево span'ов одного трейса с длительностями в миллисекундах."""
+    children = defaultdict(list)
+    for span in spans:
+        children[span.get("parentSpanId")].append(span)
+
+    lines = []
+
+    def walk(parent_id, depth):
+        for span in sorted(children.get(parent_id, []), key=lambda s: int(s["startTimeUnixNano"])):
+            duration = (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1_000_000
+            failed = " ❌ " + span["status"].get("message", "") if span["status"].get("code") == 2 else ""
+            lines.append(f"{'  ' * depth}{span['name']:<30} {duration:9.1f} мс{failed}")
+            walk(span["spanId"], depth + 1)
+
+    walk(None, 0)
+    return "\n".join(lines)
+
+
+async def handle_traces(request: web.Request) -> web.Response:
+    """POST /v1/traces: напечатать полученные трейсы."""
+    payload = await request.json()
+    traces = defaultdict(list)
+    for resource in payload.get("resourceSpans", []):
+        for scope in resource.get("scopeSpans", []):
+            for span in scope.get("spans", []):
+                traces[span["traceId"]].append(span)
+
+    for trace_id, spans in traces.items():
+        print(f"🔎 trace {trace_id}")
+        print(format_trace(spans))
+    return web.json_response({})
+
+
+def main():
+    """Точка входа заглушки."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    args = parser.parse_args()
+
+    app = web.Application()
+    app.router.add_post("/v1/traces", handle_traces)
+    web.run_app(app, host=args.host, port=args.port, print=lambda *_: print(f"OTLP stub on {args.host}:{args.port}"))
+
+
+if __name__ == "__main__":
+    main()
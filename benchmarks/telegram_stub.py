@@ -0,0 +1,165 @@
+"""Заглушка сессии Telegram Bot API и генераторы обновлений для бенчмарков"""
+
+import asyncio
+import itertools
+import json
+import time
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, Iterable, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, Message, Update, User
+
+# Токен в корректном формате, сеть не используется
+STUB_TOKEN = "123456:BENCHMARK-STUB-TOKEN"
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+class StubSession(BaseSession):
+    """
+    Сессия Bot API без сети.
+
+    Отвечает на отправку сообщений фиктивными объектами, а getUpdates отдает
+    обновления из внутренней очереди с имитацией сетевой задержки.
+    """
+
+    def __init__(self, rtt: float = 0.0, send_latency: float = 0.0, **kwargs: Any):
+        """
+        Args:
+            rtt: Время одного round-trip getUpdates в секундах
+            send_latency: Задержка каждого исходящего вызова в секундах
+        """
+        super().__init__(**kwargs)
+        self.rtt = rtt
+        self.send_latency = send_latency
+        self.pending_updates: List[Dict[str, Any]] = []
+        self.calls: Dict[str, int] = {}
+        self.sent_messages = 0
+        self._message_ids = itertools.count(1000)
+        self._sent_event = asyncio.Event()
+        self._sent_target: Optional[int] = None
+
+    async def close(self) -> None:
+        """Сеть не используется - закрывать нечего."""
+        return None
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None,
+                             timeout: int = 30, chunk_size: int = 65536,
+                             raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        """Скачивание файлов в бенчмарках не используется."""
+        yield b""
+
+    async def wait_sent(self, count: int) -> None:
+        """Дождаться, пока бот отправит count сообщений."""
+        self._sent_target = count
+        if self.sent_messages < count:
+            self._sent_event.clear()
+            await self._sent_event.wait()
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        """Вернуть фиктивный результат вызова метода Bot API."""
+        name = type(method).__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+        if name == "GetUpdates":
+            await asyncio.sleep(self.rtt)
+            limit = method.limit or 100
+            batch, self.pending_updates = self.pending_updates[:limit], self.pending_updates[limit:]
+            return [Update.model_validate(update, context={"bot": bot}) for update in batch]
+
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+
+        if name == "GetMe":
+            return User(id=bot.id, is_bot=True, first_name="Stub", username="stub_bot")
+
+        if name in ("SendMessage", "EditMessageText"):
+            self.sent_messages += 1
+            if self._sent_target is not None and self.sent_messages >= self._sent_target:
+                self._sent_event.set()
+            chat_id = getattr(method, "chat_id", None) or 0
+            return Message(
+                message_id=next(self._message_ids),
+                date=int(time.time()),
+                chat=Chat(id=chat_id, type="private"),
+                text=getattr(method, "text", ""),
+            )
+
+        return True
+
+
+def make_stub_bot(rtt: float = 0.0, send_latency: float = 0.0) -> Bot:
+    """Создать бота с заглушкой сессии."""
+    return Bot(token=STUB_TOKEN, session=StubSession(rtt=rtt, send_latency=send_latency))
+
+
+def _user(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "language_code": "ru"}
+
+
+def message_update(update_id: int, user_id: int, text: str) -> Dict[str, Any]:
+    """Обновление с текстовым сообщением или командой."""
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        command_length = len(text.split()[0])
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": command_length}]
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(update_id: int, user_id: int, data: str, message_id: int = 1) -> Dict[str, Any]:
+    """Обновление с нажатием inline-кнопки под сообщением бота."""
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+                "from": {"id": 123456, "is_bot": True, "first_name": "Stub"},
+                "text": "📺 Рекомендации",
+            },
+        },
+    }
+
+
+def load_recorded_updates(path: Path = None) -> List[Dict[str, Any]]:
+    """Загрузить записанные обновления из JSONL файла."""
+    path = path or FIXTURES_DIR / "updates.jsonl"
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay_updates(recorded: Iterable[Dict[str, Any]], count: int, users: int = 100) -> List[Dict[str, Any]]:
+    """
+    Размножить записанные обновления с уникальными update_id и разными пользователями.
+
+    Args:
+        recorded: Записанные обновления-образцы
+        count: Сколько обновлений нужно
+        users: Количество разных пользователей
+    """
+    updates = []
+    for update_id, sample in zip(range(1, count + 1), itertools.cycle(list(recorded))):
+        update = json.loads(json.dumps(sample))
+        update["update_id"] = update_id
+        user_id = 1 + update_id % users
+        event = update.get("message") or update.get("callback_query")
+        event["from"]["id"] = user_id
+        chat = event.get("chat") or event.get("message", {}).get("chat")
+        if chat is not None:
+            chat["id"] = user_id
+        updates.append(update)
+    return updates
@@ -3,55 +3,134 @@
 """
 
 import asyncio
+import signal
 import sys
-import json
-from pathlib import Path
+from contextlib import suppress
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError
 
 from src.utils.config import config
 from src.utils.logger import logger
-from src.utils.health_check import init_health_checks
+from src.utils.health_check import health_check, init_health_checks
+from src.utils.http_pool import ConnectionKeeper, PooledAiohttpSession
+from src.utils.loop_watchdog import loop_watchdog
+from src.utils.middlewares import DeadlineMiddleware, InFlightMiddleware, MetricsMiddleware, TracingMiddleware
+from src.utils.ops_server import OpsServer
+from src.utils import profiler
+from src.utils.shutdown import in_flight
+from src.utils.tracing import tracer
+from src.utils.webhook_server import WebhookServer
+from src.utils.worker_pool import WorkerPool
 from src.handlers.start import router as start_router
 from src.handlers.anime import router as anime_router
+from src.handlers.admin import router as admin_router
+from src.services.container import services
 from src.services.pagination_service import pagination_service
+from src.services.delivery_service import delivery_service
+
+
+def create_dispatcher() -> Dispatcher:
+    """Создает диспетчер с зарегистрированными роутерами."""
+    dp = Dispatcher()
+    # Сервисы создаются и запускаются вместе с диспетчером (polling, webhook, воркеры)
+    dp.startup.register(services.startup)
+    # При остановке сначала дорабатываются принятые обновления, затем сервисы
+    dp.shutdown.register(in_flight.drain)
+    dp.shutdown.register(services.shutdown)
+    dp.update.outer_middleware(InFlightMiddleware())
+    dp.update.outer_middleware(TracingMiddleware())
+    dp.update.outer_middleware(MetricsMiddleware())
+    dp.update.outer_middleware(DeadlineMiddleware())
+    dp.include_router(start_router)
+    # До anime_router: он перехватывает любой текст
+    dp.include_router(admin_router)
+    dp.include_router(anime_router)
+    return dp
+
+
+def add_stop_signal_handlers(callback):
+    """Вызывать callback при получении SIGTERM/SIGINT."""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        # Обработка сигналов не поддерживается на Windows
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, callback)
+
+
+async def run_polling(bot: Bot, dp: Dispatcher):
+    """Запуск бота в режиме long polling до получения SIGTERM/SIGINT."""
+    in_flight.polling = True
+    # Сессию закрывает main после очереди отправки, иначе ответы в ней потеряются
+    await dp.start_polling(bot, close_bot_session=False)
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Запуск бота в webhook-режиме до получения SIGTERM/SIGINT."""
+    server = WebhookServer(bot, dp)
+    add_stop_signal_handlers(server.request_stop)
+    await server.serve()
+
+
+async def run_worker_pool(bot: Bot, dp: Dispatcher):
+    """Запуск фронт-процесса, раздающего обновления пулу процессов-воркеров."""
+    pool = WorkerPool()
+    await pool.start()
+    
+    try:
+        if config.BOT_MODE == "webhook":
+            server = WebhookServer(bot, dp, update_handler=pool.dispatch)
+            add_stop_signal_handlers(server.request_stop)
+            await server.serve()
+        else:
+            stop_event = asyncio.Event()
+            add_stop_signal_handlers(stop_event.set)
+            await pool.poll(bot, dp, stop_event)
+    finally:
+        await pool.stop()
 
 
 async def main():
     """Главная функция приложения."""
     try:
-        # Инициализируем структуру данных
-        data_dir = Path("data")
-        cache_dir = data_dir / "cache"
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Создаем пустой кэш если его нет
-        cache_file = cache_dir / "llm_cache.json"
-        if not cache_file.exists():
-            with open(cache_file, "w", encoding="utf-8") as f:
-                json.dump({}, f, ensure_ascii=False, indent=2)
-            logger.info("Создан пустой файл кэша")
-        
-        # Валидируем конфигурацию
+        # Валидируем конфигурацию (до создания сервисов: они создаются лениво,
+        # а папку и файл кэша подготавливает загрузка кэша при запуске)
         config.validate()
         logger.info("Конфигурация валидна")
         
         # Создаем бота и диспетчер
-        bot = Bot(token=config.TELEGRAM_BOT_TOKEN)
-        dp = Dispatcher()
+        bot = Bot(token=config.TELEGRAM_BOT_TOKEN, session=PooledAiohttpSession())
+        dp = create_dispatcher()
+        
+        # Соединения с Telegram открываются заранее и не остывают в тишине
+        bot_keeper = ConnectionKeeper(bot.session.stats, bot.get_me)
+        bot_keeper.start()
+        
+        # Сторож event loop: задержка планирования и стеки блокирующих вызовов
+        if config.LOOP_WATCHDOG_ENABLED:
+            await loop_watchdog.start()
         
-        # Инициализируем health checks
-        init_health_checks()
+        # Инициализируем health checks и запускаем их в фоне
+        init_health_checks(bot)
+        await health_check.start()
         
-        # Регистрируем роутеры
-        dp.include_router(start_router)
-        dp.include_router(anime_router)
+        # Служебный HTTP сервер с метриками и пробами /healthz, /readyz
+        if config.OPS_PORT:
+            ops_server = OpsServer()
+            health_check.add_routes(ops_server)
+            profiler.add_routes(ops_server)
+            await ops_server.start()
         
-        logger.info("Бот запускается...")
+        logger.info(f"Бот запускается в режиме {config.BOT_MODE}...")
         
         # Запускаем бота
-        await dp.start_polling(bot)
+        if config.WORKER_PROCESSES > 1:
+            logger.info(f"Многопроцессный режим: {config.WORKER_PROCESSES} воркеров")
+            await run_worker_pool(bot, dp)
+        elif config.BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            await run_polling(bot, dp)
         
     except ValueError as e:
         logger.error(f"Ошибка конфигурации: {e}")
@@ -68,9 +147,21 @@ async def main():
         logger.error(f"Неожиданная ошибка: {e}")
         sys.exit(1)
     finally:
+        await health_check.stop()
+        await loop_watchdog.stop()
+        if 'ops_server' in locals():
+            await ops_server.stop()
+        # Диспетчер мог не остановить сервисы (ошибка при запуске) - кэш и пулы все равно закрываем
+        if services.started:
+            await services.shutdown()
+        if 'bot_keeper' in locals():
+            await bot_keeper.stop()
         if 'bot' in locals():
+            await delivery_service.close()
             await bot.session.close()
             logger.info("Сессия бота закрыта")
+        # Трейсы последних обновлений (в том числе дообработанных) еще в очереди экспорта
+        await asyncio.to_thread(tracer.shutdown)
 
 
 if __name__ == "__main__":
@@ -4,4 +4,5 @@
 Содержит:
 - start.py - обработка команд /start и /help
 - anime.py - логика подбора аниме и обработка текстовых сообщений
+- admin.py - диагностические команды для администраторов
 """
@@ -0,0 +1,91 @@
+"""
+Диагностические команды для администраторов (ADMIN_USER_IDS).
+
+/profile [секунды] - профилирование CPU, ответ - файл collapsed stacks для flamegraph
+/memory [stop] - снимок памяти по компонентам (tracemalloc) или его выключение
+/stalls - последние зависания event loop со стеками
+"""
+
+import html
+
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import BufferedInputFile, Message
+
+from src.services.delivery_service import delivery_service
+from src.utils.config import config
+from src.utils.logger import logger
+from src.utils.loop_watchdog import loop_watchdog
+from src.utils.profiler import cpu_profiler, format_memory_report, memory_profiler
+
+router = Router()
+# Команды видят только администраторы, для остальных это обычный текст
+router.message.filter(F.from_user.id.in_(config.ADMIN_USER_IDS))
+
+DEFAULT_PROFILE_SECONDS = 10
+
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    """Обработчик команды /profile - сэмплирующий профиль CPU на N секунд."""
+    user_id = message.from_user.id
+    try:
+        seconds = float(command.args) if command.args else DEFAULT_PROFILE_SECONDS
+    except ValueError:
+        await delivery_service.answer(message, "Использование: /profile [секунды]")
+        return
+
+    logger.info(f"Admin {user_id} started CPU profiling for {seconds}s")
+    await delivery_service.answer(message, f"Профилирую {seconds:g} с...")
+
+    try:
+        collapsed, samples = await cpu_profiler.profile(seconds)
+    except RuntimeError as e:
+        await delivery_service.answer(message, str(e))
+        return
+
+    document = BufferedInputFile(collapsed.encode("utf-8") + b"\n", filename="profile.folded")
+    await delivery_service.send_document(
+        message.bot, message.chat.id, document,
+        caption=f"{samples} сэмплов. Открыть: speedscope.app или flamegraph.pl profile.folded"
+    )
+
+
+@router.message(Command("memory"))
+async def cmd_memory(message: Message, command: CommandObject):
+    """Обработчик команды /memory - снимок памяти по компонентам."""
+    user_id = message.from_user.id
+
+    if command.args and command.args.strip() == "stop":
+        memory_profiler.stop()
+        await delivery_service.answer(message, "tracemalloc выключен.")
+        return
+
+    first_snapshot = not memory_profiler.tracing
+    logger.info(f"Admin {user_id} requested memory snapshot")
+    report = await memory_profiler.snapshot()
+
+    text = format_memory_report(report)
+    if first_snapshot:
+        text += "\n\ntracemalloc только что включен: учитываются выделения с этого момента. " \
+                "Повторите /memory позже, чтобы увидеть рост."
+    # Места выделений вида <frozen importlib._bootstrap> - экранируем для HTML
+    await delivery_service.answer(message, f"<pre>{html.escape(text)}</pre>", parse_mode="HTML")
+
+
+@router.message(Command("stalls"))
+async def cmd_stalls(message: Message):
+    """Обработчик команды /stalls - последние зависания event loop."""
+    stalls = loop_watchdog.get_recent_stalls()
+    if not stalls:
+        await delivery_service.answer(message, "Зависаний event loop не было.")
+        return
+
+    report = "\n\n".join(
+        f"lag {stall['lag_at_capture']}s, всего {stall['duration']}s\n{stall['stack']}"
+        for stall in stalls
+    )
+    document = BufferedInputFile(report.encode("utf-8"), filename="stalls.txt")
+    await delivery_service.send_document(
+        message.bot, message.chat.id, document, caption=f"Зависаний: {len(stalls)}"
+    )
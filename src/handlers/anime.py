@@ -6,12 +6,25 @@ from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.exceptions import TelegramBadRequest
 
+from src.services.intent_service import INTENT_OTHER, Intent, intent_classifier, reply_for
 from src.services.llm_service import llm_service
+from src.services.pagination_service import pagination_service
 from src.utils.logger import logger
+from src.utils.tracing import mark_error
 from src.utils.message_utils import format_error_message
+from src.services.delivery_service import delivery_service
 
 router = Router()
 
+# Намерение -> категория для кэшированных ответов /top, /new, /classic
+CATEGORY_INTENTS = {
+    "category_top": "top",
+    "category_new": "new",
+    "category_classic": "classic",
+}
+# Намерение -> сдвиг страницы последнего списка
+PAGE_INTENTS = {"next_page": 1, "prev_page": -1}
+
 
 @router.message(F.text)
 async def handle_text_message(message: Message):
@@ -26,24 +39,73 @@ async def handle_text_message(message: Message):
     user_text = message.text.strip()
     
     # Логируем входящее сообщение
-    logger.info(f"User {user_id} ({user_name}) sent text: {user_text}")
+    logger.info(
+        f"User {user_id} ({user_name}) sent text",
+        extra={"event": "user_text", "user_id": user_id, "payload": user_text}
+    )
     
     try:
+        # Частые сообщения (приветствия, категории, "дальше") обходятся без LLM
+        intent = intent_classifier.classify(user_text)
+        logger.info(
+            f"Intent for user {user_id}: {intent.name} ({intent.confidence:.2f}, {intent.source})",
+            extra={"event": "intent", "user_id": user_id, "intent": intent.name,
+                   "confidence": round(intent.confidence, 3), "source": intent.source}
+        )
+        if intent.name != INTENT_OTHER and await route_intent(message, intent, user_id):
+            return
+        
         # Отправляем "печатает" статус
-        await message.bot.send_chat_action(message.chat.id, "typing")
+        delivery_service.send_chat_action(message.bot, message.chat.id)
         
         # Генерируем ответ через LLM
         response = await llm_service.generate_response(user_text, user_id)
         
         # Отправляем ответ пользователю
-        await message.answer(response)
+        await delivery_service.answer(message, response)
         
         logger.info(f"Sent LLM response to user {user_id}")
         
     except TelegramBadRequest as e:
         logger.error(f"Telegram API error for user {user_id}: {e}")
-        await message.answer(format_error_message("general"))
+        await delivery_service.answer(message, format_error_message("general"))
         
     except Exception as e:
+        mark_error(str(e))
         logger.error(f"Unexpected error for user {user_id}: {e}")
-        await message.answer(format_error_message("timeout"))
+        await delivery_service.answer(message, format_error_message("timeout"))
+
+
+async def route_intent(message: Message, intent: Intent, user_id: int) -> bool:
+    """
+    Ответить на распознанное намерение без генерации.
+    
+    Args:
+        message: Сообщение пользователя
+        intent: Намерение классификатора
+        user_id: ID пользователя
+        
+    Returns:
+        True, если ответ отправлен (иначе сообщение нужно отдать LLM)
+    """
+    category = CATEGORY_INTENTS.get(intent.name)
+    if category is not None:
+        delivery_service.send_chat_action(message.bot, message.chat.id)
+        response = await llm_service.generate_category_response(category, user_id)
+        await delivery_service.answer(message, response)
+        return True
+    
+    step = PAGE_INTENTS.get(intent.name)
+    if step is not None:
+        rendered = await pagination_service.render_user_page(user_id, step)
+        if rendered is None:
+            # Списка нет - "еще", "дальше" продолжают диалог, отвечает LLM с контекстом
+            return False
+        await delivery_service.answer(message, rendered.text, reply_markup=rendered.keyboard)
+        return True
+    
+    reply = reply_for(intent)
+    if reply is not None:
+        await delivery_service.answer(message, reply)
+        return True
+    return False
@@ -7,12 +7,24 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.filters import Command
 from src.utils.logger import logger
 from src.utils.message_utils import format_error_message
+from src.utils.metrics import metrics
+from src.services.delivery_service import delivery_service
 from src.services.user_state_service import user_state_service
 from src.services.llm_service import llm_service
-from src.services.pagination_service import pagination_service
+from src.services.pagination_service import (
+    pagination_service,
+    parse_callback,
+    CALLBACK_PREFIX,
+    ACTION_INFO,
+    ACTION_CLOSE
+)
 
 router = Router()
 
+pagination_callbacks = metrics.counter(
+    "pagination_callbacks_total", "Нажатия на кнопки пагинации", ("action",)
+)
+
 
 @router.message(Command("start"))
 async def cmd_start(message: Message):
@@ -30,7 +42,7 @@ async def cmd_start(message: Message):
         "Используй /help для справки."
     )
     
-    await message.answer(welcome_text)
+    await delivery_service.answer(message, welcome_text)
     logger.info(f"Sent welcome message to user {user_id}")
 
 
@@ -61,7 +73,7 @@ async def cmd_help(message: Message):
         "Ладно, попробуй что-нибудь написать."
     )
     
-    await message.answer(help_text, parse_mode="HTML")
+    await delivery_service.answer(message, help_text, parse_mode="HTML")
     logger.info(f"Sent help message to user {user_id}")
 
 
@@ -73,15 +85,16 @@ async def cmd_reset(message: Message):
     
     logger.info(f"User {user_id} ({user_name}) sent /reset command")
     
-    # Сбрасываем состояние пользователя
+    # Сбрасываем состояние пользователя и его списки
     await user_state_service.reset_user_state(user_id)
+    await pagination_service.clear_user_paginations(user_id)
     
     reset_text = (
         "Окей, забыл что ты хотел. Начнем заново.\n\n"
         "Расскажи мне, что хочешь посмотреть."
     )
     
-    await message.answer(reset_text)
+    await delivery_service.answer(message, reset_text)
     logger.info(f"Reset user state for user {user_id}")
 
 
@@ -95,19 +108,19 @@ async def cmd_top(message: Message):
     
     try:
         # Отправляем "печатает" статус
-        await message.bot.send_chat_action(message.chat.id, "typing")
+        delivery_service.send_chat_action(message.bot, message.chat.id)
         
         # Генерируем ответ для категории
         response = await llm_service.generate_category_response("top", user_id)
         
         # Отправляем ответ пользователю
-        await message.answer(response)
+        await delivery_service.answer(message, response)
         
         logger.info(f"Sent top anime response to user {user_id}")
         
     except Exception as e:
         logger.error(f"Error in /top command for user {user_id}: {e}")
-        await message.answer(format_error_message("api"))
+        await delivery_service.answer(message, format_error_message("api"))
 
 
 @router.message(Command("new"))
@@ -120,19 +133,19 @@ async def cmd_new(message: Message):
     
     try:
         # Отправляем "печатает" статус
-        await message.bot.send_chat_action(message.chat.id, "typing")
+        delivery_service.send_chat_action(message.bot, message.chat.id)
         
         # Генерируем ответ для категории
         response = await llm_service.generate_category_response("new", user_id)
         
         # Отправляем ответ пользователю
-        await message.answer(response)
+        await delivery_service.answer(message, response)
         
         logger.info(f"Sent new anime response to user {user_id}")
         
     except Exception as e:
         logger.error(f"Error in /new command for user {user_id}: {e}")
-        await message.answer(format_error_message("api"))
+        await delivery_service.answer(message, format_error_message("api"))
 
 
 @router.message(Command("classic"))
@@ -145,19 +158,19 @@ async def cmd_classic(message: Message):
     
     try:
         # Отправляем "печатает" статус
-        await message.bot.send_chat_action(message.chat.id, "typing")
+        delivery_service.send_chat_action(message.bot, message.chat.id)
         
         # Генерируем ответ для категории
         response = await llm_service.generate_category_response("classic", user_id)
         
         # Отправляем ответ пользователю
-        await message.answer(response)
+        await delivery_service.answer(message, response)
         
         logger.info(f"Sent classic anime response to user {user_id}")
         
     except Exception as e:
         logger.error(f"Error in /classic command for user {user_id}: {e}")
-        await message.answer(format_error_message("api"))
+        await delivery_service.answer(message, format_error_message("api"))
 
 
 def get_categories_keyboard():
@@ -189,11 +202,12 @@ async def handle_category_callback(callback: CallbackQuery):
         await callback.answer()
         
         # Отправляем "печатает" статус
-        await callback.bot.send_chat_action(callback.message.chat.id, "typing")
+        delivery_service.send_chat_action(callback.bot, callback.message.chat.id)
         
         if category == "personal":
             # Для персональных рекомендаций используем обычный диалог
-            await callback.message.answer(
+            await delivery_service.answer(
+                callback.message,
                 "Ладно, расскажи что тебе нравится, и я подберу что-то подходящее."
             )
         else:
@@ -201,16 +215,16 @@ async def handle_category_callback(callback: CallbackQuery):
             response = await llm_service.generate_category_response(category, user_id)
             
             # Отправляем ответ пользователю
-            await callback.message.answer(response)
+            await delivery_service.answer(callback.message, response)
         
         logger.info(f"Sent category response to user {user_id}")
         
     except Exception as e:
         logger.error(f"Error in category callback for user {user_id}: {e}")
-        await callback.message.answer(format_error_message("api"))
+        await delivery_service.answer(callback.message, format_error_message("api"))
 
 
-@router.callback_query(F.data.startswith("page_"))
+@router.callback_query(F.data.startswith(f"{CALLBACK_PREFIX}:") | F.data.startswith("page_"))
 async def handle_pagination_callback(callback: CallbackQuery):
     """Обработчик нажатий на кнопки пагинации."""
     user_id = callback.from_user.id
@@ -223,62 +237,47 @@ async def handle_pagination_callback(callback: CallbackQuery):
         # Отвечаем на callback
         await callback.answer()
         
-        if data == "page_info":
-            # Показать информацию о странице
-            total_pages = await pagination_service.get_total_pages(user_id)
+        # Кнопки старого формата (page_N) не привязаны к списку
+        parsed = parse_callback(data)
+        if parsed is None:
+            pagination_callbacks.labels("legacy").inc()
+            await delivery_service.answer(callback.message, "Хм... Этот список уже устарел. Спроси заново.")
+            return
+        
+        session_id, action = parsed
+        
+        if action == ACTION_INFO:
+            pagination_callbacks.labels("info").inc()
+            # Показать информацию о странице (только владельцу списка)
+            total_pages = await pagination_service.get_total_pages(session_id, user_id=user_id)
             if total_pages > 0:
-                await callback.message.answer(f"📄 Всего страниц: {total_pages}")
+                await delivery_service.answer(callback.message, f"📄 Всего страниц: {total_pages}")
             return
         
-        if data == "close_pagination":
-            # Закрыть пагинацию
-            await pagination_service.clear_pagination(user_id)
-            await callback.message.edit_text("Окей, закрыл список.")
+        if action == ACTION_CLOSE:
+            pagination_callbacks.labels("close").inc()
+            # Закрыть пагинацию может только владелец списка (в группе кнопки видят все)
+            if not await pagination_service.clear_pagination(session_id, user_id=user_id):
+                await delivery_service.answer(callback.message, "Хм... Этот список уже устарел. Спроси заново.")
+                return
+            await delivery_service.edit_text(callback.message, "Окей, закрыл список.")
             return
         
         # Получаем номер страницы
-        page = int(data.replace("page_", ""))
+        page = int(action)
+        pagination_callbacks.labels("page").inc()
         
-        # Получаем данные страницы
-        page_data = await pagination_service.get_page(user_id, page)
-        if not page_data:
-            await callback.message.answer("Хм... Страница не найдена.")
+        # Берем готовые текст и клавиатуру страницы из кэша сессии
+        rendered = await pagination_service.render_page(session_id, page, user_id=user_id)
+        if not rendered:
+            await delivery_service.answer(callback.message, "Хм... Этот список уже устарел. Спроси заново.")
             return
         
-        # Форматируем ответ
-        items = page_data["items"]
-        category = page_data["category"]
-        
-        # Создаем текст ответа
-        response_text = f"📺 Рекомендации (страница {page_data['current_page']} из {page_data['total_pages']}):\n\n"
-        
-        for i, item in enumerate(items, 1):
-            title = item.get("title", "Неизвестное аниме")
-            year = item.get("year", "")
-            rating = item.get("rating", "")
-            description = item.get("description", "")
-            
-            response_text += f"{i}. 🏆 {title}"
-            if year:
-                response_text += f" ({year})"
-            response_text += "\n"
-            
-            if rating:
-                response_text += f"   ⭐ {rating}\n"
-            
-            if description:
-                response_text += f"   📝 {description}\n"
-            
-            response_text += "\n"
-        
-        # Получаем клавиатуру пагинации
-        keyboard = await pagination_service.get_pagination_keyboard(user_id)
-        
         # Обновляем сообщение
-        await callback.message.edit_text(response_text, reply_markup=keyboard)
+        await delivery_service.edit_text(callback.message, rendered.text, reply_markup=rendered.keyboard)
         
-        logger.info(f"Updated pagination for user {user_id}, page {page}")
+        logger.info(f"Updated pagination {session_id} for user {user_id}, page {page}")
         
     except Exception as e:
         logger.error(f"Error in pagination callback for user {user_id}: {e}")
-        await callback.message.answer(format_error_message("general"))
+        await delivery_service.answer(callback.message, format_error_message("general"))
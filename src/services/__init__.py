@@ -4,4 +4,9 @@
 Содержит:
 - llm_service.py - работа с OpenRouter API и LLM
 - cache_service.py - кэширование ответов LLM
+- catalog_service.py - локальный каталог аниме с инвертированными индексами
+- intent_service.py - классификатор намерений текстовых сообщений
+- model_router.py - выбор модели по задержке, ошибкам и стоимости
+- key_pool.py - пул API ключей OpenRouter с балансировкой и карантином
+- container.py - ленивое создание и запуск сервисов
 """
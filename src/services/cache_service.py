@@ -2,6 +2,8 @@
 Сервис кэширования ответов LLM для экономии API-вызовов.
 """
 
+import asyncio
+import functools
 import json
 import hashlib
 import time
@@ -9,41 +11,160 @@ import os
 from typing import Optional, Dict, Any
 from pathlib import Path
 
+from src.services.container import services
 from src.utils.config import config
+from src.utils.init_data import CACHE_FILE_NAME, init_data_structure
 from src.utils.logger import logger
+from src.utils.metrics import metrics
+from src.utils.tracing import current_span, traced
+
+cache_lookups = metrics.counter("cache_lookups_total", "Обращения к кэшу LLM ответов", ("result",))
+cache_hits = cache_lookups.labels("hit")
+cache_misses = cache_lookups.labels("miss")
+cache_expired = cache_lookups.labels("expired")
+cache_stale = cache_lookups.labels("stale")
+cache_negative = cache_lookups.labels("negative")
+
+# Лимит негативных записей: при превышении вычищаются истекшие
+MAX_NEGATIVE_ENTRIES = 10000
+
+
+def parse_cache_incrementally(text: str) -> Dict[str, Any]:
+    """
+    Разбирает JSON объект кэша по одной записи.
+    
+    json.loads держит GIL на весь разбор, и event loop стоит, даже если
+    разбор идет в другом потоке. Здесь каждая запись разбирается отдельным
+    вызовом, и между ними интерпретатор может переключиться на event loop.
+    
+    Args:
+        text: Содержимое файла кэша (JSON объект)
+        
+    Returns:
+        Словарь кэша
+    """
+    decoder = json.JSONDecoder()
+    skip = json.decoder.WHITESPACE.match
+    cache: Dict[str, Any] = {}
+    
+    index = skip(text, 0).end()
+    if text[index:index + 1] != "{":
+        raise ValueError("cache file is not a JSON object")
+    index = skip(text, index + 1).end()
+    if text[index:index + 1] == "}":
+        return cache
+    
+    while True:
+        key, index = decoder.raw_decode(text, index)
+        index = skip(text, index).end()
+        if text[index:index + 1] != ":":
+            raise ValueError(f"expected ':' at {index}")
+        value, index = decoder.raw_decode(text, skip(text, index + 1).end())
+        cache[key] = value
+        
+        index = skip(text, index).end()
+        delimiter = text[index:index + 1]
+        if delimiter == "}":
+            return cache
+        if delimiter != ",":
+            raise ValueError(f"expected ',' or '}}' at {index}")
+        index = skip(text, index + 1).end()
 
 
 class CacheService:
     """Сервис для кэширования ответов LLM."""
     
     def __init__(self):
-        """Инициализация сервиса кэширования."""
+        """Инициализация сервиса кэширования (без чтения файла - см. load)."""
         self.cache_dir = Path(config.CACHE_DIR)
-        self.cache_file = self.cache_dir / "llm_cache.json"
+        self.cache_file = self.cache_dir / CACHE_FILE_NAME
         self.ttl_hours = config.CACHE_TTL_HOURS
+        # Истекшие записи еще столько часов хранятся на случай отказа API
+        self.stale_hours = config.CACHE_STALE_HOURS
+        self.negative_seconds = config.CACHE_NEGATIVE_SECONDS
+        # Сохранять ли кэш в файл (False, если хранилище общее для процессов)
+        self.persist = True
+        # Хранилище - прокси в другом процессе: обращения к нему идут через IPC
+        self.shared = False
+        
+        # До загрузки файла кэш пуст: обращения дают промахи, а не ждут
+        self.cache: Dict[str, Any] = {}
+        self.loaded = False
+        self._loading = False
+        # Сохранение, отложенное до конца загрузки
+        self._save_pending = False
         
-        # Создаем папку кэша, если не существует
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Негативный кэш: хэш запроса -> момент (monotonic), до которого
+        # запрос не отправляется в API после неудачи. Только в памяти процесса.
+        self.negative: Dict[str, float] = {}
+    
+    async def load(self) -> None:
+        """Загружает кэш из файла в потоке, не блокируя event loop."""
+        if self.loaded or self._loading:
+            return
+        self._loading = True
+        try:
+            loaded = await asyncio.to_thread(self._load_cache)
+            # Записи, сохраненные во время загрузки, новее файла
+            loaded.update(self.cache)
+            self.cache = loaded
+        finally:
+            self._loading = False
+            self.loaded = True
         
-        # Загружаем существующий кэш
-        self._load_cache()
+        if self._save_pending:
+            self._save_pending = False
+            self._save_cache()
     
-    def _load_cache(self) -> None:
-        """Загружает кэш из файла."""
+    def _load_cache(self) -> Dict[str, Any]:
+        """Читает кэш из файла, создавая папку и пустой файл при первом запуске."""
         try:
-            if self.cache_file.exists():
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    self.cache = json.load(f)
-                logger.info(f"Загружен кэш из {self.cache_file}")
-            else:
-                self.cache = {}
-                logger.info("Создан новый кэш")
+            if init_data_structure(self.cache_dir):
+                logger.info("Создан пустой файл кэша")
+                return {}
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cache = parse_cache_incrementally(f.read())
+            logger.info(f"Загружен кэш из {self.cache_file}: {len(cache)} записей")
+            return cache
         except Exception as e:
             logger.error(f"Ошибка загрузки кэша: {e}")
-            self.cache = {}
+            return {}
+    
+    async def flush(self) -> None:
+        """Сохраняет кэш при остановке, если сохранение было отложено загрузкой."""
+        if not self._save_pending:
+            return
+        self._save_pending = False
+        # Загрузка могла быть прервана остановкой: новые записи дописываются
+        # к содержимому файла, а не затирают его
+        loaded = await asyncio.to_thread(self._load_cache)
+        loaded.update(self.cache)
+        self.cache = loaded
+        await asyncio.to_thread(self._save_cache)
+        logger.info(f"Кэш сохранен при остановке: {len(self.cache)} записей")
+    
+    def use_shared_store(self, store) -> None:
+        """
+        Переключает сервис на общее хранилище кэша (например, прокси словаря
+        из менеджера процессов). Файл в этом режиме сохраняет владелец хранилища.
+        
+        Args:
+            store: Объект с интерфейсом словаря
+        """
+        self.cache = store
+        self.persist = False
+        self.shared = True
+        self.loaded = True
+        logger.info("Кэш переключен на общее хранилище")
     
     def _save_cache(self) -> None:
         """Сохраняет кэш в файл."""
+        if not self.persist:
+            return
+        if self._loading:
+            # Запись сейчас затерла бы еще не прочитанный файл
+            self._save_pending = True
+            return
         try:
             with open(self.cache_file, 'w', encoding='utf-8') as f:
                 json.dump(self.cache, f, ensure_ascii=False, indent=2)
@@ -51,6 +172,38 @@ class CacheService:
         except Exception as e:
             logger.error(f"Ошибка сохранения кэша: {e}")
     
+    async def _get_entry(self, query_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Читает запись кэша. Для общего хранилища это блокирующий IPC вызов -
+        он выполняется в потоке, чтобы не останавливать event loop.
+        
+        Args:
+            query_hash: Хэш запроса
+            
+        Returns:
+            Запись кэша или None
+        """
+        if self.shared:
+            return await asyncio.to_thread(self.cache.get, query_hash)
+        return self.cache.get(query_hash)
+    
+    async def _set_entry(self, query_hash: str, cache_entry: Optional[Dict[str, Any]]) -> None:
+        """
+        Записывает (None - удаляет) запись кэша, для общего хранилища - в потоке.
+        
+        Args:
+            query_hash: Хэш запроса
+            cache_entry: Новая запись или None
+        """
+        if cache_entry is None:
+            update = functools.partial(self.cache.pop, query_hash, None)
+        else:
+            update = functools.partial(self.cache.__setitem__, query_hash, cache_entry)
+        if self.shared:
+            await asyncio.to_thread(update)
+        else:
+            update()
+    
     def _generate_hash(self, query: str) -> str:
         """
         Генерирует MD5 хэш от нормализованного запроса.
@@ -79,6 +232,21 @@ class CacheService:
         ttl_seconds = self.ttl_hours * 3600
         return (current_time - timestamp) > ttl_seconds
     
+    def _is_beyond_grace(self, timestamp: int) -> bool:
+        """
+        Проверяет, вышла ли запись и за TTL, и за срок хранения устаревших.
+        
+        Args:
+            timestamp: Временная метка создания записи
+            
+        Returns:
+            True если запись больше не годится даже при отказе API
+        """
+        current_time = int(time.time())
+        grace_seconds = (self.ttl_hours + self.stale_hours) * 3600
+        return (current_time - timestamp) > grace_seconds
+    
+    @traced("cache.get")
     async def get_cached_response(self, query: str) -> Optional[str]:
         """
         Получает ответ из кэша по запросу.
@@ -91,21 +259,83 @@ class CacheService:
         """
         query_hash = self._generate_hash(query)
         
-        if query_hash in self.cache:
-            cache_entry = self.cache[query_hash]
-            
+        # Один get вместо in + [] - для общего хранилища это один IPC вызов
+        cache_entry = await self._get_entry(query_hash)
+        if cache_entry is not None:
             # Проверяем TTL
             if self._is_expired(cache_entry['timestamp']):
+                cache_expired.inc()
+                current_span().set_attribute("result", "expired")
                 logger.info(f"Запись кэша истекла для запроса: {query[:50]}...")
-                del self.cache[query_hash]
-                self._save_cache()
+                # Устаревшая запись остается на случай отказа API (get_stale_response)
+                if self._is_beyond_grace(cache_entry['timestamp']):
+                    await self._set_entry(query_hash, None)
+                    self._save_cache()
                 return None
             
+            cache_hits.inc()
+            current_span().set_attribute("result", "hit")
             logger.info(f"Найден ответ в кэше для запроса: {query[:50]}...")
             return cache_entry['response']
         
+        cache_misses.inc()
+        current_span().set_attribute("result", "miss")
         return None
     
+    async def get_stale_response(self, query: str) -> Optional[str]:
+        """
+        Получает ответ из кэша с истекшим TTL (для отказа API).
+        
+        Args:
+            query: Запрос пользователя
+            
+        Returns:
+            Ответ, если запись еще в сроке хранения устаревших, иначе None
+        """
+        cache_entry = await self._get_entry(self._generate_hash(query))
+        if cache_entry is None or self._is_beyond_grace(cache_entry['timestamp']):
+            return None
+        cache_stale.inc()
+        logger.info(f"Отдаем устаревший ответ из кэша для запроса: {query[:50]}...")
+        return cache_entry['response']
+    
+    def mark_failed(self, query: str) -> None:
+        """
+        Запоминает неудачный запрос в негативном кэше.
+        
+        Args:
+            query: Запрос пользователя
+        """
+        if self.negative_seconds <= 0:
+            return
+        now = time.monotonic()
+        if len(self.negative) >= MAX_NEGATIVE_ENTRIES:
+            self.negative = {key: until for key, until in self.negative.items() if until > now}
+        self.negative[self._generate_hash(query)] = now + self.negative_seconds
+    
+    def is_failing(self, query: str) -> bool:
+        """
+        Проверяет, не завершился ли этот запрос неудачей только что.
+        
+        Args:
+            query: Запрос пользователя
+            
+        Returns:
+            True, если запрос в негативном кэше и в API его отправлять не стоит
+        """
+        if not self.negative:
+            return False
+        query_hash = self._generate_hash(query)
+        until = self.negative.get(query_hash)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del self.negative[query_hash]
+            return False
+        cache_negative.inc()
+        return True
+    
+    @traced("cache.save")
     async def save_response(self, query: str, response: str, model: str) -> None:
         """
         Сохраняет ответ в кэш.
@@ -125,14 +355,14 @@ class CacheService:
             'model': model
         }
         
-        self.cache[query_hash] = cache_entry
+        await self._set_entry(query_hash, cache_entry)
         self._save_cache()
         
         logger.info(f"Ответ сохранен в кэш для запроса: {query[:50]}...")
     
     async def clear_expired(self) -> int:
         """
-        Очищает истекшие записи из кэша.
+        Очищает из кэша записи, вышедшие за срок хранения устаревших.
         
         Returns:
             Количество удаленных записей
@@ -140,7 +370,7 @@ class CacheService:
         expired_keys = []
         
         for key, entry in self.cache.items():
-            if self._is_expired(entry['timestamp']):
+            if self._is_beyond_grace(entry['timestamp']):
                 expired_keys.append(key)
         
         for key in expired_keys:
@@ -167,9 +397,14 @@ class CacheService:
             'total_entries': total_entries,
             'expired_entries': expired_entries,
             'valid_entries': total_entries - expired_entries,
+            'negative_entries': len(self.negative),
             'cache_file_size': self.cache_file.stat().st_size if self.cache_file.exists() else 0
         }
 
 
-# Глобальный экземпляр сервиса кэширования
-cache_service = CacheService()
+# Глобальный сервис кэширования (создается при первом обращении, файл
+# читается в фоне при запуске бота)
+cache_service = services.register(
+    "cache", CacheService, startup=CacheService.load, shutdown=CacheService.flush, background=True
+)
+metrics.gauge("cache_entries", "Записей в кэше LLM ответов").set_function(lambda: len(cache_service.cache))
@@ -0,0 +1,546 @@
+"""
+Локальный каталог аниме с инвертированными индексами.
+
+Каталог (src/data/anime_catalog.json) загружается в колонки: списки строк и
+компактные array для года, рейтинга и числа серий. Записи упорядочены по
+убыванию рейтинга, поэтому номер записи - одновременно ее место в выдаче.
+
+Индексы по жанру, тегу, году, формату и слову названия - битовые множества
+на int: бит i установлен, если запись i подходит. Пересечение фильтров - это
+операция &, а первые k установленных битов - k лучших по рейтингу записей.
+Запросы вида "аниме про спорт 2010-х" отвечаются за микросекунды без LLM,
+все остальное (сравнения, "похожее на...", отрицания) уходит в LLM.
+
+Для открытых запросов каталог подбирает кандидатов ранжированием BM25
+(src/utils/bm25.py), и в промпт попадают только они, а не знания модели.
+"""
+
+import asyncio
+import json
+import re
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.services.container import services
+from src.utils.bm25 import BM25_AVAILABLE, BM25Index
+from src.utils.config import config
+from src.utils.logger import logger
+from src.utils.message_utils import AnimeItem, format_anime_list
+from src.utils.metrics import metrics
+from src.utils.tracing import start_span
+
+CATALOG_FILE = Path(__file__).resolve().parent.parent / "data" / "anime_catalog.json"
+
+catalog_queries = metrics.counter("catalog_queries_total", "Запросы к локальному каталогу", ("result",))
+catalog_search_seconds = metrics.histogram("catalog_search_seconds", "Время разбора и поиска по каталогу")
+catalog_retrieve_seconds = metrics.histogram("catalog_retrieve_seconds", "Время ранжирования каталога BM25")
+
+# Русские названия жанров и тегов для ответа
+GENRE_NAMES = {
+    "action": "экшен",
+    "adventure": "приключения",
+    "comedy": "комедия",
+    "drama": "драма",
+    "fantasy": "фэнтези",
+    "horror": "ужасы",
+    "mecha": "меха",
+    "music": "музыка",
+    "mystery": "мистика",
+    "psychological": "психология",
+    "romance": "романтика",
+    "sci-fi": "фантастика",
+    "slice_of_life": "повседневность",
+    "sports": "спорт",
+    "supernatural": "сверхъестественное",
+    "thriller": "триллер",
+}
+
+KIND_NAMES = {"tv": "сериал", "movie": "фильм", "ova": "OVA"}
+
+# Сериалы до SHORT_EPISODES серий - короткие, от LONG_EPISODES - длинные
+SHORT_EPISODES = 13
+LONG_EPISODES = 50
+
+# Длина основы слова для BM25 ("титанов" и "титаны" -> "титан")
+TERM_PREFIX = 5
+# Вес рейтинга в оценке BM25 (только упорядочивает близкие оценки)
+RATING_PRIOR = 0.01
+
+# Основы слов запроса -> (поле фильтра, значение). Слово сопоставляется
+# по самому длинному префиксу, так "спортивное" и "спорт" дают один жанр.
+VOCABULARY: Dict[str, Tuple[str, Optional[str]]] = {}
+
+
+def _vocabulary(field_name: str, value: Optional[str], *stems: str) -> None:
+    for stem in stems:
+        VOCABULARY[stem] = (field_name, value)
+
+
+_vocabulary("genre", "action", "экшен", "экшн", "боевик", "драк", "сражен", "битв")
+_vocabulary("genre", "adventure", "приключен")
+_vocabulary("genre", "comedy", "комеди", "смешн", "юмор", "ржачн", "угарн")
+_vocabulary("genre", "drama", "драм")
+_vocabulary("genre", "fantasy", "фэнтез", "фентез")
+_vocabulary("genre", "horror", "ужас", "хоррор", "страшн", "жутк")
+_vocabulary("genre", "mecha", "меха", "мехи", "робот")
+_vocabulary("genre", "music", "музык")
+_vocabulary("genre", "mystery", "мистик", "загадк")
+_vocabulary("genre", "psychological", "психолог")
+_vocabulary("genre", "romance", "романт", "романс", "любов")
+_vocabulary("genre", "sci-fi", "фантастик", "научн", "sci")
+_vocabulary("genre", "slice_of_life", "повседнев")
+_vocabulary("genre", "sports", "спорт")
+_vocabulary("genre", "supernatural", "сверхъестеств")
+_vocabulary("genre", "thriller", "триллер")
+
+_vocabulary("tag", "school", "школ", "старшеклассн")
+_vocabulary("tag", "space", "космос", "космич")
+_vocabulary("tag", "military", "военн", "войн", "арми")
+_vocabulary("tag", "isekai", "исекай", "исэкай", "попадан", "перерожд", "реинкарн")
+_vocabulary("tag", "vampires", "вампир")
+_vocabulary("tag", "samurai", "самура")
+_vocabulary("tag", "time_travel", "временн", "петл")
+_vocabulary("tag", "post_apocalyptic", "постапок", "апокалип")
+_vocabulary("tag", "martial_arts", "единоборств", "бокс", "боевыми", "боевых")
+_vocabulary("tag", "cooking", "кулинар", "готовк", "повар", "кухн")
+_vocabulary("tag", "detective", "детектив", "расследов")
+_vocabulary("tag", "magic", "маги", "волшеб", "колдов", "ведьм")
+_vocabulary("tag", "superheroes", "супергер")
+_vocabulary("tag", "historical", "историческ", "средневек")
+_vocabulary("tag", "idols", "айдол", "идол")
+_vocabulary("tag", "game", "игр", "геймер")
+_vocabulary("tag", "dark", "мрачн", "жестк", "жесток", "темн")
+_vocabulary("tag", "family", "семейн", "детск")
+_vocabulary("tag", "cyberpunk", "киберпанк")
+
+_vocabulary("format", "movie", "фильм", "полнометраж")
+_vocabulary("format", "tv", "сериал")
+_vocabulary("format", "ova", "ova")
+_vocabulary("format", "short", "коротк", "недлинн")
+_vocabulary("format", "long", "длинн")
+
+# Слова-связки, не меняющие смысл фильтрующего запроса
+_vocabulary(
+    "stop", None,
+    "аниме", "анимэ", "анимешк", "тайтл", "посовет", "порекоменд", "покаж", "подбер",
+    "подскаж", "найд", "хоч", "хотел", "дай", "давай", "скаж", "нужн", "ищу",
+    "что", "чтоб", "нибуд", "нить", "либо", "как", "какое", "какой", "какие", "какую",
+    "мне", "нам", "есть", "можно", "пожалуйст", "плиз", "жанр", "тем", "год", "лет",
+    "лучш", "топ", "хорош", "интересн", "крут", "годн", "популярн", "посмотр", "глян",
+    "смотр", "вечер", "список", "подборк", "вариант", "штук", "эпох",
+    "серия", "серии", "серий", "сериям",
+)
+
+# Короткие служебные слова сопоставляются только целиком
+STOP_WORDS = {"и", "или", "а", "в", "во", "с", "со", "о", "об", "про", "на", "за", "по", "из", "для", "мне", "то", "же", "бы", "ну", "х", "е", "fi"}
+
+# Отрицания и сравнения меняют смысл запроса - такие запросы отдаем LLM
+NEGATIONS = {"не", "без", "кроме", "но", "похож", "похожее", "похожие", "вроде", "типа"}
+
+_WORD_RE = re.compile(r"[a-zа-я0-9]+")
+_TOP_RE = re.compile(r"\bтоп[\s-]*(\d{1,2})\b")
+_RANGE_RE = re.compile(r"\b(?:с|от)?\s*(\d{4})\s*(?:-|–|—|по|до)\s*(\d{4})\b")
+_DECADE_RE = re.compile(r"\b(\d{2}|\d{3}0)\s*-?\s*(?:х|ых|е|ые)\b")
+_AFTER_RE = re.compile(r"\b(после|с|от|новее|позже)\s+(\d{4})\b")
+_BEFORE_RE = re.compile(r"\b(до|раньше|старше|ранее)\s+(\d{4})\b")
+_YEAR_RE = re.compile(r"\b(\d{4})\b")
+
+
+@dataclass
+class CatalogQuery:
+    """Разобранный фильтрующий запрос."""
+    genres: List[str] = field(default_factory=list)
+    tags: List[str] = field(default_factory=list)
+    formats: List[str] = field(default_factory=list)
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    limit: int = 5
+
+    @property
+    def is_empty(self) -> bool:
+        """Нет ни одного фильтра."""
+        return not (self.genres or self.tags or self.formats
+                    or self.year_from is not None or self.year_to is not None)
+
+
+def _decade(value: str) -> Tuple[int, int]:
+    """Десятилетие по "90", "2010" и т.п."""
+    start = int(value)
+    if start < 100:
+        start += 2000 if start <= 30 else 1900
+    return start, start + 9
+
+
+def parse_catalog_query(text: str) -> Optional[CatalogQuery]:
+    """
+    Разбирает запрос пользователя на фильтры каталога.
+
+    Args:
+        text: Сообщение пользователя
+
+    Returns:
+        Фильтры или None, если запрос открытый (есть слова вне словаря,
+        отрицания или нет ни одного фильтра)
+    """
+    text = text.lower().replace("ё", "е")
+    query = CatalogQuery()
+
+    # Числа разбираем до слов, вырезая найденное из текста
+    match = _TOP_RE.search(text)
+    if match:
+        query.limit = max(1, min(int(match.group(1)), 10))
+        text = text[:match.start()] + " " + text[match.end():]
+
+    for pattern in (_RANGE_RE, _DECADE_RE, _AFTER_RE, _BEFORE_RE, _YEAR_RE):
+        match = pattern.search(text)
+        if not match:
+            continue
+        if pattern is _RANGE_RE:
+            query.year_from, query.year_to = sorted((int(match.group(1)), int(match.group(2))))
+        elif pattern is _DECADE_RE:
+            query.year_from, query.year_to = _decade(match.group(1))
+        elif pattern is _AFTER_RE:
+            year = int(match.group(2))
+            query.year_from = year + 1 if match.group(1) in ("после", "новее", "позже") else year
+        elif pattern is _BEFORE_RE:
+            query.year_to = int(match.group(2)) - 1
+        else:
+            query.year_from = query.year_to = int(match.group(1))
+        text = text[:match.start()] + " " + text[match.end():]
+        break
+
+    for word in _WORD_RE.findall(text):
+        if word in NEGATIONS:
+            return None
+        if word in STOP_WORDS:
+            continue
+        if word.isdigit():
+            # Лишние числа (второй год, номер сезона) - не наш случай
+            return None
+        for end in range(len(word), 2, -1):
+            entry = VOCABULARY.get(word[:end])
+            if entry is not None:
+                break
+        else:
+            return None
+        field_name, value = entry
+        target = {"genre": query.genres, "tag": query.tags, "format": query.formats}.get(field_name)
+        if target is not None and value not in target:
+            target.append(value)
+
+    if query.is_empty:
+        return None
+    return query
+
+
+def query_terms(text: str) -> List[str]:
+    """
+    Термы запроса для BM25: признаки из словаря, годы и основы остальных слов.
+
+    Args:
+        text: Сообщение пользователя
+    """
+    terms = []
+    for word in _WORD_RE.findall(text.lower().replace("ё", "е")):
+        if word in STOP_WORDS or word in NEGATIONS:
+            continue
+        if word.isdigit():
+            if len(word) == 4:
+                terms.append(f"year:{word}")
+                terms.append(f"decade:{int(word) // 10}")
+            continue
+        for end in range(len(word), 2, -1):
+            entry = VOCABULARY.get(word[:end])
+            if entry is not None:
+                field_name, value = entry
+                if field_name != "stop":
+                    terms.append(f"{field_name}:{value}")
+                break
+        else:
+            terms.append(word[:TERM_PREFIX])
+    return terms
+
+
+def _bitset(indices: List[int], size: int) -> int:
+    """Битовое множество из номеров записей (через bytearray - линейно по размеру)."""
+    bits = bytearray((size + 7) // 8)
+    for index in indices:
+        bits[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(bits, "little")
+
+
+class CatalogService:
+    """Локальный каталог аниме с поиском по инвертированным индексам."""
+
+    def __init__(self, path: Path = None):
+        """Инициализация каталога (без чтения файла - см. load)."""
+        self.path = Path(path or config.CATALOG_FILE or CATALOG_FILE)
+        self.loaded = False
+
+        # Колонки: i-я позиция - i-я запись по убыванию рейтинга
+        self.titles: List[str] = []
+        self.years = array("H")
+        self.ratings = array("f")
+        self.episodes = array("H")
+        self.kinds: List[str] = []
+        self.genres: List[Tuple[str, ...]] = []
+
+        # Инвертированные индексы: значение -> битовое множество записей
+        self.by_genre: Dict[str, int] = {}
+        self.by_tag: Dict[str, int] = {}
+        self.by_format: Dict[str, int] = {}
+        self.by_year: Dict[int, int] = {}
+        self.by_title_token: Dict[str, int] = {}
+        self._year_keys: List[int] = []
+        self.all_items = 0
+        # Ранжирование BM25 для открытых запросов (None без numpy)
+        self.bm25: Optional[BM25Index] = None
+
+    async def load(self) -> None:
+        """Загружает каталог в потоке, не блокируя event loop."""
+        if self.loaded:
+            return
+        await asyncio.to_thread(self._load_catalog)
+
+    def _load_catalog(self) -> None:
+        """Читает файл каталога и строит колонки и индексы."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки каталога {self.path}: {e}")
+            return
+        self.build(records)
+        logger.info(f"Загружен каталог {self.path}: {len(self.titles)} тайтлов")
+        if self.bm25 is None and config.RETRIEVAL_ENABLED:
+            logger.warning("numpy не установлен, поиск кандидатов для промпта отключен")
+
+    def build(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Строит колонки и индексы по списку записей.
+
+        Args:
+            records: Записи с полями title, synonyms, year, rating, episodes,
+                kind, genres, tags
+        """
+        records = sorted(records, key=lambda record: -float(record.get("rating", 0)))
+
+        titles, kinds, genres = [], [], []
+        years, ratings, episodes = array("H"), array("f"), array("H")
+        # Сначала списки номеров записей, битовые множества - в конце одним проходом
+        postings: Dict[Tuple[str, Any], List[int]] = defaultdict(list)
+        documents: List[List[str]] = []
+
+        for index, record in enumerate(records):
+            kind = record.get("kind", "tv")
+            count = int(record.get("episodes", 0))
+            year = int(record.get("year", 0))
+
+            titles.append(record["title"])
+            kinds.append(kind)
+            genres.append(tuple(record.get("genres", ())))
+            years.append(year)
+            ratings.append(float(record.get("rating", 0)))
+            episodes.append(min(count, 0xFFFF))
+
+            formats = [kind]
+            if kind == "tv" and 0 < count <= SHORT_EPISODES:
+                formats.append("short")
+            if count >= LONG_EPISODES:
+                formats.append("long")
+
+            keys = [("genre", genre) for genre in record.get("genres", ())]
+            keys += [("tag", tag) for tag in record.get("tags", ())]
+            keys += [("format", name) for name in formats]
+            keys.append(("year", year))
+            title_tokens = set()
+            for name in [record["title"], *record.get("synonyms", ())]:
+                title_tokens.update(self._title_tokens(name))
+            keys += [("title", token) for token in title_tokens]
+            for key in keys:
+                postings[key].append(index)
+
+            # Документ для BM25: основы слов названий и признаки записи
+            document = [token[:TERM_PREFIX] for token in title_tokens]
+            document += [f"{field_name}:{value}" for field_name, value in keys if field_name != "title"]
+            document.append(f"decade:{year // 10}")
+            documents.append(document)
+
+        indexes: Dict[str, Dict[Any, int]] = defaultdict(dict)
+        for (field_name, value), indices in postings.items():
+            indexes[field_name][value] = _bitset(indices, len(titles))
+
+        self.titles, self.kinds, self.genres = titles, kinds, genres
+        self.years, self.ratings, self.episodes = years, ratings, episodes
+        self.by_genre, self.by_tag = indexes["genre"], indexes["tag"]
+        self.by_format, self.by_year = indexes["format"], indexes["year"]
+        self.by_title_token = indexes["title"]
+        self._year_keys = sorted(self.by_year)
+        self.all_items = (1 << len(titles)) - 1
+
+        self.bm25 = None
+        if config.RETRIEVAL_ENABLED and BM25_AVAILABLE and titles:
+            # Рейтинг как небольшая добавка: из равных по BM25 выше более рейтинговые
+            self.bm25 = BM25Index(documents, prior=[rating * RATING_PRIOR for rating in ratings])
+        self.loaded = True
+
+    @staticmethod
+    def _title_tokens(text: str) -> List[str]:
+        """Слова названия для индекса (нижний регистр, ё -> е)."""
+        return _WORD_RE.findall(text.lower().replace("ё", "е"))
+
+    def _years_mask(self, year_from: Optional[int], year_to: Optional[int]) -> int:
+        """Битовое множество записей с годом в диапазоне (границы включительно)."""
+        keys = self._year_keys
+        start = 0 if year_from is None else bisect_left(keys, year_from)
+        end = len(keys) if year_to is None else bisect_right(keys, year_to)
+        mask = 0
+        for year in keys[start:end]:
+            mask |= self.by_year[year]
+        return mask
+
+    def select(self, query: CatalogQuery) -> int:
+        """
+        Битовое множество записей, подходящих под все фильтры.
+
+        Args:
+            query: Фильтры запроса
+        """
+        mask = self.all_items
+        for genre in query.genres:
+            mask &= self.by_genre.get(genre, 0)
+        for tag in query.tags:
+            mask &= self.by_tag.get(tag, 0)
+        for name in query.formats:
+            mask &= self.by_format.get(name, 0)
+        if query.year_from is not None or query.year_to is not None:
+            mask &= self._years_mask(query.year_from, query.year_to)
+        return mask
+
+    def top(self, mask: int, limit: int) -> List[int]:
+        """Номера первых limit записей множества (они же лучшие по рейтингу)."""
+        result = []
+        while mask and len(result) < limit:
+            lowest = mask & -mask
+            result.append(lowest.bit_length() - 1)
+            mask ^= lowest
+        return result
+
+    def item(self, index: int) -> AnimeItem:
+        """Запись каталога в виде AnimeItem для форматирования."""
+        genres = ", ".join(GENRE_NAMES.get(genre, genre) for genre in self.genres[index][:3])
+        kind = self.kinds[index]
+        if kind == "movie":
+            description = f"{genres}; {KIND_NAMES[kind]}"
+        else:
+            description = f"{genres}; {KIND_NAMES.get(kind, kind)}, {self.episodes[index]} эп."
+        return AnimeItem(
+            title=self.titles[index],
+            year=self.years[index],
+            rating=f"{self.ratings[index]:.1f}",
+            description=description,
+        )
+
+    def search(self, query: CatalogQuery) -> List[AnimeItem]:
+        """
+        Лучшие по рейтингу записи под фильтры запроса.
+
+        Args:
+            query: Фильтры запроса
+
+        Returns:
+            До query.limit записей
+        """
+        return [self.item(index) for index in self.top(self.select(query), query.limit)]
+
+    def find_title(self, text: str) -> Optional[AnimeItem]:
+        """
+        Запись, в названии или синонимах которой есть все слова текста.
+
+        Args:
+            text: Название или его часть
+
+        Returns:
+            Самая рейтинговая подходящая запись или None
+        """
+        tokens = self._title_tokens(text)
+        if not tokens or not self.loaded:
+            return None
+        mask = self.all_items
+        for token in tokens:
+            mask &= self.by_title_token.get(token, 0)
+            if not mask:
+                return None
+        return self.item(self.top(mask, 1)[0])
+
+    def retrieve(self, text: str, k: int = None) -> List[int]:
+        """
+        Кандидаты из каталога для открытого запроса (ранжирование BM25).
+
+        Args:
+            text: Сообщение пользователя
+            k: Сколько кандидатов вернуть (по умолчанию RETRIEVAL_TOP_K)
+
+        Returns:
+            Номера записей по убыванию оценки (пусто без numpy или совпадений)
+        """
+        if self.bm25 is None:
+            return []
+        started = time.perf_counter()
+        with start_span("catalog.retrieve") as span:
+            ranked = self.bm25.top(query_terms(text), k or config.RETRIEVAL_TOP_K)
+            span.set_attribute("catalog.candidates", len(ranked))
+        catalog_retrieve_seconds.observe(time.perf_counter() - started)
+        return [index for index, _ in ranked]
+
+    def format_candidates(self, indices: List[int]) -> str:
+        """Компактный список кандидатов для промпта: строка на тайтл."""
+        lines = []
+        for index in indices:
+            genres = ", ".join(GENRE_NAMES.get(genre, genre) for genre in self.genres[index][:3])
+            kind = self.kinds[index]
+            size = KIND_NAMES[kind] if kind == "movie" else f"{self.episodes[index]} эп."
+            lines.append(
+                f"- {self.titles[index]} ({self.years[index]}, {self.ratings[index]:.1f}, {genres}, {size})"
+            )
+        return "\n".join(lines)
+
+    def answer(self, text: str) -> Optional[str]:
+        """
+        Отвечает на фильтрующий запрос из каталога без LLM.
+
+        Args:
+            text: Сообщение пользователя
+
+        Returns:
+            Готовый ответ или None, если запрос нужно отдать LLM
+        """
+        if not config.CATALOG_ENABLED or not self.loaded:
+            return None
+
+        started = time.perf_counter()
+        with start_span("catalog.answer") as span:
+            query = parse_catalog_query(text)
+            items = self.search(query) if query else []
+            span.set_attribute("catalog.results", len(items))
+        catalog_search_seconds.observe(time.perf_counter() - started)
+
+        if query is None:
+            catalog_queries.labels("open").inc()
+            return None
+        if not items:
+            # В каталоге пусто - возможно, LLM знает что-то за его пределами
+            catalog_queries.labels("empty").inc()
+            return None
+
+        catalog_queries.labels("answered").inc()
+        return "Хм... Вот что есть. Смотри.\n\n" + format_anime_list(items)
+
+
+# Глобальный каталог (создается при первом обращении, загружается в фоне)
+catalog_service = services.register("catalog", CatalogService, startup=CatalogService.load, background=True)
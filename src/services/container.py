@@ -0,0 +1,160 @@
+"""
+Контейнер сервисов: ленивое создание и асинхронный запуск.
+
+Сервис регистрируется фабрикой и получает прокси LazyService, который можно
+импортировать как обычный синглтон: сам сервис создается при первом обращении
+к атрибуту, то есть уже после config.validate(), а не при импорте модуля.
+
+Тяжелая инициализация (чтение файлов, создание клиентов) вынесена в
+startup-хуки, которые выполняются при запуске Dispatcher (emit_startup).
+Фоновые хуки (например, загрузка кэша) не задерживают прием обновлений.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.utils.config import config
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+ServiceHook = Callable[[Any], Awaitable[None]]
+
+startup_seconds = metrics.gauge(
+    "service_startup_seconds", "Длительность startup-хука сервиса", ("service",)
+)
+
+
+@dataclass
+class ServiceEntry:
+    """Регистрация сервиса в контейнере."""
+    name: str
+    factory: Callable[[], Any]
+    startup: Optional[ServiceHook] = None
+    shutdown: Optional[ServiceHook] = None
+    background: bool = False
+    instance: Any = None
+    built: bool = False
+
+
+class LazyService:
+    """Прокси сервиса: создает сервис при первом обращении к атрибуту."""
+
+    __slots__ = ("_container", "_name")
+
+    def __init__(self, container: "ServiceContainer", name: str):
+        object.__setattr__(self, "_container", container)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._container.get(self._name), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self._container.get(self._name), attr, value)
+
+    def __repr__(self) -> str:
+        return f"<LazyService {self._name}>"
+
+
+class ServiceContainer:
+    """Реестр сервисов приложения."""
+
+    def __init__(self):
+        """Инициализация контейнера."""
+        self._entries: Dict[str, ServiceEntry] = {}
+        self._background: List[asyncio.Task] = []
+        self.started = False
+
+    def register(self, name: str, factory: Callable[[], Any], startup: ServiceHook = None,
+                 shutdown: ServiceHook = None, background: bool = False) -> LazyService:
+        """
+        Зарегистрировать сервис.
+
+        Args:
+            name: Имя сервиса
+            factory: Функция создания сервиса (должна быть дешевой: без I/O)
+            startup: Async хук запуска, получает экземпляр сервиса
+            shutdown: Async хук остановки, получает экземпляр сервиса
+            background: Выполнять startup-хук в фоне, не задерживая запуск
+
+        Returns:
+            Прокси сервиса для импорта вместо экземпляра
+        """
+        self._entries[name] = ServiceEntry(name, factory, startup, shutdown, background)
+        return LazyService(self, name)
+
+    def get(self, name: str) -> Any:
+        """
+        Экземпляр сервиса (создается при первом вызове).
+
+        Args:
+            name: Имя сервиса
+        """
+        entry = self._entries[name]
+        if not entry.built:
+            entry.instance = entry.factory()
+            entry.built = True
+        return entry.instance
+
+    async def startup(self) -> None:
+        """Выполнить startup-хуки: обычные по порядку, фоновые - задачами."""
+        if self.started:
+            return
+        self.started = True
+        started = time.perf_counter()
+
+        for entry in self._entries.values():
+            if entry.startup is None:
+                continue
+            if entry.background:
+                self._background.append(asyncio.create_task(self._run_startup(entry)))
+            else:
+                await self._run_startup(entry)
+
+        elapsed = time.perf_counter() - started
+        if elapsed > config.STARTUP_BUDGET_SECONDS:
+            logger.warning(
+                f"Service startup took {elapsed:.2f}s, budget {config.STARTUP_BUDGET_SECONDS}s"
+            )
+        else:
+            logger.info(f"Services started in {elapsed * 1000:.0f} ms")
+
+    async def _run_startup(self, entry: ServiceEntry) -> None:
+        """Выполнить startup-хук сервиса с замером времени."""
+        started = time.perf_counter()
+        try:
+            await entry.startup(self.get(entry.name))
+        except Exception as e:
+            # Фоновый хук не должен ронять бота: сервис работает в деградированном режиме
+            if not entry.background:
+                raise
+            logger.error(f"Background startup of {entry.name} failed: {e}")
+        elapsed = time.perf_counter() - started
+        startup_seconds.labels(entry.name).set(elapsed)
+        logger.info(f"Service {entry.name} started in {elapsed * 1000:.0f} ms")
+
+    async def wait_background(self, timeout: float = None) -> None:
+        """Дождаться фоновых startup-хуков."""
+        if self._background:
+            await asyncio.wait(self._background, timeout=timeout)
+
+    async def shutdown(self) -> None:
+        """Остановить фоновые хуки и выполнить shutdown-хуки в обратном порядке."""
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        self._background = []
+
+        for entry in reversed(list(self._entries.values())):
+            if entry.shutdown is None or not entry.built:
+                continue
+            try:
+                await entry.shutdown(entry.instance)
+            except Exception as e:
+                logger.error(f"Shutdown of {entry.name} failed: {e}")
+        self.started = False
+
+
+# Глобальный контейнер сервисов
+services = ServiceContainer()
@@ -0,0 +1,463 @@
+"""
+Сервис исходящей доставки сообщений в Telegram.
+
+Все ответы бота проходят через общую очередь с лимитами Telegram:
+глобальный token bucket (~30 сообщений/с) и отдельный bucket на каждый чат
+(~1 сообщение/с). Очередь приоритетная: ответы пользователю идут раньше
+правок и статусов "печатает". Ошибка RetryAfter не считается сбоем - чат
+блокируется на указанное время и отправка повторяется. Несколько правок
+одного сообщения, ожидающих в очереди, схлопываются в последнюю.
+
+Задание помнит дедлайн обновления, при обработке которого создано: правки и
+статусы, не успевшие до него (в очереди или после RetryAfter), отбрасываются.
+Ответы пользователю отправляются и после дедлайна - их ждут.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Message
+
+from src.utils.config import config
+from src.utils.deadline import expires_at
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+from src.utils.tracing import traced
+
+# Приоритеты (меньше - важнее)
+PRIORITY_REPLY = 0
+PRIORITY_EDIT = 1
+PRIORITY_ACTION = 2
+
+# Статус "печатает" старше этого времени уже бесполезен
+ACTION_STALE_SECONDS = 5.0
+# Через сколько секунд простоя удалять bucket чата
+CHAT_BUCKET_IDLE_SECONDS = 60.0
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity в запасе."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, now: float = None) -> float:
+        """
+        Взять токен, если он есть.
+
+        Returns:
+            0, если токен взят, иначе время ожидания в секундах
+        """
+        now = now if now is not None else time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        """Дождаться и взять токен."""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def block(self, seconds: float) -> None:
+        """Запретить отправку на seconds секунд (после RetryAfter)."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+@dataclass(order=True)
+class DeliveryJob:
+    """Задание на отправку в очереди."""
+    priority: int
+    seq: int
+    chat_id: Optional[int] = field(compare=False)
+    call: Callable[[], Awaitable[Any]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    coalesce_key: Optional[Hashable] = field(default=None, compare=False)
+    created_at: float = field(default_factory=time.monotonic, compare=False)
+    attempts: int = field(default=0, compare=False)
+    # Дедлайн обновления (time.monotonic), None - без дедлайна
+    deadline: Optional[float] = field(default=None, compare=False)
+
+    def is_expired(self, at: float) -> bool:
+        """Отправка к моменту at опоздает: статус устарел или прошел дедлайн правки."""
+        if self.priority == PRIORITY_ACTION and at - self.created_at > ACTION_STALE_SECONDS:
+            return True
+        return self.priority != PRIORITY_REPLY and self.deadline is not None and at > self.deadline
+
+
+class DeliveryService:
+    """Очередь исходящих вызовов Bot API с ограничением скорости."""
+
+    def __init__(self, global_rate: float = None, chat_rate: float = None,
+                 chat_burst: float = None, max_attempts: int = None):
+        """
+        Args:
+            global_rate: Сообщений в секунду на всего бота
+            chat_rate: Сообщений в секунду на один чат
+            chat_burst: Запас сообщений для коротких всплесков в чате
+            max_attempts: Максимум попыток при RetryAfter
+        """
+        self.global_bucket = TokenBucket(
+            global_rate or config.DELIVERY_GLOBAL_RATE,
+            global_rate or config.DELIVERY_GLOBAL_RATE
+        )
+        self.chat_rate = chat_rate or config.DELIVERY_CHAT_RATE
+        self.chat_burst = chat_burst or config.DELIVERY_CHAT_BURST
+        self.max_attempts = max_attempts or config.DELIVERY_MAX_ATTEMPTS
+
+        self._queue: List[DeliveryJob] = []
+        self._has_jobs: Optional[asyncio.Event] = None
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._pending_edits: Dict[Hashable, DeliveryJob] = {}
+        self._pending_actions: Dict[int, DeliveryJob] = {}
+        self._seq = itertools.count()
+        self._sender: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+        self._delayed = 0
+        self._last_prune = time.monotonic()
+
+        self.stats = {"sent": 0, "failed": 0, "retry_after": 0, "coalesced": 0, "dropped": 0}
+
+    # --- Публичный API ---
+
+    @traced("telegram.answer")
+    async def answer(self, message: Message, text: str, **kwargs: Any) -> Message:
+        """
+        Ответить в чат сообщения (аналог message.answer).
+
+        Args:
+            message: Сообщение, в чат которого отвечаем
+            text: Текст ответа
+            **kwargs: Параметры sendMessage
+
+        Returns:
+            Отправленное сообщение
+        """
+        return await self.send_message(message.bot, message.chat.id, text, **kwargs)
+
+    @traced("telegram.send_message")
+    async def send_message(self, bot: Bot, chat_id: int, text: str, **kwargs: Any) -> Message:
+        """
+        Отправить сообщение с приоритетом ответа.
+
+        Args:
+            bot: Экземпляр бота
+            chat_id: ID чата
+            text: Текст сообщения
+            **kwargs: Параметры sendMessage
+
+        Returns:
+            Отправленное сообщение
+        """
+        return await self._enqueue(
+            PRIORITY_REPLY, chat_id, lambda: bot.send_message(chat_id, text, **kwargs)
+        )
+
+    @traced("telegram.send_document")
+    async def send_document(self, bot: Bot, chat_id: int, document: Any, **kwargs: Any) -> Message:
+        """
+        Отправить файл с приоритетом ответа.
+
+        Args:
+            bot: Экземпляр бота
+            chat_id: ID чата
+            document: Файл (например, BufferedInputFile)
+            **kwargs: Параметры sendDocument
+
+        Returns:
+            Отправленное сообщение
+        """
+        return await self._enqueue(
+            PRIORITY_REPLY, chat_id, lambda: bot.send_document(chat_id, document, **kwargs)
+        )
+
+    @traced("telegram.edit_text")
+    async def edit_text(self, message: Message, text: str, **kwargs: Any) -> Any:
+        """
+        Изменить текст сообщения. Если предыдущая правка этого же сообщения
+        еще ждет в очереди, она заменяется новой.
+
+        Args:
+            message: Изменяемое сообщение
+            text: Новый текст
+            **kwargs: Параметры editMessageText
+
+        Returns:
+            Результат editMessageText
+        """
+        key = (message.chat.id, message.message_id)
+        call = lambda: message.edit_text(text, **kwargs)  # noqa: E731
+
+        pending = self._pending_edits.get(key)
+        if pending is not None:
+            pending.call = call
+            self.stats["coalesced"] += 1
+            return await pending.future
+
+        return await self._enqueue(PRIORITY_EDIT, message.chat.id, call, coalesce_key=key)
+
+    def send_chat_action(self, bot: Bot, chat_id: int, action: str = "typing") -> asyncio.Future:
+        """
+        Поставить статус чата в очередь с низким приоритетом. Ждать результата
+        не нужно: устаревший статус будет отброшен, повторный - схлопнут.
+
+        Args:
+            bot: Экземпляр бота
+            chat_id: ID чата
+            action: Тип статуса
+
+        Returns:
+            Future с результатом отправки
+        """
+        pending = self._pending_actions.get(chat_id)
+        if pending is not None:
+            return pending.future
+
+        job = self._make_job(
+            PRIORITY_ACTION, chat_id, lambda: bot.send_chat_action(chat_id, action)
+        )
+        self._pending_actions[chat_id] = job
+        self._push(job)
+        return job.future
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику доставки.
+
+        Returns:
+            Словарь со статистикой и глубиной очередей
+        """
+        return {
+            **self.stats,
+            "queued": len(self._queue),
+            "delayed": self._delayed,
+            "in_flight": len(self._in_flight),
+            "chat_buckets": len(self._chat_buckets),
+        }
+
+    def set_global_rate(self, rate: float) -> None:
+        """
+        Задать общий лимит отправки процесса (в многопроцессном режиме - доля воркера).
+
+        Args:
+            rate: Сообщений в секунду
+        """
+        self.global_bucket.rate = rate
+        self.global_bucket.capacity = rate
+        self.global_bucket.tokens = min(self.global_bucket.tokens, rate)
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """
+        Дождаться отправки очереди и остановить отправщик.
+
+        Args:
+            timeout: Максимальное время ожидания
+        """
+        deadline = time.monotonic() + timeout
+        while (self._queue or self._delayed or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        if self._sender is not None:
+            self._sender.cancel()
+            self._sender = None
+
+        for job in self._queue:
+            if not job.future.done():
+                job.future.cancel()
+        self._queue.clear()
+
+    # --- Внутренняя кухня ---
+
+    def _make_job(self, priority: int, chat_id: Optional[int], call: Callable[[], Awaitable[Any]],
+                  coalesce_key: Hashable = None) -> DeliveryJob:
+        return DeliveryJob(
+            priority=priority,
+            seq=next(self._seq),
+            chat_id=chat_id,
+            call=call,
+            future=asyncio.get_running_loop().create_future(),
+            coalesce_key=coalesce_key,
+            deadline=expires_at()
+        )
+
+    async def _enqueue(self, priority: int, chat_id: Optional[int],
+                       call: Callable[[], Awaitable[Any]], coalesce_key: Hashable = None) -> Any:
+        job = self._make_job(priority, chat_id, call, coalesce_key)
+
+        # Быстрый путь: очередь пуста и лимиты позволяют - отправляем сразу
+        if not self._queue and self._try_acquire_now(chat_id):
+            await self._execute(job)
+            return await job.future
+
+        if coalesce_key is not None:
+            self._pending_edits[coalesce_key] = job
+        self._push(job)
+        return await job.future
+
+    def _try_acquire_now(self, chat_id: Optional[int]) -> bool:
+        """Взять токены чата и глобальный без ожидания, если они есть."""
+        now = time.monotonic()
+        if self.global_bucket.try_acquire(now) > 0:
+            return False
+        if chat_id is not None and self._chat_bucket(chat_id).try_acquire(now) > 0:
+            # Возвращаем глобальный токен - отправка пойдет через очередь
+            self.global_bucket.tokens += 1
+            return False
+        return True
+
+    def _push(self, job: DeliveryJob) -> None:
+        if self._has_jobs is None:
+            self._has_jobs = asyncio.Event()
+        if self._sender is None or self._sender.done():
+            self._sender = asyncio.create_task(self._run())
+
+        heapq.heappush(self._queue, job)
+        self._has_jobs.set()
+
+    def _push_later(self, job: DeliveryJob, delay: float) -> None:
+        self._delayed += 1
+
+        def push() -> None:
+            self._delayed -= 1
+            self._push(job)
+
+        asyncio.get_running_loop().call_later(delay, push)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune_buckets(self, now: float) -> None:
+        """Удалить bucket'ы давно молчащих чатов."""
+        if now - self._last_prune < CHAT_BUCKET_IDLE_SECONDS:
+            return
+        self._last_prune = now
+        idle = [
+            chat_id for chat_id, bucket in self._chat_buckets.items()
+            if now - bucket.updated_at > CHAT_BUCKET_IDLE_SECONDS and now >= bucket.blocked_until
+        ]
+        for chat_id in idle:
+            del self._chat_buckets[chat_id]
+
+    def _forget(self, job: DeliveryJob) -> None:
+        """Убрать задание из таблиц схлопывания - дальше его не заменить."""
+        if job.coalesce_key is not None and self._pending_edits.get(job.coalesce_key) is job:
+            del self._pending_edits[job.coalesce_key]
+        if job.priority == PRIORITY_ACTION and self._pending_actions.get(job.chat_id) is job:
+            del self._pending_actions[job.chat_id]
+
+    async def _run(self) -> None:
+        """Цикл отправщика: выбирает задания по приоритету с учетом лимитов."""
+        while True:
+            while not self._queue:
+                self._has_jobs.clear()
+                await self._has_jobs.wait()
+
+            job = heapq.heappop(self._queue)
+            now = time.monotonic()
+            self._prune_buckets(now)
+
+            if job.is_expired(now):
+                self._drop(job)
+                continue
+
+            if job.chat_id is not None:
+                bucket = self._chat_bucket(job.chat_id)
+                # Статусы не расходуют лимит сообщений чата, но ждут после RetryAfter
+                if job.priority == PRIORITY_ACTION:
+                    wait = max(bucket.blocked_until - now, 0)
+                else:
+                    wait = bucket.try_acquire(now)
+                if wait > 0:
+                    self._push_later(job, wait)
+                    continue
+
+            await self.global_bucket.acquire()
+
+            self._forget(job)
+            task = asyncio.create_task(self._execute(job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _execute(self, job: DeliveryJob) -> None:
+        """Выполнить вызов Bot API и обработать RetryAfter."""
+        job.attempts += 1
+        try:
+            result = await job.call()
+        except TelegramRetryAfter as e:
+            self.stats["retry_after"] += 1
+            if job.attempts >= self.max_attempts:
+                logger.error(f"Delivery to chat {job.chat_id} failed after {job.attempts} attempts: {e}")
+                self._fail(job, e)
+                return
+
+            logger.warning(f"RetryAfter {e.retry_after}s for chat {job.chat_id}, attempt {job.attempts}")
+            if job.chat_id is not None:
+                self._chat_bucket(job.chat_id).block(e.retry_after)
+            else:
+                self.global_bucket.block(e.retry_after)
+            if job.is_expired(time.monotonic() + e.retry_after):
+                # Повтор не успеет до дедлайна обновления
+                self._drop(job)
+            else:
+                self._push_later(job, e.retry_after)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self.stats["sent"] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _drop(self, job: DeliveryJob) -> None:
+        """Отбросить опоздавшее задание: его future завершается с None."""
+        self._forget(job)
+        self.stats["dropped"] += 1
+        if not job.future.done():
+            job.future.set_result(None)
+
+    def _fail(self, job: DeliveryJob, error: Exception) -> None:
+        """Завершить задание ошибкой. Статусы чата ошибкой не считаются - их никто не ждет."""
+        self.stats["failed"] += 1
+        if job.future.done():
+            return
+        if job.priority == PRIORITY_ACTION:
+            logger.debug(f"Chat action for chat {job.chat_id} failed: {error}")
+            job.future.set_result(None)
+        else:
+            job.future.set_exception(error)
+
+
+# Глобальный экземпляр сервиса
+delivery_service = DeliveryService()
+
+metrics.gauge("delivery_queue_depth", "Вызовов Bot API в очереди доставки").set_function(
+    lambda: len(delivery_service._queue)
+)
+_delivery_events = metrics.counter("delivery_events_total", "События очереди доставки", ("event",))
+for _event in delivery_service.stats:
+    _delivery_events.labels(_event).set_function(lambda event=_event: delivery_service.stats[event])
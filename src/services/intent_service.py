@@ -0,0 +1,250 @@
+"""
+Локальный классификатор намерений для текстовых сообщений.
+
+Частые сообщения - приветствия, благодарности, просьбы показать популярное
+или новинки, "дальше" для списка - не требуют генерации. Классификатор
+отправляет их в кэшированные ответы категорий, пагинацию или готовые
+реплики, а в LLM уходит только остальное.
+
+Два уровня:
+- правила: точные фразы из обучающего набора, длинные сообщения,
+  сообщения с фильтрами каталога (жанр, год) и с отрицаниями ("не надо
+  новинки") - сразу "other";
+- линейная модель (softmax регрессия) по символьным n-граммам, обученная
+  при запуске на src/data/intents.json. Ответ модели принимается только
+  с уверенностью не ниже INTENT_MIN_CONFIDENCE.
+
+Классификация занимает десятки микросекунд.
+"""
+
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.services.catalog_service import NEGATIONS, query_terms
+from src.services.container import services
+from src.utils.config import config
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+INTENTS_FILE = Path(__file__).resolve().parent.parent / "data" / "intents.json"
+
+# Намерение "отдать в LLM"
+INTENT_OTHER = "other"
+
+# Сообщения длиннее этого (в словах) - всегда развернутые запросы
+MAX_INTENT_WORDS = 6
+
+# Символьные n-граммы модели
+NGRAM_SIZES = (2, 3, 4)
+
+intent_routes = metrics.counter("intent_routes_total", "Решения классификатора намерений", ("intent", "source"))
+intent_seconds = metrics.histogram("intent_classify_seconds", "Время классификации намерения")
+
+# Готовые ответы для намерений, которым не нужна генерация
+INTENT_REPLIES = {
+    "greeting": "Ну привет. Скажи, что хочешь посмотреть, или глянь /top.",
+    "thanks": "Ладно... Обращайся. Если что - пиши, подберу еще.",
+    "help": "Хм... Пиши, что хочешь посмотреть: жанр, год, на что похоже. "
+            "Еще есть /top, /new, /classic. Все команды - /help.",
+}
+
+_PUNCT_RE = re.compile(r"[^\w\s]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+@dataclass
+class Intent:
+    """Решение классификатора."""
+    name: str
+    confidence: float
+    source: str
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, ё -> е, без пунктуации и лишних пробелов."""
+    text = _PUNCT_RE.sub(" ", text.lower().replace("ё", "е"))
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def char_ngrams(text: str) -> List[str]:
+    """Символьные n-граммы нормализованного текста с границами слов."""
+    padded = f" {text} "
+    return list({padded[i:i + n] for n in NGRAM_SIZES for i in range(len(padded) - n + 1)})
+
+
+class IntentClassifier:
+    """Правила и softmax регрессия по символьным n-граммам."""
+
+    def __init__(self, path: Path = None):
+        """Инициализация классификатора (без обучения - см. load)."""
+        self.path = Path(path or INTENTS_FILE)
+        self.labels: List[str] = []
+        # n-грамма -> веса классов
+        self.weights: Dict[str, List[float]] = {}
+        self.bias: List[float] = []
+        # Точные фразы обучающего набора -> намерение
+        self.phrases: Dict[str, str] = {}
+        self.trained = False
+
+    async def load(self) -> None:
+        """Обучает модель на встроенном наборе в потоке."""
+        if self.trained:
+            return
+        await asyncio.to_thread(self._train_from_file)
+
+    def _train_from_file(self) -> None:
+        """Читает обучающий набор и обучает модель."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                examples = json.load(f)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки набора намерений {self.path}: {e}")
+            return
+        started = time.perf_counter()
+        self.train(examples)
+        logger.info(
+            f"Классификатор намерений обучен за {(time.perf_counter() - started) * 1000:.0f} мс: "
+            f"{sum(len(texts) for texts in examples.values())} примеров, {len(self.weights)} признаков"
+        )
+
+    def train(self, examples: Dict[str, List[str]], epochs: int = 30,
+              learning_rate: float = 0.5, l2: float = 1e-4, seed: int = 0) -> None:
+        """
+        Обучает softmax регрессию стохастическим градиентным спуском.
+
+        Args:
+            examples: Намерение -> примеры сообщений
+            epochs: Проходов по набору
+            learning_rate: Шаг обучения
+            l2: Коэффициент L2 регуляризации
+            seed: Зерно перемешивания (обучение воспроизводимо)
+        """
+        labels = sorted(examples)
+        dataset = []
+        phrases = {}
+        for label_index, label in enumerate(labels):
+            for text in examples[label]:
+                normalized = normalize(text)
+                dataset.append((self._features(normalized), label_index))
+                if label != INTENT_OTHER:
+                    phrases[normalized] = label
+
+        classes = len(labels)
+        weights: Dict[str, List[float]] = {}
+        bias = [0.0] * classes
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(dataset)
+            step = learning_rate / (1 + epoch * 0.1)
+            for features, target in dataset:
+                probabilities = self._softmax(self._scores(features, weights, bias))
+                probabilities[target] -= 1.0
+                for feature, value in features.items():
+                    row = weights.get(feature)
+                    if row is None:
+                        row = weights[feature] = [0.0] * classes
+                    for k in range(classes):
+                        row[k] -= step * (probabilities[k] * value + l2 * row[k])
+                for k in range(classes):
+                    bias[k] -= step * probabilities[k]
+
+        self.labels, self.weights, self.bias, self.phrases = labels, weights, bias, phrases
+        self.trained = True
+
+    @staticmethod
+    def _features(normalized: str) -> Dict[str, float]:
+        """Признаки текста: n-граммы с весом 1/sqrt(число n-грамм)."""
+        ngrams = char_ngrams(normalized)
+        if not ngrams:
+            return {}
+        value = 1.0 / math.sqrt(len(ngrams))
+        return {ngram: value for ngram in ngrams}
+
+    @staticmethod
+    def _scores(features: Dict[str, float], weights: Dict[str, List[float]],
+                bias: List[float]) -> List[float]:
+        """Линейные оценки классов."""
+        scores = list(bias)
+        for feature, value in features.items():
+            row = weights.get(feature)
+            if row is not None:
+                for k, weight in enumerate(row):
+                    scores[k] += weight * value
+        return scores
+
+    @staticmethod
+    def _softmax(scores: List[float]) -> List[float]:
+        """Вероятности классов."""
+        top = max(scores)
+        exps = [math.exp(score - top) for score in scores]
+        total = sum(exps)
+        return [value / total for value in exps]
+
+    def predict(self, text: str) -> Intent:
+        """
+        Намерение по модели без правил.
+
+        Args:
+            text: Сообщение пользователя
+        """
+        probabilities = self._softmax(self._scores(self._features(normalize(text)), self.weights, self.bias))
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
+        return Intent(self.labels[best], probabilities[best], "model")
+
+    def classify(self, text: str) -> Intent:
+        """
+        Определяет намерение сообщения.
+
+        Args:
+            text: Сообщение пользователя
+
+        Returns:
+            Намерение с уверенностью и источником решения (rule/model/fallback);
+            "other" значит, что сообщение нужно отдать LLM
+        """
+        started = time.perf_counter()
+        intent = self._classify(text)
+        intent_seconds.observe(time.perf_counter() - started)
+        intent_routes.labels(intent.name, intent.source).inc()
+        return intent
+
+    def _classify(self, text: str) -> Intent:
+        """Правила, затем модель."""
+        if not config.INTENT_ENABLED or not self.trained:
+            return Intent(INTENT_OTHER, 1.0, "disabled")
+
+        normalized = normalize(text)
+        if not normalized:
+            return Intent(INTENT_OTHER, 1.0, "rule")
+        phrase = self.phrases.get(normalized)
+        if phrase is not None:
+            return Intent(phrase, 1.0, "rule")
+        if normalized.count(" ") >= MAX_INTENT_WORDS:
+            return Intent(INTENT_OTHER, 1.0, "rule")
+        # Жанр, тег или год в сообщении - это запрос, а не команда
+        if any(":" in term for term in query_terms(normalized)):
+            return Intent(INTENT_OTHER, 1.0, "rule")
+        # Отрицание меняет смысл ("не надо новинки") - как и каталог, отдаем LLM
+        if any(word in NEGATIONS for word in normalized.split()):
+            return Intent(INTENT_OTHER, 1.0, "rule")
+
+        intent = self.predict(normalized)
+        if intent.name != INTENT_OTHER and intent.confidence < config.INTENT_MIN_CONFIDENCE:
+            return Intent(INTENT_OTHER, intent.confidence, "fallback")
+        return intent
+
+
+# Глобальный классификатор (обучается в фоне при запуске)
+intent_classifier = services.register("intent", IntentClassifier, startup=IntentClassifier.load, background=True)
+
+
+def reply_for(intent: Intent) -> Optional[str]:
+    """Готовый ответ для намерения или None, если его нет."""
+    return INTENT_REPLIES.get(intent.name)
@@ -0,0 +1,178 @@
+"""
+Пул API ключей OpenRouter с балансировкой и карантином.
+
+Лимит запросов OpenRouter считается на ключ, поэтому несколько ключей
+(OPENROUTER_API_KEYS) поднимают общий потолок. У каждого ключа свой клиент
+со своим пулом соединений и свое состояние:
+
+- запросы в работе - запрос уходит на ключ с наименьшим их числом, при
+  равенстве - с большим остатком квоты (заголовок x-ratelimit-remaining);
+- карантин - ключ, получивший 429, выводится из ротации на Retry-After
+  (или KEY_QUARANTINE_SECONDS), ключ с ошибкой авторизации или оплаты
+  (401/402/403) - на KEY_AUTH_QUARANTINE_SECONDS.
+
+Если в карантине все ключи, используется тот, чей карантин кончится раньше.
+Нагрузка по ключам видна в метриках llm_key_* с меткой вида "0:abcd"
+(номер и последние символы ключа).
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Mapping, Optional
+
+from src.utils.config import config
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+key_requests = metrics.counter("llm_key_requests_total", "Запросы к OpenRouter по ключам", ("key", "outcome"))
+key_tokens = metrics.counter("llm_key_tokens_total", "Токены запросов по ключам", ("key",))
+key_outstanding = metrics.gauge("llm_key_outstanding", "Запросы в работе по ключам", ("key",))
+key_remaining = metrics.gauge("llm_key_remaining", "Остаток квоты ключа по заголовкам ответа", ("key",))
+key_quarantined = metrics.gauge("llm_key_quarantined", "Ключ в карантине (1) или в ротации (0)", ("key",))
+
+# Статусы, при которых ключ непригоден надолго: авторизация, оплата, доступ
+AUTH_STATUSES = (401, 402, 403)
+
+
+def parse_keys(value: str, fallback: str) -> List[str]:
+    """
+    Ключи из настройки "key1,key2" (пусто - один ключ fallback).
+
+    Args:
+        value: Строка из OPENROUTER_API_KEYS
+        fallback: OPENROUTER_API_KEY
+    """
+    keys = [key.strip() for key in value.split(",") if key.strip()]
+    return list(dict.fromkeys(keys)) or [fallback]
+
+
+@dataclass
+class ApiKey:
+    """Ключ пула и его состояние."""
+    index: int
+    secret: str = field(repr=False)
+    client: Any = field(default=None, repr=False)
+    outstanding: int = 0
+    # Остаток квоты по последнему ответу (None - сервер не сообщает)
+    remaining: Optional[float] = None
+    quarantined_until: float = 0.0
+    requests: int = 0
+
+    @property
+    def label(self) -> str:
+        """Метка для метрик и логов без раскрытия ключа."""
+        return f"{self.index}:{self.secret[-4:]}"
+
+    def is_quarantined(self, now: float) -> bool:
+        """Выведен ли ключ из ротации."""
+        return self.quarantined_until > now
+
+
+class KeyPool:
+    """Пул ключей: выбор ключа, учет квоты и карантин."""
+
+    def __init__(self, secrets: List[str]):
+        """
+        Args:
+            secrets: API ключи (хотя бы один)
+        """
+        self.keys = [ApiKey(index, secret) for index, secret in enumerate(secrets)]
+        for key in self.keys:
+            key_outstanding.labels(key.label).set_function(lambda key=key: key.outstanding)
+            key_quarantined.labels(key.label).set_function(
+                lambda key=key: 1.0 if key.is_quarantined(time.monotonic()) else 0.0
+            )
+
+    def client_for(self, key: ApiKey, factory: Callable[[ApiKey], Any]) -> Any:
+        """
+        Клиент ключа (создается при первом обращении).
+
+        Args:
+            key: Ключ пула
+            factory: Создает клиент для ключа
+        """
+        if key.client is None:
+            key.client = factory(key)
+        return key.client
+
+    def select(self) -> ApiKey:
+        """Ключ для следующего запроса."""
+        if len(self.keys) == 1:
+            return self.keys[0]
+        now = time.monotonic()
+        active = [key for key in self.keys if not key.is_quarantined(now)]
+        if not active:
+            return min(self.keys, key=lambda key: key.quarantined_until)
+        return min(active, key=lambda key: (
+            key.outstanding,
+            -(key.remaining if key.remaining is not None else float("inf")),
+            key.requests,
+        ))
+
+    def has_alternative(self, key: ApiKey) -> bool:
+        """
+        Уйдет ли повтор на другой ключ вне карантина (тогда паузы перед ним не нужно).
+
+        Args:
+            key: Ключ неудавшегося запроса
+        """
+        candidate = self.select()
+        return candidate is not key and not candidate.is_quarantined(time.monotonic())
+
+    def acquire(self) -> ApiKey:
+        """Выбирает ключ и учитывает запрос в работе (парный вызов - release)."""
+        key = self.select()
+        key.outstanding += 1
+        key.requests += 1
+        return key
+
+    def release(self, key: ApiKey) -> None:
+        """Запрос по ключу завершен."""
+        key.outstanding -= 1
+
+    def record_success(self, key: ApiKey, headers: Optional[Mapping[str, str]] = None,
+                       tokens: Optional[int] = None) -> None:
+        """
+        Учитывает успешный ответ: квоту из заголовков и токены.
+
+        Args:
+            key: Ключ запроса
+            headers: Заголовки ответа
+            tokens: Токены запроса из usage
+        """
+        key_requests.labels(key.label, "ok").inc()
+        if tokens:
+            key_tokens.labels(key.label).inc(tokens)
+        remaining = (headers or {}).get("x-ratelimit-remaining")
+        if remaining is not None:
+            try:
+                key.remaining = float(remaining)
+            except ValueError:
+                return
+            key_remaining.labels(key.label).set(key.remaining)
+
+    def record_failure(self, key: ApiKey, status: Optional[int],
+                       retry_after: Optional[float] = None) -> None:
+        """
+        Учитывает ошибку и при необходимости выводит ключ в карантин.
+
+        Args:
+            key: Ключ запроса
+            status: HTTP статус ответа (None - ответа не было)
+            retry_after: Retry-After из ответа 429, секунды
+        """
+        if status == 429:
+            key_requests.labels(key.label, "rate_limit").inc()
+            self._quarantine(key, retry_after or config.KEY_QUARANTINE_SECONDS, "rate limit")
+        elif status in AUTH_STATUSES:
+            key_requests.labels(key.label, "auth").inc()
+            self._quarantine(key, config.KEY_AUTH_QUARANTINE_SECONDS, f"HTTP {status}")
+        else:
+            key_requests.labels(key.label, "error").inc()
+
+    def _quarantine(self, key: ApiKey, seconds: float, reason: str) -> None:
+        """Выводит ключ из ротации."""
+        if len(self.keys) == 1 or seconds <= 0:
+            return
+        key.quarantined_until = max(key.quarantined_until, time.monotonic() + seconds)
+        logger.warning(f"API key {key.label} quarantined for {seconds:.0f}s: {reason}")
@@ -3,10 +3,9 @@
 """
 
 import asyncio
-import logging
-from typing import List, Dict, Any
-from openai import AsyncOpenAI
-from openai import APIError, RateLimitError, APITimeoutError
+import time
+from functools import cached_property
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 
 from src.utils.config import config
 from src.utils.logger import logger
@@ -14,22 +13,61 @@ from src.utils.prompts import (
     SYSTEM_PROMPT, 
     TOP_ANIME_PROMPT, 
     NEW_ANIME_PROMPT, 
-    CLASSIC_ANIME_PROMPT
+    CLASSIC_ANIME_PROMPT,
+    RETRIEVAL_PROMPT,
+    CONTINUATION_PROMPT
 )
 from src.utils.message_utils import truncate_message, format_error_message
+from src.utils.metrics import metrics
+from src.utils.deadline import DeadlineExceeded, RetryBudget, attempt_timeout, remaining, within_deadline
+from src.utils.http_pool import ConnectionKeeper, create_http_client
+from src.utils.tracing import current_span, mark_error, start_span, traced
 from src.services.cache_service import cache_service
+from src.services.catalog_service import catalog_service
+from src.services.container import services
+from src.services.key_pool import ApiKey, KeyPool, parse_keys
+from src.services.model_router import ROUTE_CATEGORY, ROUTE_CHAT, ROUTE_RECOMMENDATION, ModelRouter, RoutePlan
 from src.services.user_state_service import user_state_service
 
+# openai импортируется около полсекунды - откладываем до создания клиента
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI
+
+# Метрики запросов к LLM
+llm_request_seconds = metrics.histogram(
+    "llm_request_seconds", "Время одной попытки запроса к LLM", ("model", "outcome")
+)
+llm_retries = metrics.counter("llm_retries_total", "Повторные попытки запроса к LLM", ("model", "reason"))
+llm_fallbacks = metrics.counter("llm_fallback_total", "Успешные ответы fallback моделей", ("model",))
+llm_exhausted = metrics.counter("llm_exhausted_total", "Запросы, для которых не ответила ни одна модель")
+llm_skipped = metrics.counter("llm_skipped_models_total", "Модели, пропущенные после недавнего отказа", ("model",))
+llm_continuations = metrics.counter(
+    "llm_continuations_total", "Продолжения ответов, обрезанных по max_tokens", ("route", "outcome")
+)
+
+# Таймаут одной попытки запроса к LLM (внутри дедлайна обновления - меньше), секунды
+REQUEST_TIMEOUT = 30.0
+
+# Пометка ответа из устаревшего кэша (API сейчас не отвечает)
+STALE_RESPONSE_NOTE = "Хм... Сервер сейчас не отвечает. Вот что я советовал раньше:\n\n"
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Retry-After из ответа 429, секунды (None, если заголовка нет)."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
 
 class LLMService:
     """Сервис для работы с LLM через OpenRouter API."""
     
     def __init__(self):
-        """Инициализация клиента OpenRouter."""
-        self.client = AsyncOpenAI(
-            api_key=config.OPENROUTER_API_KEY,
-            base_url="https://openrouter.ai/api/v1"
-        )
+        """Инициализация сервиса (клиент OpenRouter создается при первом обращении)."""
         self.model = config.OPENROUTER_MODEL
         self.fallback_models = [
             "openai/gpt-3.5-turbo",
@@ -37,8 +75,82 @@ class LLMService:
             "google/gemini-pro",
             "meta-llama/llama-3.1-8b-instruct:free"
         ]
+        # Порядок моделей и параметры генерации по наблюдаемой задержке и стоимости
+        self.router = ModelRouter([self.model] + self.fallback_models)
+        # Ключи OpenRouter: у каждого свой клиент, квота и карантин
+        self.keys = KeyPool(parse_keys(config.OPENROUTER_API_KEYS, config.OPENROUTER_API_KEY))
         self.max_retries = config.MAX_RETRIES
         self.retry_delays = config.RETRY_DELAY
+        # Модель -> момент (monotonic), до которого она пропускается после отказа
+        self.model_failures: Dict[str, float] = {}
+        # Доля повторов от первых попыток: при отказе OpenRouter не умножаем нагрузку
+        self.retry_budget = RetryBudget("llm")
+        # Прогрев и поддержание соединений пулов клиентов
+        self.keepers: List[ConnectionKeeper] = []
+    
+    @cached_property
+    def client(self) -> "AsyncOpenAI":
+        """Клиент OpenRouter (он же клиент первого ключа пула)."""
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(
+            api_key=self.keys.keys[0].secret,
+            base_url=config.OPENROUTER_BASE_URL,
+            http_client=self._http_client("openrouter")
+        )
+    
+    def _http_client(self, name: str) -> "httpx.AsyncClient":
+        """
+        Пул соединений для клиента OpenRouter с прогревом и keep-alive.
+        
+        Args:
+            name: Имя пула для метрик
+        """
+        http_client = create_http_client(name)
+        
+        async def ping() -> None:
+            # Легкий запрос: заголовки списка моделей без тела
+            await http_client.head(str(self.client.base_url).rstrip("/") + "/models")
+        
+        self.keepers.append(ConnectionKeeper(http_client.stats, ping))
+        return http_client
+    
+    def _client_for(self, key: ApiKey) -> "AsyncOpenAI":
+        """
+        Клиент ключа пула: для первого ключа - основной клиент, для остальных
+        копия основного со своим ключом и своим пулом соединений.
+        """
+        if len(self.keys.keys) == 1:
+            return self.client
+        
+        def factory(key: ApiKey) -> "AsyncOpenAI":
+            # Пул основного клиента не простаивает: через него идет первый ключ
+            if key.index == 0:
+                return self.client
+            return self.client.with_options(
+                api_key=key.secret, http_client=self._http_client(f"openrouter:{key.label}")
+            )
+        
+        return self.keys.client_for(key, factory)
+    
+    async def startup(self) -> None:
+        """
+        Создать клиенты в потоке при запуске бота, а не на первом запросе
+        пользователя, и открыть соединения заранее.
+        """
+        client = await asyncio.to_thread(lambda: [self._client_for(key) for key in self.keys.keys][0])
+        logger.info(f"LLM client ready: {client.base_url}, API keys: {len(self.keys.keys)}")
+        for keeper in self.keepers:
+            keeper.start()
+    
+    async def shutdown(self) -> None:
+        """Остановить поддержание соединений и закрыть пулы."""
+        for keeper in self.keepers:
+            await keeper.stop()
+        if "client" in self.__dict__:
+            await self.client.close()
+        for key in self.keys.keys:
+            if key.client is not None and key.client is not self.__dict__.get("client"):
+                await key.client.close()
     
     async def generate_response(self, user_message: str, user_id: int) -> str:
         """
@@ -52,7 +164,10 @@ class LLMService:
             Ответ от LLM в стиле Сайтамы
         """
         try:
-            logger.info(f"LLM request for user {user_id}: {user_message}")
+            logger.info(
+                f"LLM request for user {user_id}",
+                extra={"event": "llm_request", "user_id": user_id, "payload": user_message}
+            )
             
             # Получаем контекст диалога
             conversation_context = await user_state_service.get_conversation_context(user_id)
@@ -60,6 +175,13 @@ class LLMService:
             # Добавляем новое сообщение пользователя в историю
             await user_state_service.add_message_to_history(user_id, "user", user_message)
             
+            # Фильтрующие запросы ("аниме про спорт 2010-х") отвечаются из каталога
+            catalog_response = catalog_service.answer(user_message)
+            if catalog_response:
+                logger.info(f"Returning catalog response for user {user_id}")
+                await user_state_service.add_message_to_history(user_id, "assistant", catalog_response)
+                return catalog_response
+            
             # Формируем промпт с контекстом
             messages = [{"role": "system", "content": SYSTEM_PROMPT}]
             
@@ -79,9 +201,38 @@ class LLMService:
                     # Добавляем кэшированный ответ в историю
                     await user_state_service.add_message_to_history(user_id, "assistant", cached_response)
                     return cached_response
+                
+                # На этот запрос только что не ответила ни одна модель - API не дергаем
+                if cache_service.is_failing(user_message):
+                    logger.info(f"Query failed recently, skipping API for user {user_id}")
+                    return await self._serve_stale_or_error(user_message, user_id)
+            
+            # Кандидаты из каталога (после кэша): модели остается выбрать и сформулировать
+            candidates = catalog_service.retrieve(user_message)
+            model = None
+            if candidates:
+                messages.insert(1, {
+                    "role": "system",
+                    "content": RETRIEVAL_PROMPT.format(candidates=catalog_service.format_candidates(candidates))
+                })
+                model = config.RETRIEVAL_MODEL or None
+            
+            # Реплика в диалоге без кандидатов - короткий ответ, остальное - рекомендация
+            route = ROUTE_CHAT if conversation_context and not candidates else ROUTE_RECOMMENDATION
             
             # Запрашиваем API
-            response = await self._make_api_request(messages)
+            try:
+                response, model = await self._make_api_request(messages, model, route)
+            except Exception as e:
+                if conversation_context:
+                    raise
+                mark_error(str(e))
+                logger.error(f"Error generating response for user {user_id}: {e}")
+                # Повторы этого запроса в ближайшие секунды сразу получат ответ ниже
+                # (нехватка времени у этого обновления - не отказ API)
+                if not isinstance(e, DeadlineExceeded):
+                    cache_service.mark_failed(user_message)
+                return await self._serve_stale_or_error(user_message, user_id)
             
             # Обрезаем ответ до максимальной длины
             response = truncate_message(response)
@@ -91,75 +242,281 @@ class LLMService:
             
             # Сохраняем в кэш только одиночные сообщения
             if not conversation_context:
-                await cache_service.save_response(user_message, response, self.model)
+                await cache_service.save_response(user_message, response, model)
             
-            logger.info(f"LLM response for user {user_id}: {response}")
+            logger.info(
+                f"LLM response for user {user_id}: {len(response)} chars",
+                extra={"event": "llm_response", "user_id": user_id, "payload": response}
+            )
             return response
             
         except Exception as e:
+            mark_error(str(e))
             logger.error(f"Error generating response for user {user_id}: {e}")
             return self._get_error_response()
     
-    async def _make_api_request(self, messages: List[Dict[str, str]]) -> str:
+    @traced("llm.request")
+    async def _make_api_request(self, messages: List[Dict[str, str]], model: str = None,
+                                route: str = ROUTE_RECOMMENDATION) -> Tuple[str, str]:
         """
         Отправляет запрос к OpenRouter API с retry логикой и fallback моделями.
         
+        Порядок моделей, max_tokens и temperature выбирает маршрутизатор
+        по классу запроса; результат каждой попытки возвращается ему в статистику.
+        Таймаут попытки и паузы между попытками ограничены дедлайном
+        обновления, повторы и переходы к fallback моделям - бюджетом повторов.
+        
         Args:
             messages: Список сообщений для API
+            model: Модель, заданная явно (иначе - выбор маршрутизатора)
+            route: Класс запроса (ROUTE_CHAT, ROUTE_CATEGORY, ROUTE_RECOMMENDATION)
             
         Returns:
-            Ответ от LLM
+            Ответ от LLM и модель, которая его дала
             
         Raises:
-            Exception: При неудачных попытках
+            DeadlineExceeded: Если до дедлайна не остается времени на попытку
+            Exception: При неудачных попытках или исчерпании бюджета повторов
         """
-        # Список моделей для попыток (основная + fallback)
-        models_to_try = [self.model] + [m for m in self.fallback_models if m != self.model]
+        from openai import APIError, APITimeoutError, RateLimitError
+        
+        # Модели в порядке попыток (выбранная маршрутизатором + fallback)
+        plan = self.router.plan(route, model)
+        models_to_try = plan.models
+        primary = models_to_try[0]
+        current_span().set_attribute("route", plan.route)
+        current_span().set_attribute("route_reason", plan.reason)
+        
+        # Модели, которые только что исчерпали попытки, пропускаем - запрос к ним обречен
+        now = time.monotonic()
+        available = [m for m in models_to_try if self.model_failures.get(m, 0) <= now]
+        for skipped in models_to_try:
+            if skipped not in available:
+                llm_skipped.labels(skipped).inc()
+        if not available:
+            llm_exhausted.inc()
+            raise Exception(f"All models failed recently: {', '.join(models_to_try)}")
         
-        for model in models_to_try:
+        left = remaining()
+        if left is not None:
+            current_span().set_attribute("deadline_remaining", round(left, 3))
+        self.retry_budget.record_request()
+        first_attempt = True
+        
+        for model in available:
             logger.info(f"Trying model: {model}")
             
             for attempt in range(self.max_retries):
+                # Повтор или fallback модель - только в пределах бюджета повторов
+                if not first_attempt and not self.retry_budget.try_retry():
+                    llm_exhausted.inc()
+                    raise Exception(f"Retry budget exhausted, last model: {model}")
+                first_attempt = False
+                timeout = attempt_timeout(REQUEST_TIMEOUT, "llm.attempt")
+                
+                # Ключ с наименьшей нагрузкой вне карантина
+                key = self.keys.acquire()
+                client = self._client_for(key)
+                started = time.perf_counter()
                 try:
-                    response = await self.client.chat.completions.create(
-                        model=model,
-                        messages=messages,
-                        max_tokens=1000,
-                        temperature=0.7,
-                        timeout=30
-                    )
+                    with start_span("llm.attempt", model=model, attempt=attempt + 1, key=key.label):
+                        # Дедлайн могут сократить во время запроса (остановка бота)
+                        raw = await within_deadline(client.chat.completions.with_raw_response.create(
+                            model=model,
+                            messages=messages,
+                            max_tokens=plan.max_tokens,
+                            temperature=plan.temperature,
+                            timeout=timeout
+                        ), "llm.attempt")
+                        response = raw.parse()
+                    elapsed = time.perf_counter() - started
+                    llm_request_seconds.labels(model, "ok").observe(elapsed)
+                    usage = getattr(response, "usage", None)
+                    self.keys.record_success(key, raw.headers, usage.total_tokens if usage else None)
+                    self.router.observe(model, plan.route, elapsed, True, usage.completion_tokens if usage else None)
+                    choice = response.choices[0]
+                    truncated = choice.finish_reason == "length"
+                    if usage:
+                        self.router.observe_output(plan.route, usage.completion_tokens, truncated)
+                    current_span().set_attribute("model", model)
                     
-                    if model != self.model:
+                    if model != primary:
+                        llm_fallbacks.labels(model).inc()
                         logger.info(f"Successfully used fallback model: {model}")
                     
-                    return response.choices[0].message.content.strip()
+                    self.model_failures.pop(model, None)
+                    content = choice.message.content
+                    if truncated:
+                        # Ответ уперся в max_tokens - дописываем, а не обрезаем молча
+                        content = await self._continue_truncated(
+                            client, messages, content, model, plan, usage.completion_tokens if usage else 0
+                        )
+                    return content.strip(), model
                     
                 except RateLimitError as e:
-                    wait_time = self.retry_delays * (2 ** attempt)
+                    elapsed = time.perf_counter() - started
+                    llm_request_seconds.labels(model, "rate_limit").observe(elapsed)
+                    self.router.observe(model, plan.route, elapsed, False)
+                    llm_retries.labels(model, "rate_limit").inc()
+                    retry_after = _retry_after(e)
+                    self.keys.record_failure(key, 429, retry_after)
+                    # Ключ ушел в карантин - если есть другой, повторяем сразу с ним,
+                    # иначе ждем Retry-After, но не меньше экспоненциальной паузы
+                    if self.keys.has_alternative(key):
+                        wait_time = 0
+                    else:
+                        wait_time = max(retry_after or 0, self.retry_delays * (2 ** attempt))
                     logger.warning(f"Rate limit hit for {model}, waiting {wait_time}s before retry {attempt + 1}")
-                    await asyncio.sleep(wait_time)
+                    await self._backoff(wait_time)
                     
                 except APITimeoutError as e:
+                    elapsed = time.perf_counter() - started
+                    llm_request_seconds.labels(model, "timeout").observe(elapsed)
+                    self.router.observe(model, plan.route, elapsed, False)
+                    llm_retries.labels(model, "timeout").inc()
+                    self.keys.record_failure(key, None)
                     wait_time = self.retry_delays * (2 ** attempt)
                     logger.warning(f"API timeout for {model}, waiting {wait_time}s before retry {attempt + 1}")
-                    await asyncio.sleep(wait_time)
+                    await self._backoff(wait_time)
                     
                 except APIError as e:
+                    elapsed = time.perf_counter() - started
+                    llm_request_seconds.labels(model, "api_error").observe(elapsed)
+                    self.router.observe(model, plan.route, elapsed, False)
                     logger.error(f"API error for {model} on attempt {attempt + 1}: {e}")
+                    self.keys.record_failure(key, getattr(e, "status_code", None))
                     if attempt == self.max_retries - 1:
                         # Переходим к следующей модели
                         break
-                    await asyncio.sleep(self.retry_delays)
+                    llm_retries.labels(model, "api_error").inc()
+                    await self._backoff(self.retry_delays)
+                    
+                except DeadlineExceeded:
+                    # Повтор и fallback уже не успеют - отвечаем тем, что есть
+                    llm_request_seconds.labels(model, "deadline").observe(time.perf_counter() - started)
+                    raise
                     
                 except Exception as e:
+                    elapsed = time.perf_counter() - started
+                    llm_request_seconds.labels(model, "error").observe(elapsed)
+                    self.router.observe(model, plan.route, elapsed, False)
                     logger.error(f"Unexpected error for {model} on attempt {attempt + 1}: {e}")
+                    self.keys.record_failure(key, None)
                     # Переходим к следующей модели
                     break
+                
+                finally:
+                    self.keys.release(key)
+            
+            # Попытки к модели исчерпаны - какое-то время не тратим на нее запросы
+            if config.MODEL_FAILURE_SECONDS > 0:
+                self.model_failures[model] = time.monotonic() + config.MODEL_FAILURE_SECONDS
         
         # Если все модели и попытки исчерпаны
+        llm_exhausted.inc()
         raise Exception(f"All models failed: {', '.join(models_to_try)}")
     
-
+    async def _backoff(self, seconds: float) -> None:
+        """
+        Пауза перед повтором, если после нее останется время на попытку.
+        
+        Raises:
+            DeadlineExceeded: Если повтор уже не успеет до дедлайна
+        """
+        attempt_timeout(REQUEST_TIMEOUT, "llm.retry", reserve=seconds)
+        await asyncio.sleep(seconds)
+    
+    async def _continue_truncated(self, client: "AsyncOpenAI", messages: List[Dict[str, str]], partial: str,
+                                  model: str, plan: RoutePlan, partial_tokens: int) -> str:
+        """
+        Дозапрашивает окончание ответа, обрезанного по max_tokens.
+        
+        Args:
+            client: Клиент ключа, с которым получен ответ
+            messages: Сообщения исходного запроса
+            partial: Обрезанный ответ
+            model: Модель, давшая ответ
+            plan: План маршрутизатора (класс запроса и лимит продолжения)
+            partial_tokens: Токены обрезанной части
+            
+        Returns:
+            Ответ с продолжением или обрезанный ответ, если продолжение не удалось
+        """
+        continuation = messages + [
+            {"role": "assistant", "content": partial},
+            {"role": "user", "content": CONTINUATION_PROMPT},
+        ]
+        try:
+            timeout = attempt_timeout(REQUEST_TIMEOUT, "llm.continuation")
+            with start_span("llm.continuation", model=model, max_tokens=plan.continuation_tokens):
+                response = await within_deadline(client.chat.completions.create(
+                    model=model,
+                    messages=continuation,
+                    max_tokens=plan.continuation_tokens,
+                    temperature=plan.temperature,
+                    timeout=timeout
+                ), "llm.continuation")
+            choice = response.choices[0]
+            tail = choice.message.content.strip()
+        except DeadlineExceeded:
+            # Лучше обрезанный ответ вовремя, чем полный после дедлайна
+            llm_continuations.labels(plan.route, "deadline").inc()
+            return partial
+        except Exception as e:
+            llm_continuations.labels(plan.route, "error").inc()
+            logger.warning(f"Continuation failed for {model}: {e}")
+            return partial
+        
+        if choice.finish_reason == "length":
+            # Ответ "заговорился" - дальше не продолжаем, отдаем что есть
+            llm_continuations.labels(plan.route, "truncated").inc()
+        else:
+            llm_continuations.labels(plan.route, "ok").inc()
+            usage = getattr(response, "usage", None)
+            if usage and partial_tokens:
+                self.router.observe_continued(plan.route, partial_tokens + usage.completion_tokens)
+        if not tail or tail[0] in ".,;:!?)»":
+            return partial.rstrip() + tail
+        return partial.rstrip() + " " + tail
+    
+    async def _stale_response(self, cache_key: str, user_id: int) -> Optional[str]:
+        """
+        Устаревший ответ из кэша с пометкой для случая, когда API не отвечает.
+        
+        Args:
+            cache_key: Ключ запроса в кэше
+            user_id: ID пользователя для логирования
+            
+        Returns:
+            Ответ с пометкой STALE_RESPONSE_NOTE или None, если записи нет
+        """
+        stale_response = await cache_service.get_stale_response(cache_key)
+        if stale_response is None:
+            return None
+        
+        current_span().set_attribute("stale", True)
+        logger.info(
+            f"Serving stale cached response for user {user_id}",
+            extra={"event": "llm_response", "user_id": user_id, "stale": True}
+        )
+        return STALE_RESPONSE_NOTE + stale_response
+    
+    async def _serve_stale_or_error(self, cache_key: str, user_id: int) -> str:
+        """
+        Ответ на свободный запрос при отказе API: устаревший кэш или ошибка.
+        
+        Args:
+            cache_key: Ключ запроса в кэше
+            user_id: ID пользователя
+            
+        Returns:
+            Устаревший ответ с пометкой или сообщение об ошибке
+        """
+        response = await self._stale_response(cache_key, user_id)
+        if response is None:
+            return self._get_error_response()
+        await user_state_service.add_message_to_history(user_id, "assistant", response)
+        return response
     
     def _get_error_response(self, error_type: str = "general") -> str:
         """Возвращает сообщение об ошибке в стиле Сайтамы."""
@@ -192,29 +549,54 @@ class LLMService:
             else:
                 return "Хм... Не знаю такую категорию."
             
-            # Формируем промпт
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ]
-            
-            # Запрашиваем API
-            response = await self._make_api_request(messages)
-            
-            # Обрезаем ответ до максимальной длины
-            response = truncate_message(response)
+            # Ответ категории одинаков для всех - берем из кэша, если есть
+            cache_key = f"/{category}"
+            response = await cache_service.get_cached_response(cache_key)
+            if response:
+                logger.info(f"Returning cached {category} response for user {user_id}")
+            elif cache_service.is_failing(cache_key):
+                # API только что не ответил на эту категорию - отдаем устаревший ответ
+                response = await self._stale_response(cache_key, user_id)
+                if response is None:
+                    return self._get_error_response()
+            else:
+                # Формируем промпт
+                messages = [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ]
+                
+                # Запрашиваем API
+                try:
+                    response, model = await self._make_api_request(messages, route=ROUTE_CATEGORY)
+                except Exception as e:
+                    if not isinstance(e, DeadlineExceeded):
+                        cache_service.mark_failed(cache_key)
+                    response = await self._stale_response(cache_key, user_id)
+                    if response is None:
+                        raise
+                else:
+                    # Обрезаем ответ до максимальной длины
+                    response = truncate_message(response)
+                    await cache_service.save_response(cache_key, response, model)
             
             # Добавляем в историю диалога
             await user_state_service.add_message_to_history(user_id, "user", f"/{category}")
             await user_state_service.add_message_to_history(user_id, "assistant", response)
             
-            logger.info(f"Category response for user {user_id}: {response}")
+            logger.info(
+                f"Category response for user {user_id}: {len(response)} chars",
+                extra={"event": "category_response", "user_id": user_id, "payload": response}
+            )
             return response
             
         except Exception as e:
+            mark_error(str(e))
             logger.error(f"Error generating category response for user {user_id}: {e}")
             return self._get_error_response()
 
 
-# Глобальный экземпляр сервиса
-llm_service = LLMService()
+# Глобальный сервис (создается при первом обращении)
+llm_service = services.register(
+    "llm", LLMService, startup=LLMService.startup, shutdown=LLMService.shutdown, background=True
+)
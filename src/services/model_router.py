@@ -0,0 +1,345 @@
+"""
+Маршрутизатор моделей по наблюдаемой задержке, ошибкам и стоимости.
+
+Для каждой пары (модель, класс запроса) копится онлайн-статистика:
+EWMA доли ошибок, EWMA числа токенов ответа и скетч задержек успешных
+ответов (лог-линейная гистограмма из src/utils/metrics.py, окно из двух
+половин, чтобы статистика не застывала). Классы запросов различаются
+ожидаемой длиной ответа и SLO по задержке:
+
+- chat: короткий ответ в диалоге;
+- category: список для /top, /new, /classic;
+- recommendation: развернутая рекомендация.
+
+Для запроса выбирается самая дешевая модель, у которой p95 задержки
+укладывается в SLO класса, а доля ошибок - в MAX_ERROR_RATE. Остальные
+модели идут следом как fallback - от лучших к худшим. Небольшая доля
+запросов (ROUTER_EXPLORATION) уходит на модели с наименьшей статистикой,
+чтобы оценки оставались свежими. Пока статистики нет, порядок прежний:
+OPENROUTER_MODEL, затем fallback модели.
+
+Лимит длины ответа (max_tokens) тоже подстраивается под класс: по
+распределению фактической длины ответов берется OUTPUT_BUDGET_QUANTILE
+плюс запас OUTPUT_BUDGET_MARGIN, но не больше потолка класса. Ответ,
+обрезанный по лимиту, дозапрашивается коротким продолжением
+(continuation_tokens), а не молча обрезается.
+"""
+
+import math
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.utils.config import config
+from src.utils.logger import parse_event_rates
+from src.utils.metrics import HistogramChild, metrics
+
+ROUTE_CHAT = "chat"
+ROUTE_CATEGORY = "category"
+ROUTE_RECOMMENDATION = "recommendation"
+
+# Вес нового наблюдения в EWMA
+EWMA_ALPHA = 0.1
+# Успешных ответов, после которых оценке задержки можно доверять
+MIN_SAMPLES = 3
+# Наблюдений в половине окна скетча задержек
+LATENCY_WINDOW = 500
+# Квантиль задержки, который сравнивается с SLO
+LATENCY_QUANTILE = 0.95
+# Модели с большей долей ошибок не выбираются основными
+MAX_ERROR_RATE = 0.2
+# Нижняя граница лимита длины ответа, токены
+MIN_OUTPUT_TOKENS = 64
+# Лимит продолжения обрезанного ответа - доля лимита класса
+CONTINUATION_SHARE = 0.25
+
+# Цена моделей по умолчанию, USD за 1M токенов (среднее вход/выход);
+# переопределяется ROUTER_PRICES="model=price,..."
+MODEL_PRICES = {
+    "openai/gpt-3.5-turbo": 1.0,
+    "anthropic/claude-3-haiku": 0.75,
+    "google/gemini-pro": 1.0,
+    "meta-llama/llama-3.1-8b-instruct:free": 0.0,
+}
+# Цена неизвестной модели
+DEFAULT_PRICE = 1.0
+
+router_decisions = metrics.counter(
+    "router_decisions_total", "Решения маршрутизатора моделей", ("route", "model", "reason")
+)
+router_latency = metrics.gauge(
+    "router_latency_p95_seconds", "p95 задержки успешных ответов модели", ("model", "route")
+)
+router_errors = metrics.gauge("router_error_rate", "EWMA доли ошибок модели", ("model", "route"))
+router_cost = metrics.gauge("router_cost_usd", "Ожидаемая стоимость ответа модели", ("model", "route"))
+output_tokens = metrics.histogram(
+    "llm_output_tokens", "Длина ответов LLM в токенах", ("route",),
+    buckets=(16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+)
+output_cap = metrics.gauge("llm_output_cap_tokens", "Текущий лимит max_tokens класса запроса", ("route",))
+output_truncated = metrics.counter("llm_output_truncated_total", "Ответы, обрезанные по max_tokens", ("route",))
+
+
+@dataclass
+class RouteClass:
+    """Класс запроса: параметры генерации и SLO по задержке."""
+    name: str
+    max_tokens: int
+    temperature: float
+    slo_seconds: float
+
+
+@dataclass
+class RoutePlan:
+    """Решение маршрутизатора для одного запроса."""
+    route: str
+    models: List[str]
+    max_tokens: int
+    temperature: float
+    reason: str
+    # Лимит на продолжение, если ответ обрежется по max_tokens
+    continuation_tokens: int = MIN_OUTPUT_TOKENS
+
+
+@dataclass
+class WindowedSketch:
+    """Скетч квантилей по окну из двух половин: старая заменяется при заполнении новой."""
+    window: int = LATENCY_WINDOW
+    current: HistogramChild = field(default_factory=HistogramChild)
+    previous: HistogramChild = field(default_factory=HistogramChild)
+
+    def observe(self, value: float) -> None:
+        """Записать значение."""
+        if self.current.count >= self.window:
+            self.previous, self.current = self.current, HistogramChild()
+        self.current.observe(value)
+
+    @property
+    def count(self) -> int:
+        """Значений в окне."""
+        return self.current.count + self.previous.count
+
+    def quantile(self, q: float, min_samples: int) -> float:
+        """Квантиль по текущей половине или, пока в ней мало значений, по прошлой."""
+        sketch = self.current if self.current.count >= min_samples or not self.previous.count else self.previous
+        return sketch.quantile(q)
+
+
+@dataclass
+class OutputBudget:
+    """Лимит длины ответа класса по распределению фактических длин."""
+    ceiling: int
+    cap: int = 0
+    lengths: WindowedSketch = field(default_factory=lambda: WindowedSketch(window=2000))
+
+    def __post_init__(self):
+        self.cap = self.cap or self.ceiling
+
+    def observe(self, tokens: int) -> None:
+        """
+        Учитывает длину законченного ответа и пересчитывает лимит.
+
+        Обрезанные ответы сюда не попадают: если продолжение закончило
+        мысль, учитывается полная длина (так лимит растет вслед за
+        длинными ответами), а "заговорившиеся" ответы не учитываются вовсе.
+
+        Args:
+            tokens: Токены законченного ответа
+        """
+        self.lengths.observe(tokens)
+        if not config.OUTPUT_BUDGET_ENABLED or self.lengths.count < config.OUTPUT_BUDGET_MIN_SAMPLES:
+            return
+        quantile = self.lengths.quantile(config.OUTPUT_BUDGET_QUANTILE, config.OUTPUT_BUDGET_MIN_SAMPLES)
+        cap = math.ceil(quantile * (1 + config.OUTPUT_BUDGET_MARGIN))
+        self.cap = max(MIN_OUTPUT_TOKENS, min(self.ceiling, cap))
+
+
+@dataclass
+class ModelStats:
+    """Онлайн-статистика модели в одном классе запросов."""
+    price: float
+    error_rate: float = 0.0
+    tokens: float = 0.0
+    samples: int = 0
+    latency: WindowedSketch = field(default_factory=WindowedSketch)
+    p95: float = 0.0
+
+    def observe(self, seconds: float, ok: bool, tokens: Optional[int]) -> None:
+        """
+        Учитывает попытку запроса.
+
+        Args:
+            seconds: Длительность попытки
+            ok: Успешен ли ответ
+            tokens: Токены ответа (None - неизвестно)
+        """
+        self.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        if not ok:
+            return
+        if tokens:
+            self.tokens = tokens if not self.tokens else self.tokens + EWMA_ALPHA * (tokens - self.tokens)
+        self.samples += 1
+        self.latency.observe(seconds)
+        self.p95 = self.latency.quantile(LATENCY_QUANTILE, MIN_SAMPLES)
+
+    def cost(self, route: RouteClass) -> float:
+        """Ожидаемая стоимость ответа, USD."""
+        return (self.tokens or route.max_tokens) * self.price / 1_000_000
+
+
+def default_routes() -> Dict[str, RouteClass]:
+    """Классы запросов с SLO из конфигурации."""
+    return {
+        ROUTE_CHAT: RouteClass(ROUTE_CHAT, 500, 0.8, config.ROUTER_SLO_CHAT),
+        ROUTE_CATEGORY: RouteClass(ROUTE_CATEGORY, 1000, 0.5, config.ROUTER_SLO_CATEGORY),
+        ROUTE_RECOMMENDATION: RouteClass(ROUTE_RECOMMENDATION, 800, 0.7, config.ROUTER_SLO_RECOMMENDATION),
+    }
+
+
+class ModelRouter:
+    """Выбор модели и параметров генерации для класса запроса."""
+
+    def __init__(self, models: Sequence[str], routes: Dict[str, RouteClass] = None, seed: int = None):
+        """
+        Args:
+            models: Модели в порядке по умолчанию (основная первой)
+            routes: Классы запросов (по умолчанию default_routes())
+            seed: Зерно для выбора разведочных запросов
+        """
+        self.models = list(dict.fromkeys(models))
+        self.routes = routes or default_routes()
+        self.prices = {**MODEL_PRICES, **parse_event_rates(config.ROUTER_PRICES)}
+        self.stats: Dict[Tuple[str, str], ModelStats] = {}
+        self.budgets: Dict[str, OutputBudget] = {}
+        for name, route_class in self.routes.items():
+            budget = self.budgets[name] = OutputBudget(route_class.max_tokens)
+            output_cap.labels(name).set_function(lambda budget=budget: budget.cap)
+        self.random = random.Random(seed)
+
+    def _stats(self, model: str, route: str) -> ModelStats:
+        """Статистика пары (модель, класс), создается при первом обращении."""
+        stats = self.stats.get((model, route))
+        if stats is None:
+            stats = self.stats[(model, route)] = ModelStats(self.prices.get(model, DEFAULT_PRICE))
+            route_class = self.routes[route]
+            router_latency.labels(model, route).set_function(lambda: stats.p95)
+            router_errors.labels(model, route).set_function(lambda: stats.error_rate)
+            router_cost.labels(model, route).set_function(lambda: stats.cost(route_class))
+        return stats
+
+    def plan(self, route: str, pinned: Optional[str] = None) -> RoutePlan:
+        """
+        Порядок моделей и параметры генерации для запроса.
+
+        Args:
+            route: Класс запроса (ROUTE_*)
+            pinned: Модель, заданная явно (например, RETRIEVAL_MODEL) - идет первой
+
+        Returns:
+            План: модели в порядке попыток, max_tokens, temperature и причина выбора
+        """
+        route_class = self.routes.get(route) or self.routes[ROUTE_RECOMMENDATION]
+        models = list(self.models)
+        if pinned and pinned not in models:
+            models.insert(0, pinned)
+
+        if not config.ROUTER_ENABLED:
+            order, reason = self._static_order(models, pinned), "static"
+        elif pinned:
+            order, reason = self._static_order(self._ranked(models, route_class), pinned), "pinned"
+        else:
+            order, reason = self._choose(models, route_class)
+
+        router_decisions.labels(route_class.name, order[0], reason).inc()
+        max_tokens = self.budgets[route_class.name].cap
+        continuation_tokens = max(MIN_OUTPUT_TOKENS, int(max_tokens * CONTINUATION_SHARE))
+        return RoutePlan(route_class.name, order, max_tokens, route_class.temperature, reason, continuation_tokens)
+
+    @staticmethod
+    def _static_order(models: List[str], first: Optional[str]) -> List[str]:
+        """Модели в заданном порядке, first - в начале."""
+        if not first:
+            return models
+        return [first] + [model for model in models if model != first]
+
+    def _ranked(self, models: List[str], route: RouteClass) -> List[str]:
+        """
+        Модели от лучших к худшим: сначала укладывающиеся в SLO (дешевые
+        первыми), затем с известной статистикой по задержке, затем без
+        статистики в порядке по умолчанию.
+        """
+        def key(item: Tuple[int, str]) -> Tuple:
+            position, model = item
+            stats = self.stats.get((model, route.name))
+            if stats is None or stats.samples < MIN_SAMPLES:
+                return (2, position)
+            if stats.error_rate <= MAX_ERROR_RATE and stats.p95 <= route.slo_seconds:
+                return (0, stats.cost(route), stats.p95)
+            return (1, stats.error_rate > MAX_ERROR_RATE, stats.p95)
+
+        return [model for _, model in sorted(enumerate(models), key=key)]
+
+    def _choose(self, models: List[str], route: RouteClass) -> Tuple[List[str], str]:
+        """Лучшая модель или разведочный запрос."""
+        ranked = self._ranked(models, route)
+        best = self.stats.get((ranked[0], route.name))
+        if best is None or best.samples < MIN_SAMPLES:
+            # Статистики еще нет ни у одной модели
+            return self._static_order(models, models[0]), "cold"
+
+        if len(ranked) > 1 and self.random.random() < config.ROUTER_EXPLORATION:
+            # Разведка: модель с наименьшим числом наблюдений
+            others = ranked[1:]
+            fewest = min(self._stats(model, route.name).samples for model in others)
+            explore = self.random.choice(
+                [model for model in others if self._stats(model, route.name).samples == fewest]
+            )
+            return self._static_order(ranked, explore), "explore"
+
+        within_slo = best.error_rate <= MAX_ERROR_RATE and best.p95 <= route.slo_seconds
+        return ranked, "best" if within_slo else "no_slo"
+
+    def observe(self, model: str, route: str, seconds: float, ok: bool, tokens: Optional[int] = None) -> None:
+        """
+        Учитывает результат попытки запроса к модели.
+
+        Args:
+            model: Модель
+            route: Класс запроса
+            seconds: Длительность попытки
+            ok: Успешен ли ответ
+            tokens: Токены ответа из usage (если есть)
+        """
+        if route not in self.routes:
+            return
+        self._stats(model, route).observe(seconds, ok, tokens)
+
+    def observe_output(self, route: str, tokens: int, truncated: bool) -> None:
+        """
+        Учитывает длину ответа класса для подстройки max_tokens.
+
+        Args:
+            route: Класс запроса
+            tokens: Токены ответа (первой части, без продолжения)
+            truncated: Ответ обрезан по max_tokens
+        """
+        budget = self.budgets.get(route)
+        if budget is None:
+            return
+        output_tokens.labels(route).observe(tokens)
+        if truncated:
+            output_truncated.labels(route).inc()
+        else:
+            budget.observe(tokens)
+
+    def observe_continued(self, route: str, tokens: int) -> None:
+        """
+        Учитывает полную длину ответа, который продолжение закончило.
+
+        Args:
+            route: Класс запроса
+            tokens: Токены обеих частей ответа
+        """
+        budget = self.budgets.get(route)
+        if budget is not None:
+            budget.observe(tokens)
@@ -1,92 +1,417 @@
 """
 Сервис для пагинации длинных списков рекомендаций.
+
+Каждый список - отдельная сессия с коротким ID, который зашит в callback_data
+кнопок, поэтому кнопки старого сообщения листают именно свой список.
+Сессии вытесняются по TTL, по LRU и по общему лимиту памяти.
 """
 
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+import secrets
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, NamedTuple, Sequence, Tuple, Union
+from dataclasses import dataclass, field
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from src.utils.config import config
 from src.utils.logger import logger
+from src.utils.message_utils import AnimeItem, format_anime_page
+from src.utils.metrics import metrics
+
+# Префикс callback_data кнопок пагинации: "pg:<session_id>:<действие>"
+CALLBACK_PREFIX = "pg"
+# Действия кроме номера страницы
+ACTION_INFO = "i"
+ACTION_CLOSE = "x"
+# Лимит Telegram на длину callback_data
+MAX_CALLBACK_DATA_BYTES = 64
+
+pagination_renders = metrics.counter(
+    "pagination_page_renders_total", "Запросы страниц пагинации", ("result",)
+)
+pagination_cached = pagination_renders.labels("cached")
+pagination_rendered = pagination_renders.labels("rendered")
+pagination_expired = pagination_renders.labels("expired")
+
+# Грубые оценки размера для лимита памяти
+ITEM_REF_BYTES = 8
+KEYBOARD_BYTES = 1024
+STATE_BYTES = 512
+
+
+class RenderedPage(NamedTuple):
+    """Готовая к отправке страница: текст и клавиатура."""
+    page: int
+    text: str
+    keyboard: Optional[InlineKeyboardMarkup]
 
 
 @dataclass
 class PaginationState:
-    """Состояние пагинации для пользователя."""
+    """Состояние одной сессии пагинации."""
+    session_id: str
     user_id: int
-    items: List[Dict[str, Any]]
+    items: Tuple[AnimeItem, ...]
     current_page: int = 1
     items_per_page: int = 3
     category: str = "anime"
-    created_at: Optional[str] = None
+    created_at: float = field(default_factory=time.monotonic)
+    last_access: float = field(default_factory=time.monotonic)
+    # Кэш отрисованных страниц: индекс = номер страницы - 1
+    rendered_pages: List[Optional[RenderedPage]] = field(default_factory=list)
+    # Оценка занимаемой памяти в байтах
+    size_bytes: int = 0
+
+    @property
+    def total_pages(self) -> int:
+        """Общее количество страниц."""
+        return (len(self.items) + self.items_per_page - 1) // self.items_per_page
+
+
+def encode_callback(session_id: str, action: Union[int, str]) -> str:
+    """
+    Закодировать действие пагинации в callback_data.
+
+    Args:
+        session_id: ID сессии пагинации
+        action: Номер страницы или служебное действие (ACTION_INFO, ACTION_CLOSE)
+
+    Returns:
+        Строка callback_data не длиннее 64 байт
+    """
+    data = f"{CALLBACK_PREFIX}:{session_id}:{action}"
+    if len(data.encode("utf-8")) > MAX_CALLBACK_DATA_BYTES:
+        raise ValueError(f"callback_data too long: {data}")
+    return data
+
+
+def parse_callback(data: str) -> Optional[Tuple[str, str]]:
+    """
+    Разобрать callback_data кнопки пагинации.
+
+    Args:
+        data: Строка callback_data
+
+    Returns:
+        Пара (session_id, действие) или None, если формат не распознан
+    """
+    parts = data.split(":")
+    if len(parts) != 3 or parts[0] != CALLBACK_PREFIX or not parts[1]:
+        return None
+    return parts[1], parts[2]
 
 
 class PaginationService:
     """Сервис для управления пагинацией."""
-    
-    def __init__(self):
-        """Инициализация сервиса пагинации."""
-        self.pagination_states: Dict[int, PaginationState] = {}
+
+    def __init__(self, ttl_seconds: int = None, max_sessions: int = None,
+                 max_bytes: int = None):
+        """
+        Инициализация сервиса пагинации.
+
+        Args:
+            ttl_seconds: Время жизни сессии с последнего обращения
+            max_sessions: Максимальное количество сессий
+            max_bytes: Общий лимит памяти на все сессии
+        """
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.PAGINATION_TTL_SECONDS
+        self.max_sessions = max_sessions if max_sessions is not None else config.PAGINATION_MAX_SESSIONS
+        self.max_bytes = max_bytes if max_bytes is not None else config.PAGINATION_MAX_BYTES
+
+        # Сессии в порядке последнего обращения (LRU)
+        self.pagination_states: "OrderedDict[str, PaginationState]" = OrderedDict()
+        self.total_bytes = 0
+
+        # Общий пул записей: одинаковые элементы разных сессий - один объект
+        self._items_pool: Dict[AnimeItem, AnimeItem] = {}
+        self._items_refs: Dict[AnimeItem, int] = {}
+
+        # Последний открытый список пользователя - для "дальше" текстом
+        self._user_latest: Dict[int, str] = {}
         logger.info("PaginationService initialized")
-    
-    async def create_pagination(self, user_id: int, items: List[Dict[str, Any]], 
-                              items_per_page: int = 3, category: str = "anime") -> PaginationState:
+
+    async def create_pagination(self, user_id: int,
+                              items: Sequence[Union[AnimeItem, Dict[str, Any]]],
+                              items_per_page: int = 3, category: str = "anime",
+                              prerender: bool = False) -> PaginationState:
         """
-        Создать пагинацию для пользователя.
-        
+        Создать новую сессию пагинации.
+
         Args:
-            user_id: ID пользователя
-            items: Список элементов для пагинации
+            user_id: ID пользователя - владельца списка
+            items: Элементы для пагинации (AnimeItem или словари)
             items_per_page: Количество элементов на странице
             category: Категория элементов
-            
+            prerender: Отрисовать все страницы сразу (иначе - при первом просмотре)
+
         Returns:
-            Состояние пагинации
+            Состояние пагинации с session_id для callback_data
         """
+        self._evict()
+
+        session_id = self._new_session_id()
         pagination_state = PaginationState(
+            session_id=session_id,
             user_id=user_id,
-            items=items,
+            items=self._intern_items(items),
             current_page=1,
             items_per_page=items_per_page,
             category=category
         )
-        
-        self.pagination_states[user_id] = pagination_state
-        logger.info(f"Created pagination for user {user_id}: {len(items)} items, {items_per_page} per page")
-        
+        pagination_state.rendered_pages = [None] * pagination_state.total_pages
+        self._add_size(pagination_state, STATE_BYTES + ITEM_REF_BYTES * len(pagination_state.items))
+
+        self.pagination_states[session_id] = pagination_state
+        self._user_latest[user_id] = session_id
+
+        if prerender:
+            for page in range(1, pagination_state.total_pages + 1):
+                self._render_page(pagination_state, page)
+
+        self._evict(keep=session_id)
+        logger.info(
+            f"Created pagination {session_id} for user {user_id}: "
+            f"{len(items)} items, {items_per_page} per page"
+        )
+
         return pagination_state
-    
-    async def get_page(self, user_id: int, page: int = None) -> Optional[Dict[str, Any]]:
+
+    def _new_session_id(self) -> str:
+        """Сгенерировать короткий уникальный ID сессии."""
+        while True:
+            session_id = secrets.token_urlsafe(6)
+            if session_id not in self.pagination_states:
+                return session_id
+
+    def _intern_items(self, items: Sequence[Union[AnimeItem, Dict[str, Any]]]) -> Tuple[AnimeItem, ...]:
         """
-        Получить страницу с элементами.
-        
+        Привести элементы к AnimeItem и заменить их ссылками из общего пула.
+
+        Args:
+            items: Исходные элементы
+
+        Returns:
+            Кортеж общих записей
+        """
+        interned = []
+        for item in items:
+            if isinstance(item, dict):
+                item = AnimeItem.from_dict(item)
+            item = self._items_pool.setdefault(item, item)
+            self._items_refs[item] = self._items_refs.get(item, 0) + 1
+            interned.append(item)
+        return tuple(interned)
+
+    def _release_items(self, items: Tuple[AnimeItem, ...]) -> None:
+        """Освободить ссылки сессии на записи пула."""
+        for item in items:
+            refs = self._items_refs.get(item, 0) - 1
+            if refs <= 0:
+                self._items_refs.pop(item, None)
+                self._items_pool.pop(item, None)
+            else:
+                self._items_refs[item] = refs
+
+    def _add_size(self, state: PaginationState, size: int) -> None:
+        """Учесть память сессии в общем счетчике."""
+        state.size_bytes += size
+        self.total_bytes += size
+
+    def _remove(self, session_id: str) -> Optional[PaginationState]:
+        """Удалить сессию и освободить ее ресурсы."""
+        state = self.pagination_states.pop(session_id, None)
+        if state is not None:
+            self.total_bytes -= state.size_bytes
+            self._release_items(state.items)
+            if self._user_latest.get(state.user_id) == session_id:
+                del self._user_latest[state.user_id]
+        return state
+
+    def _evict(self, keep: str = None) -> int:
+        """
+        Вытеснить истекшие сессии и самые давние сверх лимитов.
+
+        Args:
+            keep: ID сессии, которую не вытеснять (только что созданная или
+                отрисованная - даже если одна она больше max_bytes)
+
+        Returns:
+            Количество вытесненных сессий
+        """
+        evicted = 0
+        deadline = time.monotonic() - self.ttl_seconds
+
+        # Сессии упорядочены по последнему обращению: истекшие - в начале
+        while self.pagination_states:
+            session_id, state = next(iter(self.pagination_states.items()))
+            if session_id == keep:
+                # Остальные сессии новее нее - вытеснять дальше нечего
+                break
+            over_limit = (
+                len(self.pagination_states) > self.max_sessions
+                or self.total_bytes > self.max_bytes
+            )
+            if state.last_access >= deadline and not over_limit:
+                break
+            self._remove(session_id)
+            evicted += 1
+
+        if evicted:
+            logger.debug(f"Evicted {evicted} pagination sessions")
+        return evicted
+
+    def _get_state(self, session_id: str, user_id: int = None) -> Optional[PaginationState]:
+        """
+        Найти живую сессию и отметить обращение к ней.
+
+        Args:
+            session_id: ID сессии
+            user_id: ID пользователя (если указан, проверяется владелец)
+
+        Returns:
+            Состояние пагинации или None
+        """
+        state = self.pagination_states.get(session_id)
+        if state is None:
+            return None
+
+        now = time.monotonic()
+        if now - state.last_access > self.ttl_seconds:
+            self._remove(session_id)
+            return None
+
+        if user_id is not None and state.user_id != user_id:
+            return None
+
+        state.last_access = now
+        self.pagination_states.move_to_end(session_id)
+        return state
+
+    def _render_page(self, state: PaginationState, page: int) -> RenderedPage:
+        """
+        Отрисовать страницу и положить ее в кэш состояния.
+
+        Args:
+            state: Состояние пагинации
+            page: Номер страницы (уже приведенный к допустимому диапазону)
+
+        Returns:
+            Отрисованная страница
+        """
+        total_pages = state.total_pages
+        start_idx = (page - 1) * state.items_per_page
+        page_items = state.items[start_idx:start_idx + state.items_per_page]
+
+        rendered = RenderedPage(
+            page=page,
+            text=format_anime_page(page_items, page, total_pages, state.category),
+            keyboard=self._build_keyboard(state.session_id, page, total_pages)
+        )
+        state.rendered_pages[page - 1] = rendered
+        self._add_size(state, self._page_bytes(rendered))
+        return rendered
+
+    @staticmethod
+    def _page_bytes(rendered: RenderedPage) -> int:
+        """Оценка памяти отрисованной страницы."""
+        return len(rendered.text) * 2 + KEYBOARD_BYTES
+
+    def drop_rendered(self, session_id: str) -> None:
+        """
+        Сбросить отрисованные страницы сессии (отрисуются заново при просмотре).
+
+        Args:
+            session_id: ID сессии пагинации
+        """
+        state = self.pagination_states.get(session_id)
+        if state is None:
+            return
+        freed = sum(self._page_bytes(rendered) for rendered in state.rendered_pages if rendered is not None)
+        state.rendered_pages = [None] * state.total_pages
+        self._add_size(state, -freed)
+
+    async def render_page(self, session_id: str, page: int = None,
+                          user_id: int = None) -> Optional[RenderedPage]:
+        """
+        Получить готовые текст и клавиатуру страницы из кэша, отрисовав при первом просмотре.
+
+        Args:
+            session_id: ID сессии пагинации
+            page: Номер страницы (если None, возвращает текущую)
+            user_id: ID пользователя для проверки владельца
+
+        Returns:
+            Отрисованная страница или None, если сессия истекла или чужая
+        """
+        state = self._get_state(session_id, user_id)
+        if state is None or not state.rendered_pages:
+            pagination_expired.inc()
+            return None
+
+        if page is not None:
+            state.current_page = min(max(page, 1), state.total_pages)
+        self._user_latest[state.user_id] = session_id
+
+        rendered = state.rendered_pages[state.current_page - 1]
+        if rendered is None:
+            pagination_rendered.inc()
+            rendered = self._render_page(state, state.current_page)
+            self._evict(keep=session_id)
+        else:
+            pagination_cached.inc()
+
+        return rendered
+
+    async def render_user_page(self, user_id: int, step: int = 1) -> Optional[RenderedPage]:
+        """
+        Перелистнуть последний список пользователя (для "дальше"/"назад" текстом).
+
         Args:
             user_id: ID пользователя
+            step: Сдвиг относительно текущей страницы
+
+        Returns:
+            Отрисованная страница или None, если открытого списка нет
+        """
+        session_id = self._user_latest.get(user_id)
+        if session_id is None:
+            return None
+        state = self._get_state(session_id, user_id)
+        if state is None:
+            return None
+        return await self.render_page(session_id, state.current_page + step, user_id=user_id)
+
+    async def get_page(self, session_id: str, page: int = None) -> Optional[Dict[str, Any]]:
+        """
+        Получить страницу с элементами.
+
+        Args:
+            session_id: ID сессии пагинации
             page: Номер страницы (если None, возвращает текущую)
-            
+
         Returns:
             Словарь с данными страницы или None
         """
-        if user_id not in self.pagination_states:
+        state = self._get_state(session_id)
+        if state is None:
             return None
-        
-        state = self.pagination_states[user_id]
-        
+
         if page is not None:
             state.current_page = page
-        
+
         total_items = len(state.items)
-        total_pages = (total_items + state.items_per_page - 1) // state.items_per_page
-        
+        total_pages = state.total_pages
+
         if state.current_page < 1:
             state.current_page = 1
         elif state.current_page > total_pages:
             state.current_page = total_pages
-        
+
         start_idx = (state.current_page - 1) * state.items_per_page
         end_idx = start_idx + state.items_per_page
-        
+
         page_items = state.items[start_idx:end_idx]
-        
+
         return {
             "items": page_items,
             "current_page": state.current_page,
@@ -94,109 +419,165 @@ class PaginationService:
             "total_items": total_items,
             "category": state.category
         }
-    
-    async def get_pagination_keyboard(self, user_id: int) -> Optional[InlineKeyboardMarkup]:
+
+    async def get_pagination_keyboard(self, session_id: str) -> Optional[InlineKeyboardMarkup]:
         """
         Получить клавиатуру пагинации.
-        
+
         Args:
-            user_id: ID пользователя
-            
+            session_id: ID сессии пагинации
+
+        Returns:
+            Клавиатура с кнопками пагинации или None
+        """
+        rendered = await self.render_page(session_id)
+        return rendered.keyboard if rendered else None
+
+    def _build_keyboard(self, session_id: str, current_page: int,
+                        total_pages: int) -> Optional[InlineKeyboardMarkup]:
+        """
+        Построить клавиатуру пагинации для страницы.
+
+        Args:
+            session_id: ID сессии пагинации
+            current_page: Номер текущей страницы
+            total_pages: Общее количество страниц
+
         Returns:
             Клавиатура с кнопками пагинации или None
         """
-        if user_id not in self.pagination_states:
-            return None
-        
-        state = self.pagination_states[user_id]
-        total_pages = (len(state.items) + state.items_per_page - 1) // state.items_per_page
-        
         if total_pages <= 1:
             return None
-        
+
         keyboard = []
-        
+
         # Кнопки навигации
         nav_buttons = []
-        
+
         # Кнопка "Предыдущая"
-        if state.current_page > 1:
+        if current_page > 1:
             nav_buttons.append(
                 InlineKeyboardButton(
-                    text="⬅️ Предыдущая", 
-                    callback_data=f"page_{state.current_page - 1}"
+                    text="⬅️ Предыдущая",
+                    callback_data=encode_callback(session_id, current_page - 1)
                 )
             )
-        
+
         # Информация о странице
         nav_buttons.append(
             InlineKeyboardButton(
-                text=f"{state.current_page}/{total_pages}", 
-                callback_data="page_info"
+                text=f"{current_page}/{total_pages}",
+                callback_data=encode_callback(session_id, ACTION_INFO)
             )
         )
-        
+
         # Кнопка "Следующая"
-        if state.current_page < total_pages:
+        if current_page < total_pages:
             nav_buttons.append(
                 InlineKeyboardButton(
-                    text="Следующая ➡️", 
-                    callback_data=f"page_{state.current_page + 1}"
+                    text="Следующая ➡️",
+                    callback_data=encode_callback(session_id, current_page + 1)
                 )
             )
-        
+
         if nav_buttons:
             keyboard.append(nav_buttons)
-        
+
         # Кнопка "Закрыть"
         keyboard.append([
             InlineKeyboardButton(
-                text="❌ Закрыть", 
-                callback_data="close_pagination"
+                text="❌ Закрыть",
+                callback_data=encode_callback(session_id, ACTION_CLOSE)
             )
         ])
-        
+
         return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    
-    async def has_pagination(self, user_id: int) -> bool:
+
+    async def has_pagination(self, session_id: str) -> bool:
         """
-        Проверить, есть ли пагинация у пользователя.
-        
+        Проверить, жива ли сессия пагинации.
+
         Args:
-            user_id: ID пользователя
-            
+            session_id: ID сессии пагинации
+
         Returns:
-            True, если есть пагинация
+            True, если сессия существует и не истекла
         """
-        return user_id in self.pagination_states
-    
-    async def clear_pagination(self, user_id: int):
+        return self._get_state(session_id) is not None
+
+    async def clear_pagination(self, session_id: str, user_id: int = None) -> bool:
         """
-        Очистить пагинацию пользователя.
-        
+        Удалить сессию пагинации.
+
+        Args:
+            session_id: ID сессии пагинации
+            user_id: ID пользователя (если указан, удаляет только владелец)
+
+        Returns:
+            True, если сессия удалена
+        """
+        if user_id is not None and self._get_state(session_id, user_id) is None:
+            return False
+        if self._remove(session_id) is None:
+            return False
+        logger.info(f"Cleared pagination {session_id}")
+        return True
+
+    async def clear_user_paginations(self, user_id: int) -> int:
+        """
+        Удалить все сессии пагинации пользователя.
+
         Args:
             user_id: ID пользователя
+
+        Returns:
+            Количество удаленных сессий
         """
-        if user_id in self.pagination_states:
-            del self.pagination_states[user_id]
-            logger.info(f"Cleared pagination for user {user_id}")
-    
-    async def get_total_pages(self, user_id: int) -> int:
+        session_ids = [
+            session_id for session_id, state in self.pagination_states.items()
+            if state.user_id == user_id
+        ]
+        for session_id in session_ids:
+            self._remove(session_id)
+
+        if session_ids:
+            logger.info(f"Cleared {len(session_ids)} paginations for user {user_id}")
+        return len(session_ids)
+
+    async def get_total_pages(self, session_id: str, user_id: int = None) -> int:
         """
         Получить общее количество страниц.
-        
+
         Args:
-            user_id: ID пользователя
-            
+            session_id: ID сессии пагинации
+            user_id: ID пользователя (если указан, проверяется владелец)
+
+        Returns:
+            Количество страниц (0, если сессия истекла или чужая)
+        """
+        state = self._get_state(session_id, user_id)
+        return state.total_pages if state else 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику сессий пагинации.
+
         Returns:
-            Количество страниц
+            Словарь со статистикой
         """
-        if user_id not in self.pagination_states:
-            return 0
-        
-        state = self.pagination_states[user_id]
-        return (len(state.items) + state.items_per_page - 1) // state.items_per_page
+        return {
+            "sessions": len(self.pagination_states),
+            "total_bytes": self.total_bytes,
+            "pooled_items": len(self._items_pool),
+        }
 
 
 # Глобальный экземпляр сервиса
 pagination_service = PaginationService()
+
+metrics.gauge("pagination_sessions", "Активные сессии пагинации").set_function(
+    lambda: len(pagination_service.pagination_states)
+)
+metrics.gauge("pagination_bytes", "Оценка памяти сессий пагинации").set_function(
+    lambda: pagination_service.total_bytes
+)
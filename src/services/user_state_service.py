@@ -5,9 +5,9 @@
 from typing import Dict, List, Optional
 from dataclasses import dataclass, field
 from datetime import datetime
-import logging
 
 from src.utils.logger import logger
+from src.utils.tracing import traced
 
 
 @dataclass
@@ -46,6 +46,7 @@ class UserStateService:
         
         return self.user_states[user_id]
     
+    @traced("user_state.add_message")
     async def add_message_to_history(self, user_id: int, role: str, content: str):
         """
         Добавить сообщение в историю диалога пользователя.
@@ -66,8 +67,12 @@ class UserStateService:
         user_state.conversation_history.append(message)
         user_state.updated_at = datetime.now()
         
-        logger.info(f"Added {role} message to history for user {user_id}")
+        logger.debug(
+            f"Added {role} message to history for user {user_id}",
+            extra={"event": "history_add", "user_id": user_id}
+        )
     
+    @traced("user_state.get_context")
     async def get_conversation_context(self, user_id: int, max_tokens: int = 3000) -> List[Dict]:
         """
         Получить контекст диалога с ограничением по токенам.
@@ -102,7 +107,10 @@ class UserStateService:
             })
             total_chars += message_chars
         
-        logger.info(f"Generated context for user {user_id}: {len(context)} messages, ~{total_chars} chars")
+        logger.debug(
+            f"Generated context for user {user_id}: {len(context)} messages, ~{total_chars} chars",
+            extra={"event": "context_built", "user_id": user_id}
+        )
         return context
     
     async def reset_user_state(self, user_id: int):
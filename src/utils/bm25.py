@@ -0,0 +1,121 @@
+"""
+Векторизованный BM25 поверх разреженной матрицы термов на NumPy.
+
+Матрица хранится по столбцам термов (как CSC): для терма t его документы
+лежат в doc_ids[term_ptr[t]:term_ptr[t + 1]], а рядом - готовые веса BM25
+(idf * нормированная частота). Поэтому запрос - это сложение нескольких
+срезов весов в вектор оценок и argpartition для top-k, без циклов Python
+по документам.
+
+NumPy - необязательная зависимость (pip install ".[retrieval]"). Без нее
+BM25_AVAILABLE = False, и поиск просто не используется.
+"""
+
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy не установлен - ранжирование отключено, бот работает без него
+    np = None
+
+BM25_AVAILABLE = np is not None
+
+
+class BM25Index:
+    """Индекс BM25 по токенизированным документам."""
+
+    def __init__(self, documents: Sequence[Iterable[str]], k1: float = 1.2, b: float = 0.75,
+                 prior: Optional[Sequence[float]] = None):
+        """
+        Строит разреженную матрицу термов и веса BM25.
+
+        Args:
+            documents: Документы - последовательности термов
+            k1: Насыщение частоты терма
+            b: Сила нормировки по длине документа
+            prior: Добавка к оценке документа при любом совпадении
+                (например, рейтинг для упорядочивания равных оценок)
+        """
+        if np is None:
+            raise RuntimeError("BM25Index requires numpy")
+
+        self.vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        frequencies: List[int] = []
+        lengths: List[int] = []
+
+        for doc_id, terms in enumerate(documents):
+            counts = Counter(terms)
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                doc_ids.append(doc_id)
+                frequencies.append(count)
+
+        self.size = len(lengths)
+        terms_array = np.asarray(term_ids, dtype=np.int32)
+        docs_array = np.asarray(doc_ids, dtype=np.int32)
+        tf = np.asarray(frequencies, dtype=np.float32)
+        doc_length = np.asarray(lengths, dtype=np.float32)
+
+        # Столбцы по термам: стабильная сортировка сохраняет порядок документов
+        order = np.argsort(terms_array, kind="stable")
+        terms_array, docs_array, tf = terms_array[order], docs_array[order], tf[order]
+        counts = np.bincount(terms_array, minlength=len(self.vocabulary))
+        self.term_ptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.term_ptr[1:])
+        df = counts.astype(np.float32)
+
+        idf = np.log1p((self.size - df + 0.5) / (df + 0.5)).astype(np.float32)
+        average = float(doc_length.mean()) if self.size else 1.0
+        norm = k1 * (1 - b + b * doc_length[docs_array] / max(average, 1e-9))
+        self.doc_ids = docs_array
+        self.weights = (idf[terms_array] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+        self.prior = None if prior is None else np.asarray(prior, dtype=np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        """Память под матрицу (без словаря термов)."""
+        return self.term_ptr.nbytes + self.doc_ids.nbytes + self.weights.nbytes
+
+    def scores(self, terms: Iterable[str]) -> "np.ndarray":
+        """
+        Оценки BM25 всех документов для запроса.
+
+        Args:
+            terms: Термы запроса (повторы не учитываются)
+        """
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(terms):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_ptr[term_id], self.term_ptr[term_id + 1]
+            # В столбце терма документы уникальны, поэтому += без np.add.at
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        return scores
+
+    def top(self, terms: Iterable[str], k: int) -> List[Tuple[int, float]]:
+        """
+        Лучшие k документов запроса.
+
+        Args:
+            terms: Термы запроса
+            k: Сколько документов вернуть
+
+        Returns:
+            Пары (номер документа, оценка) по убыванию оценки, только с оценкой > 0
+        """
+        scores = self.scores(terms)
+        matched = np.flatnonzero(scores)
+        if not len(matched) or k <= 0:
+            return []
+        if self.prior is not None:
+            scores[matched] += self.prior[matched]
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        best = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in best]
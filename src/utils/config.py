@@ -14,31 +14,159 @@ class Config:
     
     # Telegram Bot
     TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
+    # Адрес Bot API (локальный telegram-bot-api или мок), пусто - api.telegram.org
+    TELEGRAM_API_URL: str = os.getenv("TELEGRAM_API_URL", "")
+    
+    # Delivery mode: polling или webhook
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling").lower()
+    # Сколько при остановке ждать обработки уже принятых обновлений, секунды
+    SHUTDOWN_DRAIN_TIMEOUT: float = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "30"))
+    
+    # Webhook
+    WEBHOOK_BASE_URL: str = os.getenv("WEBHOOK_BASE_URL", "")
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_QUEUE_SIZE: int = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+    WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", "16"))
+    WEBHOOK_DRAIN_TIMEOUT: float = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))
+    
+    # Worker pool (0 или 1 - один процесс)
+    WORKER_PROCESSES: int = int(os.getenv("WORKER_PROCESSES", "0"))
+    WORKER_QUEUE_SIZE: int = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))
+    WORKER_CONCURRENCY: int = int(os.getenv("WORKER_CONCURRENCY", "100"))
+    
+    # Outbound delivery (лимиты Telegram)
+    DELIVERY_GLOBAL_RATE: float = float(os.getenv("DELIVERY_GLOBAL_RATE", "30"))
+    DELIVERY_CHAT_RATE: float = float(os.getenv("DELIVERY_CHAT_RATE", "1"))
+    DELIVERY_CHAT_BURST: float = float(os.getenv("DELIVERY_CHAT_BURST", "3"))
+    DELIVERY_MAX_ATTEMPTS: int = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "5"))
+    
+    # Администраторы (ID через запятую) и токен для /debug эндпоинтов
+    ADMIN_USER_IDS: list = [int(x) for x in os.getenv("ADMIN_USER_IDS", "").split(",") if x.strip()]
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    
+    # Ops HTTP сервер (метрики и служебные эндпоинты), 0 - отключен
+    OPS_HOST: str = os.getenv("OPS_HOST", "127.0.0.1")
+    OPS_PORT: int = int(os.getenv("OPS_PORT", "9090"))
+    
+    # Бюджет времени на startup-хуки сервисов (фоновые не учитываются)
+    STARTUP_BUDGET_SECONDS: float = float(os.getenv("STARTUP_BUDGET_SECONDS", "2"))
+    
+    # Health checks
+    HEALTH_CHECK_INTERVAL: float = float(os.getenv("HEALTH_CHECK_INTERVAL", "30"))
+    HEALTH_CHECK_TIMEOUT: float = float(os.getenv("HEALTH_CHECK_TIMEOUT", "5"))
+    HEALTH_MAX_LOOP_LAG: float = float(os.getenv("HEALTH_MAX_LOOP_LAG", "0.5"))
+    HEALTH_LIVENESS_TIMEOUT: float = float(os.getenv("HEALTH_LIVENESS_TIMEOUT", "30"))
+    
+    # Event loop watchdog
+    LOOP_WATCHDOG_ENABLED: bool = os.getenv("LOOP_WATCHDOG_ENABLED", "true").lower() == "true"
+    LOOP_WATCHDOG_INTERVAL: float = float(os.getenv("LOOP_WATCHDOG_INTERVAL", "0.1"))
+    LOOP_LAG_THRESHOLD: float = float(os.getenv("LOOP_LAG_THRESHOLD", "0.25"))
+    
+    # Tracing: jsonl, otlp или none
+    TRACE_EXPORTER: str = os.getenv("TRACE_EXPORTER", "jsonl").lower()
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "logs/traces.jsonl")
+    TRACE_OTLP_ENDPOINT: str = os.getenv("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318")
+    # Медленные (секунды) и ошибочные трейсы сохраняются всегда, остальные - с этой долей
+    TRACE_SLOW_THRESHOLD: float = float(os.getenv("TRACE_SLOW_THRESHOLD", "5"))
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
     
     # OpenRouter API
     OPENROUTER_API_KEY: str = os.getenv("OPENROUTER_API_KEY", "")
     OPENROUTER_MODEL: str = os.getenv("OPENROUTER_MODEL", "openai/gpt-3.5-turbo")
+    # Базовый URL OpenAI-совместимого API (например, локальный мок для нагрузочных тестов)
+    OPENROUTER_BASE_URL: str = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+    # Пул ключей через запятую (пусто - только OPENROUTER_API_KEY): лимиты считаются на ключ
+    OPENROUTER_API_KEYS: str = os.getenv("OPENROUTER_API_KEYS", "")
+    # Карантин ключа после 429 без Retry-After и после ошибок авторизации/оплаты, секунды
+    KEY_QUARANTINE_SECONDS: float = float(os.getenv("KEY_QUARANTINE_SECONDS", "30"))
+    KEY_AUTH_QUARANTINE_SECONDS: float = float(os.getenv("KEY_AUTH_QUARANTINE_SECONDS", "3600"))
+    
+    # Пулы HTTP соединений (OpenRouter и Telegram)
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    # Сколько секунд держать простаивающее соединение открытым
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+    # HTTP/2 для OpenRouter (нужен пакет h2)
+    HTTP2: bool = os.getenv("HTTP2", "false").lower() == "true"
+    # Соединений, открываемых при запуске, и простой, после которого пул "пингуется"
+    HTTP_PREWARM_CONNECTIONS: int = int(os.getenv("HTTP_PREWARM_CONNECTIONS", "2"))
+    HTTP_KEEPALIVE_PING: float = float(os.getenv("HTTP_KEEPALIVE_PING", "45"))
     
     # Cache
     CACHE_TTL_HOURS: int = int(os.getenv("CACHE_TTL_HOURS", "24"))
     CACHE_DIR: str = os.getenv("CACHE_DIR", "data/cache")
+    CACHE_FLUSH_INTERVAL: int = int(os.getenv("CACHE_FLUSH_INTERVAL", "60"))
+    # Истекшие ответы хранятся еще столько часов и отдаются, если API недоступен
+    CACHE_STALE_HOURS: int = int(os.getenv("CACHE_STALE_HOURS", "72"))
+    # Сколько секунд не повторять запрос, на который не ответила ни одна модель
+    CACHE_NEGATIVE_SECONDS: float = float(os.getenv("CACHE_NEGATIVE_SECONDS", "30"))
+    
+    # Локальный каталог аниме: фильтрующие запросы отвечаются без LLM
+    CATALOG_ENABLED: bool = os.getenv("CATALOG_ENABLED", "true").lower() == "true"
+    # Путь к файлу каталога (пусто - встроенный src/data/anime_catalog.json)
+    CATALOG_FILE: str = os.getenv("CATALOG_FILE", "")
+    # Кандидаты из каталога (BM25, нужен numpy) в промпте открытых запросов
+    RETRIEVAL_ENABLED: bool = os.getenv("RETRIEVAL_ENABLED", "true").lower() == "true"
+    RETRIEVAL_TOP_K: int = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+    # Модель для запросов с кандидатами (пусто - OPENROUTER_MODEL)
+    RETRIEVAL_MODEL: str = os.getenv("RETRIEVAL_MODEL", "")
+    
+    # Классификатор намерений: приветствия, категории и "дальше" без LLM
+    INTENT_ENABLED: bool = os.getenv("INTENT_ENABLED", "true").lower() == "true"
+    INTENT_MIN_CONFIDENCE: float = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.7"))
+    
+    # Pagination
+    PAGINATION_TTL_SECONDS: int = int(os.getenv("PAGINATION_TTL_SECONDS", "3600"))
+    PAGINATION_MAX_SESSIONS: int = int(os.getenv("PAGINATION_MAX_SESSIONS", "10000"))
+    PAGINATION_MAX_BYTES: int = int(os.getenv("PAGINATION_MAX_BYTES", str(32 * 1024 * 1024)))
     
     # Logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_FORMAT: str = os.getenv("LOG_FORMAT", "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    LOG_JSON: bool = os.getenv("LOG_JSON", "true").lower() == "true"
+    # Сэмплирование и лимиты по типу события: "history_add=0.1,llm_request=1"
+    LOG_SAMPLING: str = os.getenv("LOG_SAMPLING", "")
+    LOG_RATE_LIMITS: str = os.getenv("LOG_RATE_LIMITS", "history_add=20,context_built=20,user_text=50")
+    LOG_MAX_FIELD_LENGTH: int = int(os.getenv("LOG_MAX_FIELD_LENGTH", "500"))
     
     # Application
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
     MAX_MESSAGE_LENGTH: int = int(os.getenv("MAX_MESSAGE_LENGTH", "4096"))
     MAX_RETRIES: int = int(os.getenv("MAX_RETRIES", "3"))
     RETRY_DELAY: int = int(os.getenv("RETRY_DELAY", "1"))
+    # Сколько секунд пропускать модель после исчерпания всех попыток к ней
+    MODEL_FAILURE_SECONDS: float = float(os.getenv("MODEL_FAILURE_SECONDS", "30"))
+    # Время на обработку одного обновления, секунды (0 - без дедлайна)
+    UPDATE_DEADLINE_SECONDS: float = float(os.getenv("UPDATE_DEADLINE_SECONDS", "45"))
+    # Бюджет повторов: доля повторов от первых попыток (отрицательное - без бюджета)
+    RETRY_BUDGET_RATIO: float = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+    # Повторов в секунду, разрешенных независимо от доли
+    RETRY_BUDGET_MIN_PER_SECOND: float = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+    
+    # Маршрутизатор моделей: самая дешевая модель, укладывающаяся в SLO класса запроса
+    ROUTER_ENABLED: bool = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+    # Доля разведочных запросов к моделям с наименьшей статистикой
+    ROUTER_EXPLORATION: float = float(os.getenv("ROUTER_EXPLORATION", "0.05"))
+    # SLO по p95 задержки для классов запросов, секунды
+    ROUTER_SLO_CHAT: float = float(os.getenv("ROUTER_SLO_CHAT", "4"))
+    ROUTER_SLO_CATEGORY: float = float(os.getenv("ROUTER_SLO_CATEGORY", "10"))
+    ROUTER_SLO_RECOMMENDATION: float = float(os.getenv("ROUTER_SLO_RECOMMENDATION", "8"))
+    # Цены моделей, USD за 1M токенов: "openai/gpt-3.5-turbo=1.0,other=0.5"
+    ROUTER_PRICES: str = os.getenv("ROUTER_PRICES", "")
+    # Лимит длины ответа по распределению длин: квантиль + запас, не больше потолка класса
+    OUTPUT_BUDGET_ENABLED: bool = os.getenv("OUTPUT_BUDGET_ENABLED", "true").lower() == "true"
+    OUTPUT_BUDGET_QUANTILE: float = float(os.getenv("OUTPUT_BUDGET_QUANTILE", "0.99"))
+    OUTPUT_BUDGET_MARGIN: float = float(os.getenv("OUTPUT_BUDGET_MARGIN", "0.2"))
+    OUTPUT_BUDGET_MIN_SAMPLES: int = int(os.getenv("OUTPUT_BUDGET_MIN_SAMPLES", "50"))
     
     @classmethod
     def validate(cls) -> None:
         """Проверяет обязательные переменные окружения."""
         required_vars = [
             ("TELEGRAM_BOT_TOKEN", cls.TELEGRAM_BOT_TOKEN),
-            ("OPENROUTER_API_KEY", cls.OPENROUTER_API_KEY),
+            ("OPENROUTER_API_KEY", cls.OPENROUTER_API_KEY or cls.OPENROUTER_API_KEYS),
         ]
         
         missing_vars = []
@@ -48,6 +176,9 @@ class Config:
         
         if missing_vars:
             raise ValueError(f"Отсутствуют обязательные переменные окружения: {', '.join(missing_vars)}")
+        
+        if cls.BOT_MODE not in ("polling", "webhook"):
+            raise ValueError(f"Неизвестный BOT_MODE: {cls.BOT_MODE} (ожидается polling или webhook)")
 
 
 # Глобальный экземпляр конфигурации
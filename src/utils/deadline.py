@@ -0,0 +1,230 @@
+"""
+Дедлайн обработки обновления и бюджет повторов запросов.
+
+Дедлайн хранится в contextvars (как текущий span трейсинга), поэтому
+переходит через await и в задачи, созданные при обработке обновления.
+Его задает DeadlineMiddleware (UPDATE_DEADLINE_SECONDS), а код ниже по
+стеку берет из него таймауты попыток и решает, есть ли смысл в повторе:
+
+    with deadline(45):
+        timeout = attempt_timeout(30, "llm.attempt")  # не больше оставшегося времени
+
+Вне дедлайна (фоновые задачи, бенчмарки) ограничений нет. При остановке
+бота cap_deadlines ограничивает все дедлайны, в том числе уже заданные:
+обрабатываемые обновления укладываются во время, отведенное на остановку.
+Уже начатые запросы, выполняемые через within_deadline, прерываются по
+новому пределу, а не по таймауту, выбранному до остановки.
+
+RetryBudget ограничивает долю повторов от первых попыток в скользящем окне:
+при отказе upstream повторы не умножают нагрузку на него.
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from typing import Awaitable, Iterator, Optional, Set, TypeVar
+
+from src.utils.config import config
+from src.utils.metrics import metrics
+
+deadline_exceeded = metrics.counter(
+    "deadline_exceeded_total", "Операции, прерванные по дедлайну обновления", ("stage",)
+)
+retry_budget_exhausted = metrics.counter(
+    "retry_budget_exhausted_total", "Повторы, отклоненные бюджетом повторов", ("name",)
+)
+retry_budget_available = metrics.gauge(
+    "retry_budget_available", "Сколько повторов бюджет разрешит сейчас", ("name",)
+)
+
+# Попытка короче этого не успеет получить ответ - ее не начинаем
+MIN_ATTEMPT_SECONDS = 2.0
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+# Общий предел всех дедлайнов (time.monotonic), задается при остановке
+_cap: Optional[float] = None
+# Ожидания within_deadline: cap_deadlines будит их пересчитать время
+_cap_waiters: Set[asyncio.Future] = set()
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """До дедлайна обновления не хватает времени на операцию."""
+
+    def __init__(self, stage: str):
+        """
+        Args:
+            stage: Операция, для которой не хватило времени (метка в метриках)
+        """
+        super().__init__(f"Deadline exceeded before {stage}")
+        self.stage = stage
+        deadline_exceeded.labels(stage).inc()
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """
+    Задает дедлайн для кода внутри блока (вложенный дедлайн не продлевает внешний).
+
+    Args:
+        seconds: Время на операцию, секунды (0 - без дедлайна)
+    """
+    if seconds <= 0:
+        yield
+        return
+    expires_at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires_at if current is None else min(current, expires_at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def cap_deadlines(seconds: Optional[float]) -> None:
+    """
+    Ограничивает все дедлайны процесса моментом через seconds.
+
+    Args:
+        seconds: Время до предела, секунды (None - снять предел)
+    """
+    global _cap
+    _cap = None if seconds is None else time.monotonic() + max(seconds, 0.0)
+    for waiter in _cap_waiters:
+        if not waiter.done():
+            waiter.set_result(None)
+
+
+def expires_at() -> Optional[float]:
+    """Момент дедлайна (time.monotonic) или None, если дедлайна нет."""
+    current = _deadline.get()
+    if _cap is None:
+        return current
+    return _cap if current is None else min(current, _cap)
+
+
+def remaining() -> Optional[float]:
+    """Оставшееся до дедлайна время, секунды (None - дедлайна нет)."""
+    current = expires_at()
+    return None if current is None else current - time.monotonic()
+
+
+async def within_deadline(awaitable: Awaitable[T], stage: str) -> T:
+    """
+    Выполняет операцию, прерывая ее по дедлайну, в том числе сокращенному
+    cap_deadlines уже во время выполнения.
+
+    Args:
+        awaitable: Операция (например, запрос к API)
+        stage: Операция (для исключения и метрик)
+
+    Returns:
+        Результат операции
+
+    Raises:
+        DeadlineExceeded: Если дедлайн наступил раньше завершения операции
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while not task.done():
+            left = remaining()
+            if left is not None and left <= 0:
+                raise DeadlineExceeded(stage)
+            waiter = asyncio.get_running_loop().create_future()
+            _cap_waiters.add(waiter)
+            try:
+                await asyncio.wait({task, waiter}, timeout=left, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                _cap_waiters.discard(waiter)
+        return task.result()
+    finally:
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+
+def attempt_timeout(default: float, stage: str, reserve: float = 0.0) -> float:
+    """
+    Таймаут попытки с учетом дедлайна.
+
+    Args:
+        default: Таймаут без дедлайна, секунды
+        stage: Операция (для исключения и метрик)
+        reserve: Время, которое нужно оставить до начала попытки (пауза перед ней)
+
+    Returns:
+        min(default, оставшееся время - reserve)
+
+    Raises:
+        DeadlineExceeded: Если на попытку остается меньше MIN_ATTEMPT_SECONDS
+    """
+    left = remaining()
+    if left is None:
+        return default
+    left -= reserve
+    if left < MIN_ATTEMPT_SECONDS:
+        raise DeadlineExceeded(stage)
+    return min(default, left)
+
+
+class RetryBudget:
+    """
+    Бюджет повторов: в окне не больше ratio повторов на первую попытку
+    плюс min_per_second * window повторов при малой нагрузке.
+
+    Окно из двух половин: при заполнении текущей половины прошлая отбрасывается.
+    """
+
+    def __init__(self, name: str, ratio: float = None, min_per_second: float = None,
+                 window: float = 10.0):
+        """
+        Args:
+            name: Имя бюджета (метка в метриках)
+            ratio: Доля повторов от первых попыток
+            min_per_second: Повторов в секунду, разрешенных всегда
+            window: Окно учета, секунды
+        """
+        self.name = name
+        self.ratio = config.RETRY_BUDGET_RATIO if ratio is None else ratio
+        self.min_per_second = config.RETRY_BUDGET_MIN_PER_SECOND if min_per_second is None else min_per_second
+        self.half = window / 2
+        self.started = time.monotonic()
+        # [первые попытки, повторы] в текущей и прошлой половине окна
+        self.current = [0, 0]
+        self.previous = [0, 0]
+        retry_budget_available.labels(name).set_function(self.available)
+
+    def _rotate(self) -> None:
+        """Сдвигает окно, если текущая половина истекла."""
+        elapsed = time.monotonic() - self.started
+        if elapsed < self.half:
+            return
+        # Прошло больше целого окна - прошлая половина тоже устарела
+        self.previous = self.current if elapsed < 2 * self.half else [0, 0]
+        self.current = [0, 0]
+        self.started = time.monotonic()
+
+    def available(self) -> float:
+        """Сколько повторов разрешено сейчас."""
+        if self.ratio < 0:
+            return float("inf")
+        self._rotate()
+        requests = self.current[0] + self.previous[0]
+        retries = self.current[1] + self.previous[1]
+        return max(0.0, self.ratio * requests + self.min_per_second * 2 * self.half - retries)
+
+    def record_request(self) -> None:
+        """Учитывает первую попытку."""
+        self._rotate()
+        self.current[0] += 1
+
+    def try_retry(self) -> bool:
+        """Разрешает повтор и учитывает его, если бюджет не исчерпан."""
+        if self.available() < 1:
+            retry_budget_exhausted.labels(self.name).inc()
+            return False
+        self.current[1] += 1
+        return True
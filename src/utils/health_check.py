@@ -1,135 +1,323 @@
 """
 Утилиты для health check мониторинга.
+
+Проверки выполняет фоновый планировщик: каждая проверка запускается по своему
+интервалу, параллельно с остальными и с собственным таймаутом. Результаты
+складываются в готовые ответы, поэтому /healthz и /readyz отвечают за O(1) и
+никогда не вызывают внешние API.
+
+- /healthz (liveness): процесс жив и event loop не завис.
+- /readyz (readiness): все критичные проверки прошли успешно.
 """
 
 import asyncio
+import json
+import os
 import time
-from typing import Dict, Any
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Union
+
+import aiohttp
+from aiohttp import web
+
+from src.utils.config import config
 from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+CheckFunc = Callable[[], Union[bool, None, Awaitable[Optional[bool]]]]
+
+check_status = metrics.gauge("health_check_status", "Результат проверки (1 - успешно)", ("check",))
+check_seconds = metrics.histogram("health_check_seconds", "Длительность проверки здоровья", ("check",))
+
+
+@dataclass
+class CheckState:
+    """Настройки и последний результат проверки."""
+    name: str
+    func: CheckFunc
+    interval: float
+    timeout: float
+    critical: bool
+    status: str = "unknown"
+    error: Optional[str] = None
+    last_run: float = 0.0
+    duration: float = 0.0
+    next_run: float = 0.0
 
 
 class HealthCheck:
     """Класс для проверки здоровья приложения."""
-    
-    def __init__(self):
-        """Инициализация health check."""
+
+    def __init__(self, tick: float = 1.0):
+        """
+        Инициализация health check.
+
+        Args:
+            tick: Период планировщика в секундах (по нему же меряется задержка event loop)
+        """
         self.start_time = time.time()
         self.last_check = time.time()
-        self.checks = {}
-    
-    def add_check(self, name: str, check_func, interval: int = 60):
+        self.checks: Dict[str, CheckState] = {}
+        self.tick = tick
+
+        # Задержка event loop, измеренная на последнем такте планировщика
+        self.loop_lag = 0.0
+        self.heartbeat = time.monotonic()
+
+        self._scheduler: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+        # Готовые ответы для /healthz и /readyz
+        self._status: Dict[str, Any] = {}
+        self._readiness_body = b""
+        self._ready = False
+        self._publish()
+
+    def add_check(self, name: str, check_func: CheckFunc, interval: float = 60,
+                  timeout: float = 5, critical: bool = True):
         """
         Добавить проверку здоровья.
-        
+
         Args:
             name: Название проверки
-            check_func: Функция проверки
+            check_func: Функция проверки (синхронная или async). Исключение или
+                False означают неуспех
             interval: Интервал проверки в секундах
+            timeout: Таймаут одного запуска в секундах
+            critical: Влияет ли проверка на готовность (/readyz)
         """
-        self.checks[name] = {
-            'func': check_func,
-            'interval': interval,
-            'last_run': 0,
-            'status': 'unknown',
-            'error': None
-        }
+        self.checks[name] = CheckState(
+            name=name, func=check_func, interval=interval, timeout=timeout, critical=critical
+        )
+        self._publish()
         logger.info(f"Added health check: {name}")
-    
-    async def run_checks(self) -> Dict[str, Any]:
+
+    async def run_checks(self, force: bool = True) -> Dict[str, Any]:
         """
-        Запустить все проверки здоровья.
-        
+        Запустить проверки параллельно и дождаться результатов.
+
+        Args:
+            force: Запускать все проверки, а не только те, у которых подошел интервал
+
         Returns:
             Словарь с результатами проверок
         """
+        now = time.monotonic()
+        due = [check for check in self.checks.values() if force or now >= check.next_run]
+        await asyncio.gather(*(self._run_check(check) for check in due))
+        return self.get_status()
+
+    async def _run_check(self, check: CheckState) -> None:
+        """Выполнить одну проверку с таймаутом и сохранить результат."""
+        started = time.monotonic()
+        check.next_run = started + check.interval
+        try:
+            if asyncio.iscoroutinefunction(check.func):
+                result = await asyncio.wait_for(check.func(), timeout=check.timeout)
+            else:
+                # Синхронные проверки могут блокировать - выполняем в потоке
+                loop = asyncio.get_running_loop()
+                result = await asyncio.wait_for(loop.run_in_executor(None, check.func), timeout=check.timeout)
+
+            if result is False:
+                raise RuntimeError("check returned False")
+
+            if check.status != "healthy":
+                logger.info(f"Health check {check.name} is healthy")
+            check.status = "healthy"
+            check.error = None
+
+        except asyncio.TimeoutError:
+            self._mark_failed(check, f"timeout after {check.timeout}s")
+        except Exception as e:
+            self._mark_failed(check, str(e) or type(e).__name__)
+
+        check.duration = time.monotonic() - started
+        check.last_run = time.time()
+        check_seconds.labels(check.name).observe(check.duration)
+        check_status.labels(check.name).set(1 if check.status == "healthy" else 0)
+        self.last_check = check.last_run
+        self._publish()
+
+    def _mark_failed(self, check: CheckState, error: str) -> None:
+        """Отметить проверку неуспешной (в лог пишем только смену статуса)."""
+        if check.status != "unhealthy" or check.error != error:
+            logger.error(f"Health check {check.name} failed: {error}")
+        check.status = "unhealthy"
+        check.error = error
+
+    async def start(self) -> None:
+        """Запустить фоновый планировщик проверок."""
+        if self._scheduler is None:
+            self._scheduler = asyncio.create_task(self._schedule())
+            logger.info(f"Health check scheduler started: {len(self.checks)} checks")
+
+    async def stop(self) -> None:
+        """Остановить планировщик и выполняющиеся проверки."""
+        tasks = list(self._running)
+        if self._scheduler is not None:
+            tasks.append(self._scheduler)
+            self._scheduler = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _schedule(self) -> None:
+        """Такт планировщика: замер задержки loop и запуск проверок, у которых подошел срок."""
+        running_checks: Set[str] = set()
+
+        def finished(name: str, task: asyncio.Task) -> None:
+            running_checks.discard(name)
+            self._running.discard(task)
+
+        while True:
+            expected = time.monotonic() + self.tick
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            self.loop_lag = max(now - expected, 0.0)
+            self.heartbeat = now
+
+            for check in self.checks.values():
+                # Медленная проверка не задерживает остальные и не запускается повторно
+                if now < check.next_run or check.name in running_checks:
+                    continue
+                running_checks.add(check.name)
+                task = asyncio.create_task(self._run_check(check))
+                self._running.add(task)
+                task.add_done_callback(partial(finished, check.name))
+
+    def _publish(self) -> None:
+        """Пересобрать готовые ответы после изменения результатов."""
         current_time = time.time()
-        results = {
-            'status': 'healthy',
+        checks = {
+            name: {
+                'status': check.status,
+                'error': check.error,
+                'last_run': check.last_run,
+                'duration': round(check.duration, 4),
+                'critical': check.critical
+            }
+            for name, check in self.checks.items()
+        }
+        self._ready = all(
+            check.status == "healthy" for check in self.checks.values() if check.critical
+        )
+        unhealthy = any(check.status == "unhealthy" for check in self.checks.values())
+        self._status = {
+            'status': 'unhealthy' if unhealthy else 'healthy',
+            'ready': self._ready,
             'uptime': current_time - self.start_time,
             'timestamp': current_time,
-            'checks': {}
+            'last_check': self.last_check,
+            'checks': checks
         }
-        
-        for name, check in self.checks.items():
-            # Проверяем, нужно ли запускать проверку
-            if current_time - check['last_run'] >= check['interval']:
-                try:
-                    if asyncio.iscoroutinefunction(check['func']):
-                        await check['func']()
-                    else:
-                        check['func']()
-                    
-                    check['status'] = 'healthy'
-                    check['error'] = None
-                    logger.debug(f"Health check {name} passed")
-                    
-                except Exception as e:
-                    check['status'] = 'unhealthy'
-                    check['error'] = str(e)
-                    results['status'] = 'unhealthy'
-                    logger.error(f"Health check {name} failed: {e}")
-                
-                check['last_run'] = current_time
-            
-            results['checks'][name] = {
-                'status': check['status'],
-                'error': check['error'],
-                'last_run': check['last_run']
-            }
-        
-        self.last_check = current_time
-        return results
-    
+        self._readiness_body = json.dumps(self._status, ensure_ascii=False).encode("utf-8")
+
     def get_status(self) -> Dict[str, Any]:
         """
-        Получить текущий статус здоровья.
-        
+        Получить текущий статус здоровья (последние результаты, без запуска проверок).
+
         Returns:
             Словарь с текущим статусом
         """
-        current_time = time.time()
-        return {
-            'status': 'healthy',
-            'uptime': current_time - self.start_time,
-            'timestamp': current_time,
-            'last_check': self.last_check,
-            'checks': {
-                name: {
-                    'status': check['status'],
-                    'error': check['error'],
-                    'last_run': check['last_run']
-                }
-                for name, check in self.checks.items()
-            }
-        }
+        return self._status
+
+    def is_alive(self) -> bool:
+        """Жив ли процесс: планировщик (если запущен) недавно просыпался."""
+        if self._scheduler is None:
+            return True
+        return time.monotonic() - self.heartbeat < config.HEALTH_LIVENESS_TIMEOUT
+
+    async def handle_liveness(self, request: web.Request) -> web.Response:
+        """GET /healthz - 200, если event loop отвечает, иначе 503."""
+        if self.is_alive():
+            return web.Response(text="ok")
+        return web.Response(status=503, text="event loop stalled")
+
+    async def handle_readiness(self, request: web.Request) -> web.Response:
+        """GET /readyz - 200 с результатами проверок, если все критичные успешны, иначе 503."""
+        return web.Response(
+            status=200 if self._ready else 503,
+            body=self._readiness_body,
+            content_type="application/json"
+        )
+
+    def add_routes(self, server) -> None:
+        """
+        Подключить /healthz и /readyz к служебному HTTP серверу.
+
+        Args:
+            server: OpsServer
+        """
+        server.add_route("GET", "/healthz", self.handle_liveness)
+        server.add_route("GET", "/readyz", self.handle_readiness)
 
 
 # Глобальный экземпляр health check
 health_check = HealthCheck()
 
 
-def check_telegram_connection():
-    """Проверка подключения к Telegram API."""
-    # Простая проверка - можно расширить
+async def check_telegram_connection(bot) -> bool:
+    """Проверка подключения к Telegram API (getMe)."""
+    await bot.get_me()
     return True
 
 
-def check_openrouter_connection():
-    """Проверка подключения к OpenRouter API."""
-    # Простая проверка - можно расширить
+async def check_openrouter_connection() -> bool:
+    """Проверка подключения к OpenRouter API (HEAD запрос к списку моделей)."""
+    from src.services.llm_service import llm_service
+
+    url = str(llm_service.client.base_url).rstrip("/") + "/models"
+    headers = {"Authorization": f"Bearer {llm_service.keys.select().secret}"}
+    async with aiohttp.ClientSession() as session:
+        async with session.head(url, headers=headers) as response:
+            if response.status in (401, 403):
+                raise RuntimeError(f"OpenRouter rejected API key: HTTP {response.status}")
+            if response.status >= 500:
+                raise RuntimeError(f"OpenRouter unavailable: HTTP {response.status}")
     return True
 
 
-def check_cache_access():
-    """Проверка доступа к кэшу."""
+async def check_cache_access() -> bool:
+    """Проверка доступа к кэшу: запись и чтение в хранилище и в папке кэша."""
+    from src.services.cache_service import cache_service
+
+    probe_key = f"__health_check_{os.getpid()}"
+    probe_value = {'timestamp': int(time.time())}
+
+    # Хранилище ответов (словарь или общий прокси между процессами) - в event loop,
+    # чтобы не менять словарь параллельно с его обходом
+    cache_service.cache[probe_key] = probe_value
     try:
-        import os
-        cache_dir = "data/cache"
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir, exist_ok=True)
-        return True
-    except Exception:
-        return False
+        if cache_service.cache.get(probe_key) != probe_value:
+            raise RuntimeError("cache store returned a different value")
+    finally:
+        cache_service.cache.pop(probe_key, None)
+
+    # Файловая система папки кэша - в потоке
+    probe_file = cache_service.cache_dir / f".health_{os.getpid()}"
+    expected = str(probe_value['timestamp'])
+
+    def round_trip() -> str:
+        try:
+            # Папку создает фоновая загрузка кэша - она могла еще не дойти до этого
+            probe_file.parent.mkdir(parents=True, exist_ok=True)
+            probe_file.write_text(expected, encoding="utf-8")
+            return probe_file.read_text(encoding="utf-8")
+        finally:
+            probe_file.unlink(missing_ok=True)
+
+    if await asyncio.get_running_loop().run_in_executor(None, round_trip) != expected:
+        raise RuntimeError("cache directory returned a different value")
+    return True
+
+
+async def check_event_loop_lag() -> bool:
+    """Проверка задержки event loop (измеряется тактами планировщика)."""
+    if health_check.loop_lag > config.HEALTH_MAX_LOOP_LAG:
+        raise RuntimeError(f"Event loop lag {health_check.loop_lag:.3f}s")
+    return True
 
 
 def check_memory_usage():
@@ -148,12 +336,25 @@ def check_memory_usage():
 
 
 # Инициализация стандартных проверок
-def init_health_checks():
-    """Инициализация стандартных проверок здоровья."""
-    health_check.add_check('telegram_connection', check_telegram_connection, 300)  # 5 минут
-    health_check.add_check('openrouter_connection', check_openrouter_connection, 300)  # 5 минут
-    health_check.add_check('cache_access', check_cache_access, 600)  # 10 минут
-    health_check.add_check('memory_usage', check_memory_usage, 300)  # 5 минут
+def init_health_checks(bot=None):
+    """
+    Инициализация стандартных проверок здоровья.
+
+    Args:
+        bot: Экземпляр бота для проверки Telegram API (без него проверка не добавляется)
+    """
+    interval = config.HEALTH_CHECK_INTERVAL
+    timeout = config.HEALTH_CHECK_TIMEOUT
+
+    # Внешние API проверяем реже, чтобы не расходовать их лимиты
+    if bot is not None:
+        health_check.add_check('telegram_connection', partial(check_telegram_connection, bot),
+                               interval * 2, timeout)
+    health_check.add_check('openrouter_connection', check_openrouter_connection, interval * 2, timeout)
+    health_check.add_check('cache_access', check_cache_access, interval, timeout)
+    # Проверка сама по себе дешевая: читает значение, замеренное планировщиком
+    health_check.add_check('event_loop_lag', check_event_loop_lag, health_check.tick, timeout)
+    health_check.add_check('memory_usage', check_memory_usage, interval, timeout, critical=False)
     logger.info("Health checks initialized")
 
 
@@ -0,0 +1,225 @@
+"""
+Настроенные пулы HTTP соединений для OpenRouter (httpx) и Telegram (aiohttp).
+
+Размер пула, время жизни простаивающего соединения и HTTP/2 задаются
+конфигурацией (HTTP_MAX_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY, HTTP2). Для
+каждого пула считаются запросы и новые соединения (TCP и TLS рукопожатия):
+по метрикам http_* видно, открывает ли горячий путь новые соединения.
+
+ConnectionKeeper открывает соединения заранее при запуске и, пока запросов
+нет, раз в HTTP_KEEPALIVE_PING секунд делает легкий запрос, чтобы пул не
+остывал в тихие периоды.
+
+HTTP/2 для httpx требует пакет h2 (pip install ".[http2]"); без него
+настройка HTTP2 игнорируется.
+"""
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import ClientSession, TraceConfig
+
+from src.utils.config import config
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    # h2 не установлен - httpx работает только по HTTP/1.1
+    H2_AVAILABLE = False
+
+# httpx импортируется вместе с openai при создании клиента
+if TYPE_CHECKING:
+    import httpx
+
+http_requests = metrics.counter("http_requests_total", "HTTP запросы по пулам соединений", ("client",))
+http_connections = metrics.counter("http_connections_opened_total", "Новые TCP соединения по пулам", ("client",))
+http_handshakes = metrics.counter("http_tls_handshakes_total", "TLS рукопожатия по пулам", ("client",))
+http_reuse = metrics.gauge("http_connection_reuse_ratio", "Доля запросов по уже открытым соединениям", ("client",))
+
+
+class ConnectionStats:
+    """Счетчики запросов и новых соединений одного пула."""
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: Имя пула (метка client в метриках)
+        """
+        self.name = name
+        self.requests = http_requests.labels(name)
+        self.connections = http_connections.labels(name)
+        self.handshakes = http_handshakes.labels(name)
+        self.last_used = time.monotonic()
+        http_reuse.labels(name).set_function(self.reuse_ratio)
+
+    def reuse_ratio(self) -> float:
+        """Доля запросов без нового соединения."""
+        requests = self.requests.get()
+        if not requests:
+            return 1.0
+        return max(0.0, 1.0 - self.connections.get() / requests)
+
+    def on_request(self) -> None:
+        """Учитывает запрос."""
+        self.requests.inc()
+        self.last_used = time.monotonic()
+
+    async def httpx_trace(self, event: str, info: Dict[str, Any]) -> None:
+        """Трассировка httpcore: события установки соединения."""
+        if event == "connection.connect_tcp.complete":
+            self.connections.inc()
+        elif event == "connection.start_tls.complete":
+            self.handshakes.inc()
+
+    def aiohttp_trace_config(self) -> TraceConfig:
+        """TraceConfig aiohttp со счетчиками запросов и соединений."""
+        trace_config = TraceConfig()
+
+        async def on_request_start(session, context, params) -> None:
+            self.on_request()
+
+        async def on_connection_create_end(session, context, params) -> None:
+            self.connections.inc()
+            # Telegram Bot API работает только по HTTPS
+            self.handshakes.inc()
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        return trace_config
+
+
+def create_http_client(name: str) -> "httpx.AsyncClient":
+    """
+    httpx клиент с настроенным пулом и счетчиками соединений.
+
+    Args:
+        name: Имя пула для метрик
+
+    Returns:
+        Клиент для AsyncOpenAI(http_client=...); статистика - в атрибуте stats
+    """
+    import httpx
+    from openai import DefaultAsyncHttpxClient
+
+    stats = ConnectionStats(name)
+
+    async def on_request(request: "httpx.Request") -> None:
+        stats.on_request()
+        request.extensions["trace"] = stats.httpx_trace
+
+    client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        http2=config.HTTP2 and H2_AVAILABLE,
+        event_hooks={"request": [on_request]},
+    )
+    client.stats = stats
+    return client
+
+
+class PooledAiohttpSession(AiohttpSession):
+    """
+    Сессия aiogram с настроенным пулом соединений и счетчиками соединений.
+
+    Публичных настроек коннектора и trace_configs у AiohttpSession нет:
+    keepalive_timeout дописывается в параметры коннектора до создания сессии
+    (единственное обращение к внутреннему _connector_init), а трассировка
+    добавляется в сессию, созданную самим aiogram. Поэтому версия aiogram
+    ограничена проверенным диапазоном (pyproject.toml, requirements.txt).
+    """
+
+    def __init__(self, name: str = "telegram", **kwargs):
+        """
+        Args:
+            name: Имя пула для метрик
+            **kwargs: Параметры AiohttpSession
+        """
+        if config.TELEGRAM_API_URL and "api" not in kwargs:
+            kwargs["api"] = TelegramAPIServer.from_base(config.TELEGRAM_API_URL)
+        super().__init__(limit=config.HTTP_MAX_CONNECTIONS, **kwargs)
+        self._connector_init["keepalive_timeout"] = config.HTTP_KEEPALIVE_EXPIRY
+        self.stats = ConnectionStats(name)
+        self._trace_config = self.stats.aiohttp_trace_config()
+        self._trace_config.freeze()
+
+    async def create_session(self) -> ClientSession:
+        """Сессия aiohttp от AiohttpSession с трассировкой соединений."""
+        session = await super().create_session()
+        # aiogram пересоздает сессию при смене прокси - трассировку подключаем к каждой
+        if self._trace_config not in session.trace_configs:
+            session.trace_configs.append(self._trace_config)
+        return session
+
+
+class ConnectionKeeper:
+    """Прогрев пула при запуске и легкие запросы в тихие периоды."""
+
+    def __init__(self, stats: ConnectionStats, ping: Callable[[], Awaitable[Any]],
+                 connections: Optional[int] = None, interval: Optional[float] = None):
+        """
+        Args:
+            stats: Статистика пула (время последнего запроса)
+            ping: Легкий запрос через пул
+            connections: Сколько соединений держать открытыми
+            interval: Простой, после которого делается ping, секунды
+        """
+        self.stats = stats
+        self.ping = ping
+        self.connections = config.HTTP_PREWARM_CONNECTIONS if connections is None else connections
+        self.interval = config.HTTP_KEEPALIVE_PING if interval is None else interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def prewarm(self) -> None:
+        """Открывает соединения параллельными запросами."""
+        if self.connections <= 0:
+            return
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self.ping() for _ in range(self.connections)), return_exceptions=True)
+        failed = [result for result in results if isinstance(result, Exception)]
+        if failed:
+            logger.warning(f"Prewarm of {self.stats.name} pool: {len(failed)} failed, last error: {failed[-1]}")
+        logger.info(
+            f"Prewarmed {self.stats.name} pool: {self.connections - len(failed)} connections "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+
+    def start(self) -> None:
+        """Запускает в фоне прогрев и поддержание соединений."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        """Прогрев, затем ping после каждого простоя длиной interval."""
+        await self.prewarm()
+        if self.interval <= 0:
+            return
+        while True:
+            idle = time.monotonic() - self.stats.last_used
+            if idle < self.interval:
+                await asyncio.sleep(self.interval - idle)
+                continue
+            results = await asyncio.gather(
+                *(self.ping() for _ in range(max(1, self.connections))), return_exceptions=True
+            )
+            errors = [result for result in results if isinstance(result, Exception)]
+            if errors:
+                logger.debug(f"Keep-alive ping of {self.stats.name} pool failed: {errors[-1]}")
+            # Следующий ping - через полный интервал, даже если этот не удался
+            self.stats.last_used = time.monotonic()
@@ -1,24 +1,35 @@
 """Скрипт для инициализации структуры данных"""
-import os
 import json
 from pathlib import Path
 
+DEFAULT_CACHE_DIR = Path("data") / "cache"
+CACHE_FILE_NAME = "llm_cache.json"
+
+
+def init_data_structure(cache_dir: Path = DEFAULT_CACHE_DIR) -> bool:
+    """
+    Создает папку кэша и пустой файл кэша, если их нет.
+
+    Args:
+        cache_dir: Папка кэша
+
+    Returns:
+        True, если файл кэша был создан
+    """
+    cache_dir = Path(cache_dir)
 
-def init_data_structure():
-    """Создает структуру данных если она не существует"""
-    data_dir = Path("data")
-    cache_dir = data_dir / "cache"
-    
     # Создаем папки если их нет
     cache_dir.mkdir(parents=True, exist_ok=True)
-    
+
     # Создаем пустой кэш если его нет
-    cache_file = cache_dir / "llm_cache.json"
-    if not cache_file.exists():
-        with open(cache_file, "w", encoding="utf-8") as f:
-            json.dump({}, f, ensure_ascii=False, indent=2)
-        print("Создан пустой файл кэша")
+    cache_file = cache_dir / CACHE_FILE_NAME
+    if cache_file.exists():
+        return False
+    with open(cache_file, "w", encoding="utf-8") as f:
+        json.dump({}, f, ensure_ascii=False, indent=2)
+    return True
 
 
 if __name__ == "__main__":
-    init_data_structure()
+    if init_data_structure():
+        print("Создан пустой файл кэша")
@@ -1,31 +1,226 @@
 """
 Настройка логирования для приложения.
+
+Запись в поток вывода вынесена в фоновый поток: обработчики на event loop
+только кладут запись в очередь (QueueHandler), а QueueListener форматирует и
+пишет ее. Перед постановкой в очередь записи проходят фильтр: сэмплирование
+и ограничение частоты по типу события (extra={"event": ...}) и обрезка
+больших полезных нагрузок.
 """
 
+import atexit
+import json
 import logging
+import queue
+import random
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List
+
 from src.utils.config import config
 
+# Стандартные атрибуты LogRecord - все остальное считается extra полями
+_RESERVED_ATTRS = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+
+# Поля extra, которые обрезаются до LOG_MAX_FIELD_LENGTH
+PAYLOAD_FIELDS = ("payload",)
+
+_listeners: List[QueueListener] = []
+
+
+def parse_event_rates(value: str) -> Dict[str, float]:
+    """
+    Разобрать настройку вида "event=0.1,other=5".
+
+    Args:
+        value: Строка из переменной окружения
+
+    Returns:
+        Словарь событие -> значение
+    """
+    rates = {}
+    for part in value.split(","):
+        if "=" not in part:
+            continue
+        event, rate = part.split("=", 1)
+        try:
+            rates[event.strip()] = float(rate)
+        except ValueError:
+            continue
+    return rates
+
+
+def truncate_field(value: str, max_length: int) -> str:
+    """Обрезать строку, указав сколько символов отброшено."""
+    if len(value) <= max_length:
+        return value
+    return f"{value[:max_length]}... [+{len(value) - max_length} chars]"
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Сэмплирование и ограничение частоты записей по типу события, обрезка полезной нагрузки.
+
+    Записи уровня WARNING и выше не сэмплируются и не ограничиваются.
+    """
+
+    def __init__(self, sample_rates: Dict[str, float] = None,
+                 rate_limits: Dict[str, float] = None, max_length: int = 500):
+        """
+        Args:
+            sample_rates: Доля сохраняемых записей по событию (0..1)
+            rate_limits: Максимум записей в секунду по событию
+            max_length: Максимальная длина сообщения и полей полезной нагрузки
+        """
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.rate_limits = rate_limits or {}
+        self.max_length = max_length
+        # Окна ограничения частоты: событие -> [начало секунды, записано, подавлено]
+        self._windows: Dict[str, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+
+        if event is not None and record.levelno < logging.WARNING:
+            rate = self.sample_rates.get(event)
+            if rate is not None and random.random() >= rate:
+                return False
+
+            limit = self.rate_limits.get(event)
+            if limit is not None and not self._allow(event, limit, record):
+                return False
+
+        # Подставляем аргументы сразу: объекты могут измениться до записи
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if isinstance(record.msg, str) and len(record.msg) > self.max_length:
+            record.msg = truncate_field(record.msg, self.max_length)
+
+        for field in PAYLOAD_FIELDS:
+            value = record.__dict__.get(field)
+            if isinstance(value, str) and len(value) > self.max_length:
+                record.__dict__[field] = truncate_field(value, self.max_length)
+
+        return True
+
+    def _allow(self, event: str, limit: float, record: logging.LogRecord) -> bool:
+        """Окно в одну секунду: пропускает не больше limit записей события."""
+        now = int(time.monotonic())
+        window = self._windows.get(event)
+        if window is None or window[0] != now:
+            suppressed = window[2] if window else 0
+            window = [now, 0, 0]
+            self._windows[event] = window
+            if suppressed:
+                # Сообщаем, сколько записей было подавлено в прошлом окне
+                record.suppressed = suppressed
+
+        if window[1] >= limit:
+            window[2] += 1
+            return False
+
+        window[1] += 1
+        return True
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, object]:
+    """Extra поля записи (все, что не стандартные атрибуты LogRecord)."""
+    return {
+        key: value for key, value in record.__dict__.items()
+        if key not in _RESERVED_ATTRS and not key.startswith("_")
+    }
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись в одну строку JSON с extra полями."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        data.update(_extra_fields(record))
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Текстовый формат из LOG_FORMAT с extra полями в конце строки."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = _extra_fields(record)
+        if extra:
+            line += " | " + " ".join(f"{key}={value}" for key, value in extra.items())
+        return line
+
+
+class _PassthroughQueueHandler(QueueHandler):
+    """QueueHandler, который не форматирует запись в потоке вызова."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        # Traceback форматируем здесь: объекты исключения не должны жить в очереди
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
 
 def setup_logger(name: str = "anime_bot") -> logging.Logger:
-    """Настраивает и возвращает логгер."""
+    """
+    Настраивает и возвращает логгер. Повторный вызов не добавляет обработчиков.
+    """
     logger = logging.getLogger(name)
-    
-    # Устанавливаем уровень логирования
-    logger.setLevel(getattr(logging, config.LOG_LEVEL.upper()))
-    
-    # Создаем обработчик для вывода в консоль
-    handler = logging.StreamHandler()
-    handler.setLevel(getattr(logging, config.LOG_LEVEL.upper()))
-    
-    # Создаем форматтер
-    formatter = logging.Formatter(config.LOG_FORMAT)
-    handler.setFormatter(formatter)
-    
-    # Добавляем обработчик к логгеру
-    logger.addHandler(handler)
-    
+    if getattr(logger, "_queue_configured", False):
+        return logger
+
+    level = getattr(logging, config.LOG_LEVEL.upper())
+    logger.setLevel(level)
+    logger.propagate = False
+
+    # Обработчик, который реально пишет в консоль - работает в фоновом потоке
+    stream_handler = logging.StreamHandler()
+    stream_handler.setLevel(level)
+    if config.LOG_JSON:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(TextFormatter(config.LOG_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _PassthroughQueueHandler(log_queue)
+    queue_handler.setLevel(level)
+    queue_handler.addFilter(SamplingFilter(
+        sample_rates=parse_event_rates(config.LOG_SAMPLING),
+        rate_limits=parse_event_rates(config.LOG_RATE_LIMITS),
+        max_length=config.LOG_MAX_FIELD_LENGTH
+    ))
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    if not _listeners:
+        atexit.register(stop_logging)
+    _listeners.append(listener)
+
+    logger._queue_configured = True
     return logger
 
 
+def stop_logging() -> None:
+    """Дописать очереди логов и остановить фоновые потоки."""
+    while _listeners:
+        _listeners.pop().stop()
+
+
 # Глобальный логгер
 logger = setup_logger()
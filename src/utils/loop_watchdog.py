@@ -0,0 +1,135 @@
+"""
+Сторож event loop: непрерывный замер задержки и стеки блокирующих вызовов.
+
+Корутина-пульс засыпает на короткий интервал и меряет, насколько позже
+срока проснулась - это задержка планирования, она пишется в гистограмму.
+Вспомогательный поток следит за временем последнего пульса: если loop не
+отвечает дольше порога, поток снимает стек главного потока (sys._current_frames),
+то есть видит именно тот вызов, который сейчас блокирует loop, и пишет его в лог.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from src.utils.config import config
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+# Сколько последних зависаний хранить для диагностики
+MAX_RECENT_STALLS = 20
+
+loop_lag_seconds = metrics.histogram(
+    "event_loop_lag_seconds", "Задержка планирования event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+loop_stalls = metrics.counter("event_loop_stalls_total", "Зависания event loop дольше порога")
+
+
+class LoopWatchdog:
+    """Замер задержки event loop и захват стека при зависании."""
+
+    def __init__(self, interval: float = None, threshold: float = None):
+        """
+        Args:
+            interval: Период пульса в секундах
+            threshold: Задержка, после которой снимается стек (секунды)
+        """
+        self.interval = interval or config.LOOP_WATCHDOG_INTERVAL
+        self.threshold = threshold or config.LOOP_LAG_THRESHOLD
+        self.recent_stalls: Deque[Dict[str, Any]] = deque(maxlen=MAX_RECENT_STALLS)
+
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._pulse: Optional[asyncio.Task] = None
+        self._monitor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    async def start(self) -> None:
+        """Запустить пульс в текущем event loop и поток-наблюдатель."""
+        if self._pulse is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._pulse = asyncio.create_task(self._beat())
+        self._monitor = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._monitor.start()
+        logger.info(f"Loop watchdog started: interval {self.interval}s, threshold {self.threshold}s")
+
+    async def stop(self) -> None:
+        """Остановить пульс и поток-наблюдатель."""
+        self._stop.set()
+        if self._pulse is not None:
+            self._pulse.cancel()
+            await asyncio.gather(self._pulse, return_exceptions=True)
+            self._pulse = None
+        if self._monitor is not None:
+            self._monitor.join(timeout=1)
+            self._monitor = None
+
+    async def _beat(self) -> None:
+        """Пульс: меряет, насколько позже срока просыпается корутина."""
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            loop_lag_seconds.observe(max(now - expected, 0.0))
+            self._last_beat = now
+
+    def _watch(self) -> None:
+        """Поток-наблюдатель: снимает стек loop, если пульс пропал дольше порога."""
+        stalled_since: Optional[float] = None
+        while not self._stop.wait(self.interval / 2):
+            last_beat = self._last_beat
+            silence = time.monotonic() - last_beat - self.interval
+
+            if silence <= self.threshold:
+                if stalled_since is not None:
+                    self._finish_stall(stalled_since, last_beat)
+                    stalled_since = None
+                continue
+
+            # Стек снимаем один раз на зависание - в момент, когда оно заметно
+            if stalled_since is None:
+                stalled_since = last_beat
+                self._capture_stall(silence)
+
+    def _capture_stall(self, silence: float) -> None:
+        """Снять стек главного потока и сохранить зависание."""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+        stall = {
+            "detected_at": time.time(),
+            "lag_at_capture": round(silence, 3),
+            "duration": None,
+            "stack": stack,
+        }
+        self.recent_stalls.append(stall)
+        loop_stalls.inc()
+        logger.warning(
+            f"Event loop blocked for {silence:.3f}s",
+            extra={"event": "loop_stall", "lag": round(silence, 3), "stack": stack}
+        )
+
+    def _finish_stall(self, stalled_since: float, last_beat: float) -> None:
+        """Записать полную длительность закончившегося зависания."""
+        duration = max(last_beat - stalled_since - self.interval, 0.0)
+        if self.recent_stalls:
+            self.recent_stalls[-1]["duration"] = round(duration, 3)
+        logger.warning(
+            f"Event loop recovered after {duration:.3f}s",
+            extra={"event": "loop_stall_end", "lag": round(duration, 3)}
+        )
+
+    def get_recent_stalls(self) -> List[Dict[str, Any]]:
+        """Последние зависания (новые в конце)."""
+        return list(self.recent_stalls)
+
+
+# Глобальный сторож event loop
+loop_watchdog = LoopWatchdog()
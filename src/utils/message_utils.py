@@ -2,12 +2,30 @@
 Утилиты для работы с сообщениями Telegram.
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, NamedTuple, Union
 
 # Максимальная длина сообщения Telegram
 MAX_MESSAGE_LENGTH = 4096
 
 
+class AnimeItem(NamedTuple):
+    """Компактная неизменяемая запись об аниме для списков и пагинации."""
+    title: str = "Неизвестное аниме"
+    year: Any = ""
+    rating: Any = ""
+    description: str = ""
+    
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> "AnimeItem":
+        """Создать запись из словаря с полями title/year/rating/description."""
+        return cls(
+            title=item.get("title", "Неизвестное аниме"),
+            year=item.get("year", ""),
+            rating=item.get("rating", ""),
+            description=item.get("description", "")
+        )
+
+
 def truncate_message(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> str:
     """
     Обрезать сообщение до максимальной длины, сохраняя целостность предложений.
@@ -33,7 +51,45 @@ def truncate_message(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> str:
     return truncated
 
 
-def format_anime_list(anime_items: List[Dict[str, Any]], category: str = "anime") -> str:
+# Эмодзи для категорий
+CATEGORY_EMOJIS = {
+    "top": "🔥",
+    "new": "🆕",
+    "classic": "👑",
+    "anime": "📺"
+}
+
+
+def format_anime_item(index: int, item: Union[AnimeItem, Dict[str, Any]]) -> str:
+    """
+    Форматировать одну позицию списка аниме.
+    
+    Args:
+        index: Порядковый номер в списке
+        item: Информация об аниме (AnimeItem или словарь)
+        
+    Returns:
+        Отформатированный блок текста
+    """
+    if isinstance(item, dict):
+        item = AnimeItem.from_dict(item)
+    title, year, rating, description = item
+    
+    anime_line = f"{index}. 🏆 {title}"
+    if year:
+        anime_line += f" ({year})"
+    anime_line += "\n"
+    
+    if rating:
+        anime_line += f"   ⭐ {rating}\n"
+    
+    if description:
+        anime_line += f"   📝 {description}\n"
+    
+    return anime_line + "\n"
+
+
+def format_anime_list(anime_items: List[Union[AnimeItem, Dict[str, Any]]], category: str = "anime") -> str:
     """
     Форматировать список аниме в красивом виде.
     
@@ -47,41 +103,38 @@ def format_anime_list(anime_items: List[Dict[str, Any]], category: str = "anime"
     if not anime_items:
         return "Хм... Ничего не нашел."
     
-    # Эмодзи для категорий
-    category_emojis = {
-        "top": "🔥",
-        "new": "🆕", 
-        "classic": "👑",
-        "anime": "📺"
-    }
-    
-    emoji = category_emojis.get(category, "📺")
+    emoji = CATEGORY_EMOJIS.get(category, "📺")
     
     # Формируем заголовок
-    result = f"{emoji} Рекомендации:\n\n"
+    parts = [f"{emoji} Рекомендации:\n\n"]
+    parts.extend(format_anime_item(i, item) for i, item in enumerate(anime_items, 1))
     
-    for i, item in enumerate(anime_items, 1):
-        title = item.get("title", "Неизвестное аниме")
-        year = item.get("year", "")
-        rating = item.get("rating", "")
-        description = item.get("description", "")
-        
-        # Форматируем каждое аниме
-        anime_line = f"{i}. 🏆 {title}"
-        if year:
-            anime_line += f" ({year})"
-        anime_line += "\n"
-        
-        if rating:
-            anime_line += f"   ⭐ {rating}\n"
-        
-        if description:
-            anime_line += f"   📝 {description}\n"
+    return "".join(parts)
+
+
+def format_anime_page(anime_items: List[Union[AnimeItem, Dict[str, Any]]], current_page: int,
+                      total_pages: int, category: str = "anime") -> str:
+    """
+    Форматировать одну страницу пагинированного списка аниме.
+    
+    Args:
+        anime_items: Элементы текущей страницы
+        current_page: Номер страницы
+        total_pages: Общее количество страниц
+        category: Категория аниме (top, new, classic)
         
-        anime_line += "\n"
-        result += anime_line
+    Returns:
+        Отформатированный текст страницы
+    """
+    if not anime_items:
+        return "Хм... Ничего не нашел."
+    
+    emoji = CATEGORY_EMOJIS.get(category, "📺")
+    
+    parts = [f"{emoji} Рекомендации (страница {current_page} из {total_pages}):\n\n"]
+    parts.extend(format_anime_item(i, item) for i, item in enumerate(anime_items, 1))
     
-    return result
+    return "".join(parts)
 
 
 def split_long_message(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> List[str]:
@@ -0,0 +1,431 @@
+"""
+Реестр метрик процесса: счетчики, gauge и гистограммы в стиле HDR.
+
+Метрики обновляются из event loop без блокировок, запись события стоит
+доли микросекунды. Реестр отдается в текстовом формате Prometheus
+(см. src/utils/ops_server.py).
+
+Пример:
+    requests = metrics.counter("llm_requests_total", "Запросы к LLM", ("model",))
+    requests.labels("gpt").inc()
+
+    latency = metrics.histogram("llm_request_seconds", "Время запроса к LLM")
+    with latency.time():
+        ...
+"""
+
+import math
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Границы бакетов, которые попадают в экспорт Prometheus (секунды)
+DEFAULT_EXPORT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+# Точность гистограммы: 2**SUB_BUCKET_BITS поддиапазонов на каждую степень двойки (~3%)
+SUB_BUCKET_BITS = 5
+_SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+# Значения до 2**40 единиц (~12 дней в микросекундах), большие попадают в последний бакет
+_MAX_BIT_LENGTH = 40
+_BUCKETS_COUNT = (_MAX_BIT_LENGTH - SUB_BUCKET_BITS + 1) << SUB_BUCKET_BITS
+
+
+def _format_value(value: float) -> str:
+    """Число в формате Prometheus."""
+    if value == math.inf:
+        return "+Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    """Экранирование значения метки."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    """Собрать блок меток {a="1",b="2"}."""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class CounterChild:
+    """Значение счетчика для одного набора меток."""
+
+    __slots__ = ("value", "_function")
+
+    def __init__(self):
+        self.value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Увеличить счетчик."""
+        self.value += amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Брать значение из функции при каждом чтении (для уже существующих счетчиков).
+
+        Args:
+            function: Функция без аргументов, возвращающая текущее значение
+        """
+        self._function = function
+
+    def get(self) -> float:
+        """Текущее значение."""
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception:
+                return math.nan
+        return self.value
+
+
+class GaugeChild:
+    """Значение gauge для одного набора меток."""
+
+    __slots__ = ("value", "_function")
+
+    def __init__(self):
+        self.value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        """Установить значение."""
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Увеличить значение."""
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Уменьшить значение."""
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Вычислять значение при каждом чтении (например, глубина очереди).
+
+        Args:
+            function: Функция без аргументов, возвращающая текущее значение
+        """
+        self._function = function
+
+    def get(self) -> float:
+        """Текущее значение."""
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception:
+                return math.nan
+        return self.value
+
+
+class _Timer:
+    """Контекстный менеджер, записывающий длительность блока в гистограмму."""
+
+    __slots__ = ("_histogram", "_started")
+
+    def __init__(self, histogram: "HistogramChild"):
+        self._histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._started)
+
+
+class HistogramChild:
+    """
+    Гистограмма с лог-линейными бакетами (как в HdrHistogram).
+
+    Значения хранятся в микросекундах (единицах 1e-6): каждая степень двойки
+    делится на 2**SUB_BUCKET_BITS равных поддиапазонов, поэтому относительная
+    погрешность квантилей не превышает ~3% на всем диапазоне. Запись - это
+    несколько целочисленных операций и инкремент элемента списка.
+    """
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts: List[int] = [0] * _BUCKETS_COUNT
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Записать значение.
+
+        Args:
+            value: Значение в базовых единицах (для времени - секунды)
+        """
+        units = int(value * 1_000_000)
+        if units < _SUB_BUCKET_COUNT:
+            index = units if units > 0 else 0
+        else:
+            shift = units.bit_length() - SUB_BUCKET_BITS - 1
+            index = ((shift + 1) << SUB_BUCKET_BITS) + (units >> shift) - _SUB_BUCKET_COUNT
+            if index >= _BUCKETS_COUNT:
+                index = _BUCKETS_COUNT - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def time(self) -> _Timer:
+        """Измерить длительность блока with."""
+        return _Timer(self)
+
+    @staticmethod
+    def bucket_upper_bound(index: int) -> float:
+        """Верхняя граница бакета в базовых единицах."""
+        if index < _SUB_BUCKET_COUNT:
+            return (index + 1) / 1_000_000
+        shift = (index >> SUB_BUCKET_BITS) - 1
+        mantissa = (index & (_SUB_BUCKET_COUNT - 1)) + _SUB_BUCKET_COUNT
+        return ((mantissa + 1) << shift) / 1_000_000
+
+    def quantile(self, q: float) -> float:
+        """
+        Оценка квантиля (верхняя граница бакета, в который он попадает).
+
+        Args:
+            q: Квантиль от 0 до 1
+
+        Returns:
+            Значение квантиля или 0, если значений нет
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(self.bucket_upper_bound(index), self.max)
+        return self.max
+
+    def cumulative(self, bounds: Iterable[float]) -> List[Tuple[float, int]]:
+        """
+        Накопленные количества для границ экспорта (le).
+
+        Args:
+            bounds: Возрастающие границы
+
+        Returns:
+            Список (граница, количество значений <= границы), последним идет +Inf
+        """
+        items = [(index, count) for index, count in enumerate(self.counts) if count]
+        result = []
+        position = 0
+        seen = 0
+        for bound in bounds:
+            while position < len(items) and self.bucket_upper_bound(items[position][0]) <= bound:
+                seen += items[position][1]
+                position += 1
+            result.append((bound, seen))
+        result.append((math.inf, self.count))
+        return result
+
+
+class _Metric:
+    """Базовый класс метрики с метками."""
+
+    type_name = ""
+    child_class = CounterChild
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        # Метрика без меток сразу имеет единственное значение
+        self._default = self.labels() if not self.labelnames else None
+
+    def labels(self, *values) -> object:
+        """
+        Значение метрики для набора меток (создается при первом обращении).
+
+        Args:
+            values: Значения меток в порядке labelnames
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}, получено {values}")
+            child = self.child_class()
+            self._children[values] = child
+        return child
+
+    def collect(self) -> List[str]:
+        """Строки текстового формата Prometheus для метрики."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._collect_child(tuple(str(value) for value in values), child))
+        return lines
+
+    def _collect_child(self, values: Tuple[str, ...], child) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик."""
+
+    type_name = "counter"
+    child_class = CounterChild
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Увеличить счетчик без меток."""
+        self._default.value += amount
+
+    def _collect_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+
+class Gauge(_Metric):
+    """Значение, которое может расти и уменьшаться."""
+
+    type_name = "gauge"
+    child_class = GaugeChild
+
+    def set(self, value: float) -> None:
+        """Установить значение gauge без меток."""
+        self._default.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Увеличить значение gauge без меток."""
+        self._default.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Уменьшить значение gauge без меток."""
+        self._default.value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Вычислять значение gauge без меток при каждом чтении."""
+        self._default.set_function(function)
+
+    def _collect_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+
+class Histogram(_Metric):
+    """Распределение значений (обычно длительностей в секундах)."""
+
+    type_name = "histogram"
+    child_class = HistogramChild
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_EXPORT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float) -> None:
+        """Записать значение в гистограмму без меток."""
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        """Измерить длительность блока with (гистограмма без меток)."""
+        return _Timer(self._default)
+
+    def _collect_child(self, values, child) -> List[str]:
+        lines = []
+        for bound, count in child.cumulative(self.buckets):
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса."""
+
+    def __init__(self):
+        """Инициализация пустого реестра."""
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, metric_class, name: str, documentation: str,
+                       labelnames: Tuple[str, ...], **kwargs) -> _Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = metric_class(name, documentation, tuple(labelnames), **kwargs)
+            self._metrics[name] = metric
+        elif not isinstance(metric, metric_class) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Метрика {name} уже зарегистрирована с другим типом или метками")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """Получить или создать счетчик."""
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        """Получить или создать gauge."""
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_EXPORT_BUCKETS) -> Histogram:
+        """Получить или создать гистограмму."""
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        """Найти метрику по имени."""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """
+        Все метрики в текстовом формате Prometheus.
+
+        Returns:
+            Текст для ответа на /metrics
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+class ActiveUsers:
+    """Количество уникальных пользователей за скользящее окно."""
+
+    def __init__(self, window_seconds: float = 300):
+        """
+        Args:
+            window_seconds: Окно, в котором пользователь считается активным
+        """
+        self.window_seconds = window_seconds
+        self._last_seen: Dict[int, float] = {}
+
+    def touch(self, user_id: int) -> None:
+        """Отметить активность пользователя."""
+        # Переставляем ключ в конец, чтобы словарь оставался упорядочен по времени
+        self._last_seen.pop(user_id, None)
+        self._last_seen[user_id] = time.monotonic()
+
+    def count(self) -> int:
+        """Число активных пользователей (заодно удаляет устаревших)."""
+        threshold = time.monotonic() - self.window_seconds
+        for user_id, seen_at in list(self._last_seen.items()):
+            if seen_at >= threshold:
+                break
+            del self._last_seen[user_id]
+        return len(self._last_seen)
+
+
+# Глобальный реестр метрик
+metrics = MetricsRegistry()
+
+# Общие метрики процесса
+active_users = ActiveUsers()
+metrics.gauge("bot_active_users", "Уникальные пользователи за последние 5 минут").set_function(active_users.count)
@@ -0,0 +1,100 @@
+"""
+Middleware aiogram, общие для всех роутеров бота.
+"""
+
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject, Update
+
+from src.utils.config import config
+from src.utils.deadline import deadline
+from src.utils.metrics import active_users, metrics
+from src.utils.shutdown import in_flight
+from src.utils.tracing import start_trace, tracer
+
+update_seconds = metrics.histogram(
+    "bot_update_handle_seconds", "Время обработки обновления", ("type", "outcome")
+)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Измеряет время обработки обновлений и отмечает активных пользователей."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None:
+            active_users.touch(user.id)
+
+        event_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await handler(event, data)
+            outcome = "unhandled" if result is UNHANDLED else "handled"
+            return result
+        finally:
+            update_seconds.labels(event_type, outcome).observe(time.perf_counter() - started)
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Открывает корневой span трейса на каждое обновление."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not tracer.enabled or not isinstance(event, Update):
+            return await handler(event, data)
+
+        user = data.get("event_from_user")
+        with start_trace(
+            "update",
+            update_id=event.update_id,
+            type=event.event_type,
+            user_id=user.id if user is not None else None
+        ) as span:
+            result = await handler(event, data)
+            span.set_attribute("handled", result is not UNHANDLED)
+            return result
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """Учитывает обновления в обработке, чтобы дождаться их при остановке."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        in_flight.begin(event.update_id)
+        try:
+            return await handler(event, data)
+        finally:
+            in_flight.end(event.update_id)
+
+
+class DeadlineMiddleware(BaseMiddleware):
+    """Задает дедлайн обработки обновления (UPDATE_DEADLINE_SECONDS)."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        with deadline(config.UPDATE_DEADLINE_SECONDS):
+            return await handler(event, data)
@@ -0,0 +1,69 @@
+"""
+Служебный HTTP сервер процесса: метрики и другие эндпоинты для эксплуатации.
+
+Слушает локальный порт (OPS_HOST:OPS_PORT), отдельно от webhook сервера.
+Эндпоинты других модулей подключаются через add_route.
+"""
+
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from aiohttp import web
+
+from src.utils.config import config
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+# Тип содержимого текстового формата Prometheus
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class OpsServer:
+    """aiohttp сервер служебных эндпоинтов (/metrics и др.)."""
+
+    def __init__(self, host: str = None, port: int = None):
+        """
+        Args:
+            host: Адрес для прослушивания
+            port: Порт для прослушивания
+        """
+        self.host = host or config.OPS_HOST
+        self.port = port if port is not None else config.OPS_PORT
+        self._routes: List[Tuple[str, str, Handler]] = [("GET", "/metrics", self.handle_metrics)]
+        self._runner: Optional[web.AppRunner] = None
+
+    def add_route(self, method: str, path: str, handler: Handler) -> None:
+        """
+        Добавить эндпоинт (до вызова start).
+
+        Args:
+            method: HTTP метод
+            path: Путь
+            handler: Обработчик aiohttp
+        """
+        self._routes.append((method, path, handler))
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """Отдать метрики в текстовом формате Prometheus."""
+        return web.Response(
+            body=metrics.render().encode("utf-8"),
+            headers={"Content-Type": PROMETHEUS_CONTENT_TYPE}
+        )
+
+    async def start(self) -> None:
+        """Запустить сервер."""
+        app = web.Application()
+        for method, path, handler in self._routes:
+            app.router.add_route(method, path, handler)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Ops server listening on {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        """Остановить сервер."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,290 @@
+"""
+Диагностика по запросу: сэмплирующий профилировщик CPU и снимки памяти.
+
+Профилировщик из отдельного потока периодически снимает стек потока event
+loop (sys._current_frames) и считает одинаковые стеки. Результат - collapsed
+stacks ("кадр;кадр;кадр количество"), которые читают flamegraph.pl, speedscope
+и inferno. Пока профилирование не запущено, накладных расходов нет.
+
+Снимки памяти используют tracemalloc и относят выделения к компонентам бота
+(UserStateService, PaginationService, CacheService, aiogram) по ближайшему
+кадру из их модулей. Разница со снимком предыдущего вызова показывает утечки.
+"""
+
+import asyncio
+import hmac
+import ipaddress
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from src.utils.config import config
+from src.utils.logger import logger
+
+# Компоненты для атрибуции памяти: имя -> фрагмент пути модуля
+MEMORY_COMPONENTS: Tuple[Tuple[str, str], ...] = (
+    ("UserStateService", "src/services/user_state_service.py"),
+    ("PaginationService", "src/services/pagination_service.py"),
+    ("CacheService", "src/services/cache_service.py"),
+    ("aiogram", "/aiogram/"),
+)
+OTHER_COMPONENT = "other"
+
+# Ограничения, чтобы команда не остановила бота надолго
+MAX_PROFILE_SECONDS = 120
+MIN_PROFILE_INTERVAL = 0.001
+TRACEMALLOC_FRAMES = 25
+
+# Заголовок с токеном для HTTP эндпоинтов (если задан ADMIN_TOKEN)
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+def _frame_label(code, prefix: str) -> str:
+    """
+    Подпись кадра для collapsed stacks: функция (файл:строка начала).
+
+    Args:
+        code: Объект кода кадра
+        prefix: Префикс пути, который убирается из имени файла (текущая папка)
+    """
+    filename = code.co_filename
+    if filename.startswith(prefix):
+        filename = filename[len(prefix):]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик потока event loop."""
+
+    def __init__(self):
+        """Инициализация профилировщика."""
+        self._lock = threading.Lock()
+        self.running = False
+
+    async def profile(self, seconds: float, interval: float = 0.005) -> Tuple[str, int]:
+        """
+        Профилировать поток текущего event loop.
+
+        Args:
+            seconds: Длительность профилирования
+            interval: Период снятия стека в секундах
+
+        Returns:
+            Collapsed stacks и количество снятых сэмплов
+
+        Raises:
+            RuntimeError: Если профилирование уже идет
+        """
+        seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+        interval = max(interval, MIN_PROFILE_INTERVAL)
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Профилирование уже запущено")
+
+        self.running = True
+        loop_thread_id = threading.get_ident()
+        logger.info(f"CPU profiling started for {seconds}s (interval {interval * 1000:.1f} ms)")
+        try:
+            stacks, samples = await asyncio.to_thread(self._sample, loop_thread_id, seconds, interval)
+        finally:
+            self.running = False
+            self._lock.release()
+
+        logger.info(f"CPU profiling finished: {samples} samples, {len(stacks)} unique stacks")
+        collapsed = "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+        return collapsed, samples
+
+    @staticmethod
+    def _sample(thread_id: int, seconds: float, interval: float) -> Tuple[Counter, int]:
+        """Снимать стек потока thread_id с периодом interval (выполняется в отдельном потоке)."""
+        stacks: Counter = Counter()
+        samples = 0
+        # Сэмпл снимается при удержанном GIL: подписи кадров считаются один раз
+        # на объект кода, а не для каждого кадра каждого сэмпла
+        prefix = os.getcwd() + os.sep
+        label_cache: Dict[Any, str] = {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                labels = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = label_cache.get(code)
+                    if label is None:
+                        label = label_cache[code] = _frame_label(code, prefix)
+                    labels.append(label)
+                    frame = frame.f_back
+                stacks[";".join(reversed(labels))] += 1
+                samples += 1
+            # Ссылка на кадр не должна жить между сэмплами
+            frame = None
+            time.sleep(interval)
+        return stacks, samples
+
+
+class MemoryProfiler:
+    """Снимки памяти tracemalloc с атрибуцией по компонентам бота."""
+
+    def __init__(self):
+        """Инициализация профилировщика памяти."""
+        self._previous: Optional[Dict[str, int]] = None
+
+    @property
+    def tracing(self) -> bool:
+        """Включен ли tracemalloc."""
+        return tracemalloc.is_tracing()
+
+    def start(self) -> None:
+        """Включить tracemalloc (учитываются только выделения после включения)."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._previous = None
+            logger.info(f"tracemalloc started ({TRACEMALLOC_FRAMES} frames)")
+
+    def stop(self) -> None:
+        """Выключить tracemalloc и освободить его данные."""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            self._previous = None
+            logger.info("tracemalloc stopped")
+
+    async def snapshot(self, limit: int = 10) -> Dict[str, Any]:
+        """
+        Снять снимок памяти (включает tracemalloc, если он выключен).
+
+        Args:
+            limit: Сколько крупнейших мест выделения показать по каждому компоненту
+
+        Returns:
+            Память по компонентам, рост со времени прошлого снимка и крупнейшие места выделения
+        """
+        self.start()
+        return await asyncio.to_thread(self._analyze, tracemalloc.take_snapshot(), limit)
+
+    def _analyze(self, snapshot: tracemalloc.Snapshot, limit: int) -> Dict[str, Any]:
+        """Разнести статистику снимка по компонентам."""
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+
+        components: Dict[str, int] = {name: 0 for name, _ in MEMORY_COMPONENTS}
+        components[OTHER_COMPONENT] = 0
+        top: Dict[str, List[Tuple[int, str]]] = {name: [] for name in components}
+
+        for stat in snapshot.statistics("traceback"):
+            component, location = self._attribute(stat.traceback)
+            components[component] += stat.size
+            top[component].append((stat.size, location))
+
+        growth = None
+        if self._previous is not None:
+            growth = {name: size - self._previous.get(name, 0) for name, size in components.items()}
+        self._previous = dict(components)
+
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        return {
+            "traced_bytes": traced_current,
+            "peak_bytes": traced_peak,
+            "components": components,
+            "growth_since_previous": growth,
+            "top": {
+                name: [
+                    {"bytes": size, "location": location}
+                    for size, location in sorted(entries, reverse=True)[:limit]
+                ]
+                for name, entries in top.items()
+            },
+        }
+
+    @staticmethod
+    def _attribute(traceback: tracemalloc.Traceback) -> Tuple[str, str]:
+        """Компонент выделения - по ближайшему к месту выделения кадру его модуля."""
+        for frame in reversed(traceback):
+            filename = frame.filename.replace("\\", "/")
+            for name, fragment in MEMORY_COMPONENTS:
+                if fragment in filename:
+                    return name, f"{filename}:{frame.lineno}"
+        frame = traceback[-1]
+        return OTHER_COMPONENT, f"{frame.filename}:{frame.lineno}"
+
+
+def format_memory_report(report: Dict[str, Any]) -> str:
+    """Краткий текстовый отчет по снимку памяти."""
+    def mib(size: int) -> str:
+        return f"{size / 1024 / 1024:.2f}"
+
+    lines = [
+        f"tracemalloc: {mib(report['traced_bytes'])} MiB (пик {mib(report['peak_bytes'])} MiB)",
+        "",
+    ]
+    growth = report["growth_since_previous"]
+    for name, size in sorted(report["components"].items(), key=lambda item: -item[1]):
+        line = f"{name}: {mib(size)} MiB"
+        if growth is not None:
+            line += f" (рост {growth[name] / 1024 / 1024:+.2f} MiB)"
+        lines.append(line)
+        for entry in report["top"][name][:3]:
+            lines.append(f"    {entry['bytes'] / 1024:.1f} KiB  {entry['location']}")
+    return "\n".join(lines)
+
+
+# Глобальные профилировщики
+cpu_profiler = SamplingProfiler()
+memory_profiler = MemoryProfiler()
+
+
+def _is_authorized(request: web.Request) -> bool:
+    """Токен из ADMIN_TOKEN, а если он не задан - только локальные запросы."""
+    if config.ADMIN_TOKEN:
+        return hmac.compare_digest(request.headers.get(ADMIN_TOKEN_HEADER, ""), config.ADMIN_TOKEN)
+    try:
+        return ipaddress.ip_address(request.remote or "").is_loopback
+    except ValueError:
+        return False
+
+
+async def handle_profile(request: web.Request) -> web.Response:
+    """GET /debug/profile?seconds=10&interval=0.005 - collapsed stacks потока event loop."""
+    if not _is_authorized(request):
+        return web.Response(status=403)
+    try:
+        seconds = float(request.query.get("seconds", "10"))
+        interval = float(request.query.get("interval", "0.005"))
+        collapsed, _ = await cpu_profiler.profile(seconds, interval)
+    except ValueError:
+        return web.Response(status=400, text="seconds и interval должны быть числами")
+    except RuntimeError as e:
+        return web.Response(status=409, text=str(e))
+    return web.Response(text=collapsed + "\n")
+
+
+async def handle_memory(request: web.Request) -> web.Response:
+    """GET /debug/memory?limit=10 - снимок памяти по компонентам (JSON); ?stop=1 выключает tracemalloc."""
+    if not _is_authorized(request):
+        return web.Response(status=403)
+    if request.query.get("stop"):
+        memory_profiler.stop()
+        return web.json_response({"tracing": False})
+    try:
+        limit = int(request.query.get("limit", "10"))
+    except ValueError:
+        return web.Response(status=400, text="limit должен быть числом")
+    return web.json_response(await memory_profiler.snapshot(limit))
+
+
+def add_routes(server) -> None:
+    """
+    Подключить /debug/profile и /debug/memory к служебному HTTP серверу.
+
+    Args:
+        server: OpsServer
+    """
+    server.add_route("GET", "/debug/profile", handle_profile)
+    server.add_route("GET", "/debug/memory", handle_memory)
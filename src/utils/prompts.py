@@ -147,3 +147,18 @@ CLASSIC_ANIME_PROMPT = """
 
 Максимум 2-3 предложения на аниме. Без лишних слов.
 """
+
+# Кандидаты из локального каталога для открытых запросов
+RETRIEVAL_PROMPT = """
+Подходящие аниме из каталога (название, год, рейтинг, жанры, объем):
+{candidates}
+
+Советуй из этого списка, если что-то подходит под запрос. Не выдумывай
+год, рейтинг и число серий - бери их из списка.
+"""
+
+# Продолжение ответа, обрезанного по лимиту max_tokens
+CONTINUATION_PROMPT = """
+Твой ответ оборвался. Продолжи ровно с того места, где он оборвался, и
+коротко закончи мысль. Не повторяй уже написанное.
+"""
@@ -0,0 +1,103 @@
+"""
+Согласованная остановка бота: дообработка уже принятых обновлений.
+
+По SIGTERM/SIGINT прием обновлений останавливается (polling, webhook, фронт
+пула процессов), после чего первый shutdown-хук диспетчера (in_flight.drain,
+до остановки сервисов):
+
+1. в режиме polling подтверждает Telegram полученные обновления (offset),
+   чтобы следующий экземпляр бота не получил их повторно;
+2. ограничивает дедлайны обновлений временем SHUTDOWN_DRAIN_TIMEOUT за
+   вычетом запаса на отправку ответа;
+3. ждет завершения обработчиков, но не дольше SHUTDOWN_DRAIN_TIMEOUT.
+
+Затем сервисы выполняют свои shutdown-хуки (сохранение кэша, закрытие пулов
+HTTP), а очередь отправки дорабатывает до закрытия сессии бота.
+"""
+
+import asyncio
+import time
+from typing import Optional, Set
+
+from aiogram import Bot
+
+from src.utils.config import config
+from src.utils.deadline import cap_deadlines
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+# Время на отправку ответа после генерации: дедлайны при остановке короче на него
+REPLY_RESERVE_SECONDS = 5.0
+
+
+async def confirm_updates(bot: Bot, offset: Optional[int]) -> None:
+    """
+    Подтверждает Telegram обновления с update_id < offset (getUpdates с offset).
+
+    Args:
+        bot: Экземпляр бота
+        offset: update_id следующего неподтвержденного обновления
+    """
+    if offset is None:
+        return
+    try:
+        # Возвращенное обновление не подтверждается и достанется следующему экземпляру
+        await bot.get_updates(offset=offset, limit=1, timeout=0)
+        logger.info(f"Confirmed updates up to {offset - 1}")
+    except Exception as e:
+        logger.warning(f"Failed to confirm updates up to {offset - 1}: {e}")
+
+
+class InFlightUpdates:
+    """Обновления в обработке (учитывает InFlightMiddleware)."""
+
+    def __init__(self):
+        """Инициализация учета."""
+        self.update_ids: Set[int] = set()
+        self.last_update_id: Optional[int] = None
+        # Подтверждать offset при остановке (long polling в этом процессе)
+        self.polling = False
+        self._idle: Optional[asyncio.Event] = None
+        metrics.gauge("bot_updates_in_flight", "Обновления в обработке").set_function(
+            lambda: len(self.update_ids)
+        )
+
+    def begin(self, update_id: int) -> None:
+        """Обновление принято в обработку."""
+        self.update_ids.add(update_id)
+        if self.last_update_id is None or update_id > self.last_update_id:
+            self.last_update_id = update_id
+
+    def end(self, update_id: int) -> None:
+        """Обработка обновления завершена."""
+        self.update_ids.discard(update_id)
+        if not self.update_ids and self._idle is not None:
+            self._idle.set()
+
+    async def drain(self, bot: Bot, timeout: float = None) -> None:
+        """
+        Shutdown-хук: подтвердить offset и дождаться обработчиков.
+
+        Args:
+            bot: Экземпляр бота
+            timeout: Максимальное время ожидания, секунды
+        """
+        timeout = timeout if timeout is not None else config.SHUTDOWN_DRAIN_TIMEOUT
+        if self.polling and self.last_update_id is not None:
+            await confirm_updates(bot, self.last_update_id + 1)
+        if not self.update_ids:
+            return
+
+        cap_deadlines(max(timeout - REPLY_RESERVE_SECONDS, 0.0))
+        logger.info(f"Draining {len(self.update_ids)} in-flight updates (up to {timeout:.0f}s)")
+        started = time.perf_counter()
+        self._idle = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            logger.info(f"In-flight updates drained in {time.perf_counter() - started:.1f}s")
+        except asyncio.TimeoutError:
+            logger.warning(f"Shutdown drain timed out, {len(self.update_ids)} updates abandoned")
+
+
+# Глобальный учет обновлений в обработке
+in_flight = InFlightUpdates()
@@ -0,0 +1,402 @@
+"""
+Легковесная трассировка обработки обновлений.
+
+Текущий span хранится в contextvars, поэтому переходит через await и в
+созданные задачи без явной передачи. Корневой span открывает TracingMiddleware
+при получении обновления, вложенные - сервисы (история, кэш, попытки запросов
+к LLM, отправка ответа). Законченный трейс проходит хвостовое сэмплирование:
+медленные и ошибочные трейсы сохраняются всегда, остальные - с вероятностью
+TRACE_SAMPLE_RATE. Экспорт выполняется в фоновом потоке: в JSONL файл или
+OTLP/HTTP коллектору (JSON кодирование).
+
+Пример:
+    with start_span("cache.get", query_length=len(query)) as span:
+        ...
+        span.set_attribute("hit", True)
+"""
+
+import functools
+import json
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.utils.config import config
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+# Максимум span'ов в одном трейсе - защита от бесконечных циклов
+MAX_SPANS_PER_TRACE = 256
+
+traces_total = metrics.counter("traces_total", "Законченные трейсы по решению сэмплирования", ("decision",))
+traces_kept = traces_total.labels("kept")
+traces_dropped = traces_total.labels("dropped")
+traces_export_dropped = traces_total.labels("export_queue_full")
+
+
+class Span:
+    """Один замер внутри трейса."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns",
+                 "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str],
+                 attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        """Длительность span'а в миллисекундах."""
+        return (self.end_ns - self.start_ns) / 1_000_000
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Добавить атрибут span'а."""
+        self.attributes[key] = value
+
+
+class Trace:
+    """Набор span'ов одного обновления."""
+
+    # has_error - ошибка самого обновления (корня или mark_error); ошибки
+    # вложенных span'ов, которые были обработаны (повторы), на статус не влияют
+    __slots__ = ("trace_id", "spans", "root", "finished", "has_error")
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+        self.finished = False
+        self.has_error = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Трейс одной записью: корень и плоский список span'ов со смещениями."""
+        root = self.root
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name,
+            "start": root.start_ns / 1_000_000_000,
+            "duration_ms": round(root.duration_ms, 3),
+            "status": "error" if self.has_error else "ok",
+            "attributes": root.attributes,
+            "spans": [
+                {
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "name": span.name,
+                    "offset_ms": round((span.start_ns - root.start_ns) / 1_000_000, 3),
+                    "duration_ms": round(span.duration_ms, 3) if span.end_ns else None,
+                    "error": span.error,
+                    "attributes": span.attributes,
+                }
+                for span in self.spans
+            ],
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _NoopSpan:
+    """Span-заглушка вне трейса: все операции ничего не делают."""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _SpanContext:
+    """Контекстный менеджер span'а (работает и в синхронном, и в async коде)."""
+
+    __slots__ = ("_name", "_attributes", "_root", "_span", "_token")
+
+    def __init__(self, name: str, attributes: Dict[str, Any], root: bool):
+        self._name = name
+        self._attributes = attributes
+        self._root = root
+        self._span: Optional[Span] = None
+        self._token = None
+
+    def __enter__(self):
+        if self._root:
+            trace = Trace()
+            span = Span(trace, self._name, None, self._attributes)
+            trace.root = span
+        else:
+            parent = _current_span.get()
+            # Вне трейса или в уже законченном трейсе span не создаем
+            if parent is None or parent.trace.finished or len(parent.trace.spans) >= MAX_SPANS_PER_TRACE:
+                return _NOOP_SPAN
+            trace = parent.trace
+            span = Span(trace, self._name, parent.span_id, self._attributes)
+
+        trace.spans.append(span)
+        self._span = span
+        self._token = _current_span.set(span)
+        return span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        span = self._span
+        if span is None:
+            return
+        span.end_ns = time.time_ns()
+        if exc is not None:
+            span.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        if self._root:
+            span.trace.has_error = span.trace.has_error or span.error is not None
+            tracer.finish(span.trace)
+
+
+def start_trace(name: str, **attributes: Any) -> _SpanContext:
+    """
+    Открыть корневой span нового трейса.
+
+    Args:
+        name: Название (например, "update")
+        attributes: Атрибуты трейса
+    """
+    return _SpanContext(name, attributes, root=True)
+
+
+def start_span(name: str, **attributes: Any) -> _SpanContext:
+    """
+    Открыть вложенный span текущего трейса (вне трейса - заглушка).
+
+    Args:
+        name: Название операции
+        attributes: Атрибуты span'а
+    """
+    return _SpanContext(name, attributes, root=False)
+
+
+def current_span():
+    """Текущий span или заглушка, если трейса нет."""
+    return _current_span.get() or _NOOP_SPAN
+
+
+def mark_error(error: str) -> None:
+    """Отметить текущий трейс ошибочным (для ошибок, которые перехвачены и не долетят до span'а)."""
+    span = _current_span.get()
+    if span is not None:
+        span.error = error
+        span.trace.has_error = True
+
+
+def traced(name: str) -> Callable:
+    """
+    Декоратор async функции: выполнить ее внутри span'а.
+
+    Args:
+        name: Название span'а
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with start_span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class JsonlExporter:
+    """Экспорт трейсов в JSONL файл, по строке на трейс."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Путь к файлу
+        """
+        self.path = Path(path)
+
+    def export(self, batch: List[Trace]) -> None:
+        """Дописать пачку трейсов в файл."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for trace in batch:
+                f.write(json.dumps(trace.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """Значение атрибута в формате OTLP JSON."""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+class OtlpHttpExporter:
+    """Экспорт трейсов OTLP/HTTP коллектору в JSON кодировании (POST /v1/traces)."""
+
+    def __init__(self, endpoint: str, service_name: str = "anime-bot", timeout: float = 5):
+        """
+        Args:
+            endpoint: Адрес коллектора (например, http://127.0.0.1:4318)
+            service_name: Значение service.name ресурса
+            timeout: Таймаут HTTP запроса
+        """
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def encode(self, batch: List[Trace]) -> Dict[str, Any]:
+        """Пачка трейсов в виде ExportTraceServiceRequest."""
+        spans = []
+        for trace in batch:
+            for span in trace.spans:
+                otlp_span = {
+                    "traceId": trace.trace_id,
+                    "spanId": span.span_id,
+                    "name": span.name,
+                    "kind": 2 if span is trace.root else 1,
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns or trace.root.end_ns),
+                    "attributes": _otlp_attributes(span.attributes),
+                    "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+                }
+                if span.parent_id:
+                    otlp_span["parentSpanId"] = span.parent_id
+                spans.append(otlp_span)
+
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{"scope": {"name": "anime_bot"}, "spans": spans}],
+            }]
+        }
+
+    def export(self, batch: List[Trace]) -> None:
+        """Отправить пачку трейсов коллектору."""
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(self.encode(batch), default=str).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class Tracer:
+    """Хвостовое сэмплирование и фоновый экспорт законченных трейсов."""
+
+    def __init__(self, exporter=None, slow_threshold: float = None, sample_rate: float = None,
+                 queue_size: int = 1000, batch_size: int = 100):
+        """
+        Args:
+            exporter: Объект с методом export(batch) или None (трейсы не сохраняются)
+            slow_threshold: Трейсы дольше этого (секунды) сохраняются всегда
+            sample_rate: Доля сохраняемых быстрых и успешных трейсов
+            queue_size: Размер очереди экспорта
+            batch_size: Максимум трейсов в одной отправке
+        """
+        self.exporter = exporter
+        self.slow_threshold_ms = (slow_threshold if slow_threshold is not None
+                                  else config.TRACE_SLOW_THRESHOLD) * 1000
+        self.sample_rate = sample_rate if sample_rate is not None else config.TRACE_SAMPLE_RATE
+        self.batch_size = batch_size
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        """Есть ли куда сохранять трейсы."""
+        return self.exporter is not None
+
+    def should_keep(self, trace: Trace) -> bool:
+        """
+        Хвостовое сэмплирование: медленные, ошибочные и трейсы с неудачными
+        операциями (например, повтор запроса к LLM) - всегда, остальные - долей.
+        """
+        if trace.has_error or trace.root.duration_ms >= self.slow_threshold_ms:
+            return True
+        if any(span.error for span in trace.spans):
+            return True
+        return random.random() < self.sample_rate
+
+    def finish(self, trace: Trace) -> None:
+        """Завершить трейс: решить, сохранять ли его, и поставить в очередь экспорта."""
+        trace.finished = True
+        if self.exporter is None:
+            return
+        if not self.should_keep(trace):
+            traces_dropped.inc()
+            return
+
+        traces_kept.inc()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            traces_export_dropped.inc()
+
+    def _export_loop(self) -> None:
+        """Фоновый поток: собирает пачки и отдает их экспортеру."""
+        while True:
+            trace = self._queue.get()
+            if trace is None:
+                return
+            batch = [trace]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    trace = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if trace is None:
+                    stop = True
+                    break
+                batch.append(trace)
+
+            try:
+                self.exporter.export(batch)
+            except Exception as e:
+                logger.warning(f"Trace export failed ({len(batch)} traces): {e}")
+            if stop:
+                return
+
+    def shutdown(self, timeout: float = 5) -> None:
+        """Дописать очередь экспорта и остановить поток."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+
+def create_exporter():
+    """Экспортер по настройке TRACE_EXPORTER (jsonl, otlp или none)."""
+    kind = config.TRACE_EXPORTER
+    if kind == "jsonl":
+        return JsonlExporter(config.TRACE_FILE)
+    if kind == "otlp":
+        return OtlpHttpExporter(config.TRACE_OTLP_ENDPOINT)
+    return None
+
+
+# Глобальный трассировщик
+tracer = Tracer(create_exporter())
@@ -0,0 +1,233 @@
+"""
+Webhook-режим доставки обновлений: встроенный aiohttp сервер.
+
+Сервер принимает обновления от Telegram, проверяет секретный токен и кладет
+их в ограниченную очередь. Пул воркеров разбирает очередь и передает
+обновления в Dispatcher. Если очередь переполнена, сервер отвечает 503 -
+Telegram повторит доставку позже (обратное давление).
+"""
+
+import asyncio
+import hmac
+import json
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from src.utils.config import config
+from src.utils.deadline import cap_deadlines
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+from src.utils.shutdown import REPLY_RESERVE_SECONDS
+
+# Заголовок, в котором Telegram передает secret_token
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """aiohttp сервер для приема обновлений Telegram через webhook."""
+
+    def __init__(self, bot: Bot, dispatcher: Dispatcher, path: str = None,
+                 secret: str = None, queue_size: int = None, workers: int = None,
+                 update_handler: Callable[[Dict[str, Any]], Awaitable[None]] = None):
+        """
+        Инициализация webhook сервера.
+
+        Args:
+            bot: Экземпляр бота
+            dispatcher: Диспетчер с зарегистрированными роутерами
+            path: Путь webhook эндпоинта
+            secret: Секретный токен для проверки запросов
+            queue_size: Размер очереди обновлений
+            workers: Количество воркеров обработки
+            update_handler: Обработчик обновления вместо локального Dispatcher
+                (например, маршрутизация в пул процессов)
+        """
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.path = path or config.WEBHOOK_PATH
+        self.secret = secret if secret is not None else config.WEBHOOK_SECRET
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or config.WEBHOOK_QUEUE_SIZE)
+        self.workers_count = workers or config.WEBHOOK_WORKERS
+        self.update_handler = update_handler or self.process_update
+
+        self._workers: List[asyncio.Task] = []
+        self._runner: Optional[web.AppRunner] = None
+        self._stop_event = asyncio.Event()
+        self._accepting = False
+
+        # Счетчики для мониторинга
+        self.stats = {"accepted": 0, "rejected": 0, "processed": 0, "failed": 0}
+        metrics.gauge("webhook_queue_depth", "Обновлений в очереди webhook").set_function(self.queue.qsize)
+        updates = metrics.counter("webhook_updates_total", "Обновления, принятые webhook сервером", ("result",))
+        for result in self.stats:
+            updates.labels(result).set_function(lambda result=result: self.stats[result])
+
+    def create_app(self) -> web.Application:
+        """Создать aiohttp приложение с webhook эндпоинтом."""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """
+        Принять обновление от Telegram.
+
+        Args:
+            request: HTTP запрос
+
+        Returns:
+            200 - обновление в очереди, 401 - неверный токен,
+            400 - некорректный JSON, 503 - очередь переполнена или идет остановка
+        """
+        if self.secret:
+            token = request.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(token, self.secret):
+                logger.warning(f"Webhook request with invalid secret from {request.remote}")
+                return web.Response(status=401)
+
+        if not self._accepting:
+            return web.Response(status=503, headers={"Retry-After": "1"})
+
+        try:
+            update = await request.json(loads=json.loads)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.Response(status=400)
+        if not isinstance(update, dict):
+            return web.Response(status=400)
+
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            logger.warning(f"Webhook queue is full ({self.queue.maxsize}), rejecting update")
+            return web.Response(status=503, headers={"Retry-After": "1"})
+
+        self.stats["accepted"] += 1
+        return web.Response()
+
+    async def _worker(self) -> None:
+        """Воркер: разбирает очередь и передает обновления в Dispatcher."""
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.update_handler(update)
+            except Exception as e:
+                # Ошибка обработчика не должна останавливать воркер
+                logger.error(f"Webhook update handler failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def process_update(self, update: Dict[str, Any]) -> None:
+        """
+        Обработать одно обновление через Dispatcher.
+
+        Args:
+            update: Обновление в виде словаря JSON
+        """
+        try:
+            parsed = Update.model_validate(update, context={"bot": self.bot})
+            await self.dispatcher.feed_update(self.bot, parsed)
+            self.stats["processed"] += 1
+        except Exception as e:
+            self.stats["failed"] += 1
+            update_id = update.get("update_id") if isinstance(update, dict) else None
+            logger.error(f"Error processing webhook update {update_id}: {e}")
+
+    async def start(self, host: str = None, port: int = None) -> None:
+        """
+        Запустить воркеры и HTTP сервер.
+
+        Args:
+            host: Адрес для прослушивания
+            port: Порт для прослушивания
+        """
+        host = host or config.WEBHOOK_HOST
+        port = port if port is not None else config.WEBHOOK_PORT
+
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers_count)
+        ]
+
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self._accepting = True
+
+        logger.info(
+            f"Webhook server listening on {host}:{port}{self.path} "
+            f"({self.workers_count} workers, queue {self.queue.maxsize})"
+        )
+
+    async def register_webhook(self, base_url: str = None) -> None:
+        """
+        Зарегистрировать webhook в Telegram.
+
+        Args:
+            base_url: Публичный адрес сервера (например, https://bot.example.com)
+        """
+        base_url = base_url or config.WEBHOOK_BASE_URL
+        if not base_url:
+            logger.warning("WEBHOOK_BASE_URL is not set, skipping setWebhook")
+            return
+
+        await self.bot.set_webhook(
+            url=base_url.rstrip("/") + self.path,
+            secret_token=self.secret or None,
+            allowed_updates=self.dispatcher.resolve_used_update_types(),
+            max_connections=self.workers_count
+        )
+        logger.info(f"Webhook registered at {base_url}")
+
+    async def stop(self, drain_timeout: float = None) -> None:
+        """
+        Остановить прием, дождаться обработки очереди и остановить воркеры.
+
+        Args:
+            drain_timeout: Максимальное время ожидания обработки очереди
+        """
+        drain_timeout = drain_timeout if drain_timeout is not None else config.WEBHOOK_DRAIN_TIMEOUT
+
+        # Новые обновления получают 503, Telegram доставит их повторно
+        self._accepting = False
+        # Обработчики укладываются во время остановки вместе с отправкой ответа,
+        # а не отменяются посреди запроса к LLM
+        cap_deadlines(max(drain_timeout - REPLY_RESERVE_SECONDS, 0.0))
+
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+            logger.info("Webhook queue drained")
+        except asyncio.TimeoutError:
+            logger.warning(f"Webhook queue drain timed out, {self.queue.qsize()} updates left")
+
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            with suppress(asyncio.CancelledError):
+                await worker
+        self._workers = []
+
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+        logger.info(f"Webhook server stopped: {self.stats}")
+
+    def request_stop(self) -> None:
+        """Попросить serve() завершиться (например, из обработчика сигнала)."""
+        self._stop_event.set()
+
+    async def serve(self) -> None:
+        """Запустить сервер и работать до вызова request_stop()."""
+        await self.dispatcher.emit_startup(bot=self.bot, dispatcher=self.dispatcher)
+        try:
+            await self.start()
+            await self.register_webhook()
+            await self._stop_event.wait()
+        finally:
+            await self.stop()
+            await self.dispatcher.emit_shutdown(bot=self.bot, dispatcher=self.dispatcher)
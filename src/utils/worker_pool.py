@@ -0,0 +1,424 @@
+"""
+Многопроцессный режим: фронт-процесс и пул воркеров с шардированием по user_id.
+
+Фронт принимает обновления (polling или webhook) и отправляет каждое в один из
+N процессов-воркеров по консистентному хэшу user_id, поэтому состояние
+пользователя (история, пагинация) живет в одном процессе. Фронт следит за
+воркерами и перезапускает упавшие. Кэш LLM ответов общий: словарь живет в
+процессе менеджера, воркеры обращаются к нему через прокси, а фронт
+периодически сохраняет его в файл.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import multiprocessing
+import queue
+import secrets
+import signal
+import time
+from contextlib import suppress
+from multiprocessing.managers import BaseManager, DictProxy
+from typing import Any, Dict, Iterable, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from src.utils.config import config
+from src.utils.deadline import cap_deadlines
+from src.utils.http_pool import ConnectionKeeper, PooledAiohttpSession
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+from src.utils.ops_server import OpsServer
+from src.utils.shutdown import REPLY_RESERVE_SECONDS, confirm_updates
+
+# Типы обновлений, в которых есть отправитель
+_USER_EVENT_KEYS = (
+    "message", "edited_message", "callback_query", "inline_query",
+    "chosen_inline_result", "my_chat_member", "chat_member", "pre_checkout_query",
+)
+
+# Время воркеру на shutdown-хуки после дообработки (очередь отправки, пулы HTTP)
+WORKER_SHUTDOWN_GRACE = 15.0
+
+# Словарь общего кэша - живет в процессе менеджера
+_shared_cache: Dict[str, Any] = {}
+
+
+def _get_shared_cache() -> Dict[str, Any]:
+    """Вернуть общий словарь кэша (вызывается в процессе менеджера)."""
+    return _shared_cache
+
+
+class SharedCacheManager(BaseManager):
+    """Менеджер процессов, раздающий общий словарь кэша."""
+
+
+SharedCacheManager.register("get_cache", callable=_get_shared_cache, proxytype=DictProxy)
+
+
+class HashRing:
+    """Консистентный хэш с виртуальными узлами."""
+
+    def __init__(self, nodes: Iterable[int], vnodes: int = 128):
+        """
+        Args:
+            nodes: Идентификаторы узлов (номера воркеров)
+            vnodes: Количество виртуальных узлов на один реальный
+        """
+        ring = sorted(
+            (self._hash(f"{node}:{replica}"), node)
+            for node in nodes
+            for replica in range(vnodes)
+        )
+        self._hashes = [point for point, _ in ring]
+        self._nodes = [node for _, node in ring]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def get_node(self, key: Any) -> int:
+        """
+        Найти узел для ключа.
+
+        Args:
+            key: Ключ шардирования (user_id)
+
+        Returns:
+            Идентификатор узла
+        """
+        index = bisect.bisect(self._hashes, self._hash(str(key)))
+        return self._nodes[index % len(self._nodes)]
+
+
+def extract_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """
+    Найти ID пользователя в сыром обновлении.
+
+    Args:
+        update: Обновление в виде словаря JSON
+
+    Returns:
+        ID отправителя или чата, None если его нет
+    """
+    for key in _USER_EVENT_KEYS:
+        event = update.get(key)
+        if event:
+            sender = event.get("from") or event.get("chat")
+            if sender:
+                return sender.get("id")
+    return None
+
+
+def _worker_main(index: int, workers: int, updates_queue, cache_address, authkey: bytes,
+                 concurrency: int) -> None:
+    """Точка входа процесса-воркера."""
+    # Ctrl+C приходит всей группе процессов - остановкой управляет фронт
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_loop(index, workers, updates_queue, cache_address, authkey, concurrency))
+
+
+async def _worker_loop(index: int, workers: int, updates_queue, cache_address, authkey: bytes,
+                       concurrency: int) -> None:
+    """Цикл воркера: читает свою очередь и обрабатывает обновления Dispatcher'ом."""
+    # Импорт внутри процесса: роутеры тянут за собой сервисы
+    from src.bot import create_dispatcher
+    from src.services.cache_service import cache_service
+    from src.services.delivery_service import delivery_service
+    from src.utils.loop_watchdog import loop_watchdog
+    from src.utils.tracing import tracer
+
+    # Лимит Telegram общий на бота - каждый воркер отправляет свою долю
+    delivery_service.set_global_rate(config.DELIVERY_GLOBAL_RATE / workers)
+
+    manager = SharedCacheManager(address=cache_address, authkey=authkey)
+    manager.connect()
+    cache_service.use_shared_store(manager.get_cache())
+
+    # Каждый воркер отдает свои метрики на порту OPS_PORT + 1 + index
+    ops_server = None
+    if config.OPS_PORT:
+        ops_server = OpsServer(port=config.OPS_PORT + 1 + index)
+        try:
+            await ops_server.start()
+        except OSError as e:
+            logger.warning(f"Worker {index} ops server failed to start: {e}")
+            ops_server = None
+
+    if config.LOOP_WATCHDOG_ENABLED:
+        await loop_watchdog.start()
+
+    bot = Bot(token=config.TELEGRAM_BOT_TOKEN, session=PooledAiohttpSession(f"telegram:{index}"))
+    bot_keeper = ConnectionKeeper(bot.session.stats, bot.get_me)
+    bot_keeper.start()
+    dp = create_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    logger.info(f"Worker {index} started")
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def process(raw_update: Dict[str, Any]) -> None:
+        try:
+            update = Update.model_validate(raw_update, context={"bot": bot})
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            logger.error(f"Worker {index} failed to process update {raw_update.get('update_id')}: {e}")
+        finally:
+            semaphore.release()
+
+    try:
+        while True:
+            raw_update = await loop.run_in_executor(None, updates_queue.get)
+            if raw_update is None:
+                break
+            await semaphore.acquire()
+            task = asyncio.create_task(process(raw_update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        # Дорабатываем уже принятые обновления: дедлайны сокращаются под время
+        # остановки, и только по его истечении оставшиеся обработчики отменяются
+        if tasks:
+            drain_timeout = config.SHUTDOWN_DRAIN_TIMEOUT
+            cap_deadlines(max(drain_timeout - REPLY_RESERVE_SECONDS, 0.0))
+            logger.info(f"Worker {index} draining {len(tasks)} in-flight updates (up to {drain_timeout:.0f}s)")
+            _, pending = await asyncio.wait(set(tasks), timeout=drain_timeout)
+            if pending:
+                logger.warning(f"Worker {index} drain timed out, {len(pending)} updates abandoned")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot_keeper.stop()
+        # Очередь отправки дорабатывает до закрытия сессии, как в bot.py
+        await delivery_service.close()
+        await bot.session.close()
+        if ops_server is not None:
+            await ops_server.stop()
+        await loop_watchdog.stop()
+        # Дописать трейсы из очереди экспорта до выхода процесса
+        await asyncio.to_thread(tracer.shutdown)
+        logger.info(f"Worker {index} stopped")
+
+
+class WorkerPool:
+    """Фронт: маршрутизация обновлений в процессы-воркеры и надзор за ними."""
+
+    def __init__(self, processes: int = None, queue_size: int = None, concurrency: int = None):
+        """
+        Args:
+            processes: Количество процессов-воркеров
+            queue_size: Размер очереди каждого воркера
+            concurrency: Максимум одновременно обрабатываемых обновлений в воркере
+        """
+        self.processes_count = processes or config.WORKER_PROCESSES
+        self.queue_size = queue_size or config.WORKER_QUEUE_SIZE
+        self.concurrency = concurrency or config.WORKER_CONCURRENCY
+        self.ring = HashRing(range(self.processes_count))
+
+        self._context = multiprocessing.get_context("spawn")
+        self._queues: List[Any] = []
+        self._processes: List[Any] = []
+        self._restarts: List[int] = []
+        self._next_restart_at: List[float] = []
+        self._authkey = secrets.token_bytes(16)
+        self._manager: Optional[SharedCacheManager] = None
+        self.shared_cache = None
+        self._running = False
+        self._supervisor: Optional[asyncio.Task] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Запустить менеджер общего кэша, воркеры и надзор."""
+        from src.services.cache_service import cache_service
+
+        self._manager = SharedCacheManager(
+            address=("127.0.0.1", 0), authkey=self._authkey, ctx=self._context
+        )
+        self._manager.start()
+        self.shared_cache = self._manager.get_cache()
+
+        # Переносим кэш в общее хранилище (здесь загрузку приходится дождаться)
+        await cache_service.load()
+        self.shared_cache.update(cache_service.cache)
+        cache_service.use_shared_store(self.shared_cache)
+
+        queue_depth = metrics.gauge("worker_queue_depth", "Обновлений в очереди воркера", ("worker",))
+        restarts = metrics.counter("worker_restarts_total", "Перезапуски воркеров", ("worker",))
+
+        for index in range(self.processes_count):
+            self._queues.append(self._context.Queue(maxsize=self.queue_size))
+            self._processes.append(None)
+            self._restarts.append(0)
+            self._next_restart_at.append(0.0)
+            self._spawn(index)
+            queue_depth.labels(index).set_function(self._queues[index].qsize)
+            restarts.labels(index).set_function(lambda index=index: self._restarts[index])
+
+        self._running = True
+        self._supervisor = asyncio.create_task(self._supervise())
+        self._flusher = asyncio.create_task(self._flush_periodically())
+        logger.info(f"Worker pool started: {self.processes_count} processes")
+
+    def _spawn(self, index: int) -> None:
+        """Запустить процесс-воркер с номером index."""
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self.processes_count, self._queues[index], self._manager.address,
+                  self._authkey, self.concurrency),
+            name=f"anime-bot-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+
+    async def _supervise(self) -> None:
+        """Перезапускать упавшие воркеры с экспоненциальной задержкой."""
+        while self._running:
+            await asyncio.sleep(1)
+            now = time.monotonic()
+            for index, process in enumerate(self._processes):
+                if process.is_alive() or not self._running:
+                    continue
+
+                if self._next_restart_at[index] == 0.0:
+                    delay = min(2 ** self._restarts[index], 30)
+                    self._next_restart_at[index] = now + delay
+                    logger.error(
+                        f"Worker {index} died with exit code {process.exitcode}, "
+                        f"restarting in {delay}s"
+                    )
+                elif now >= self._next_restart_at[index]:
+                    self._restarts[index] += 1
+                    self._next_restart_at[index] = 0.0
+                    self._spawn(index)
+                    logger.info(f"Worker {index} restarted ({self._restarts[index]} restarts)")
+
+    async def dispatch(self, update: Dict[str, Any]) -> None:
+        """
+        Отправить обновление воркеру, отвечающему за пользователя.
+
+        Если очередь воркера заполнена, ждет освобождения места - так
+        обратное давление доходит до webhook очереди или цикла polling.
+
+        Args:
+            update: Обновление в виде словаря JSON
+        """
+        user_id = extract_user_id(update)
+        index = self.ring.get_node(user_id if user_id is not None else update.get("update_id"))
+        updates_queue = self._queues[index]
+
+        while True:
+            try:
+                updates_queue.put_nowait(update)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.01)
+
+    async def poll(self, bot: Bot, dispatcher: Dispatcher, stop_event: asyncio.Event,
+                   polling_timeout: int = 10) -> None:
+        """
+        Получать обновления long polling'ом и раздавать их воркерам.
+
+        Args:
+            bot: Экземпляр бота
+            dispatcher: Диспетчер (для списка используемых типов обновлений)
+            stop_event: Событие остановки
+            polling_timeout: Таймаут long polling в секундах
+        """
+        allowed_updates = dispatcher.resolve_used_update_types()
+        offset = None
+        stop_waiter = asyncio.create_task(stop_event.wait())
+
+        try:
+            while not stop_event.is_set():
+                fetch = asyncio.create_task(bot.get_updates(
+                    offset=offset, timeout=polling_timeout, allowed_updates=allowed_updates
+                ))
+                await asyncio.wait({fetch, stop_waiter}, return_when=asyncio.FIRST_COMPLETED)
+                if not fetch.done():
+                    fetch.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await fetch
+                    break
+
+                try:
+                    updates = fetch.result()
+                except Exception as e:
+                    logger.error(f"Polling error in worker pool front: {e}")
+                    await asyncio.sleep(1)
+                    continue
+
+                for update in updates:
+                    await self.dispatch(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+                    offset = update.update_id + 1
+        finally:
+            stop_waiter.cancel()
+        # Розданные воркерам обновления они дорабатывают при остановке
+        await confirm_updates(bot, offset)
+
+    async def _flush_periodically(self) -> None:
+        """Периодически сохранять общий кэш в файл."""
+        while self._running:
+            await asyncio.sleep(config.CACHE_FLUSH_INTERVAL)
+            await self.flush_cache()
+
+    async def flush_cache(self) -> None:
+        """Сохранить снимок общего кэша в файл в отдельном потоке."""
+        from src.services.cache_service import cache_service
+
+        if self.shared_cache is None:
+            return
+
+        snapshot = self.shared_cache.copy()
+
+        def write() -> None:
+            with open(cache_service.cache_file, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=2)
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, write)
+            logger.debug(f"Shared cache flushed: {len(snapshot)} entries")
+        except Exception as e:
+            logger.error(f"Ошибка сохранения общего кэша: {e}")
+
+    async def stop(self, timeout: float = None) -> None:
+        """
+        Остановить воркеры: дать им доработать очередь, затем сохранить кэш.
+
+        Args:
+            timeout: Время ожидания завершения воркеров (по умолчанию - дообработка
+                SHUTDOWN_DRAIN_TIMEOUT и shutdown-хуки воркера)
+        """
+        if timeout is None:
+            timeout = config.SHUTDOWN_DRAIN_TIMEOUT + WORKER_SHUTDOWN_GRACE
+        self._running = False
+        for task in (self._supervisor, self._flusher):
+            if task is not None:
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+
+        for updates_queue in self._queues:
+            with suppress(queue.Full):
+                updates_queue.put(None, timeout=1)
+
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        for index, process in enumerate(self._processes):
+            remaining = max(deadline - time.monotonic(), 0)
+            await loop.run_in_executor(None, process.join, remaining)
+            if process.is_alive():
+                logger.warning(f"Worker {index} did not stop in time, terminating")
+                process.terminate()
+
+        await self.flush_cache()
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+        logger.info("Worker pool stopped")
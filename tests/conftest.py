@@ -0,0 +1,37 @@
+"""
+Общие настройки тестов.
+
+Конфигурация бота читается из окружения при импорте src.utils.config,
+поэтому окружение задается здесь, до импорта модулей бота: кэш во временной
+папке, без трассировки, служебного сервера и лимитов отправки.
+"""
+
+import os
+import tempfile
+
+import pytest
+
+from benchmarks.telegram_stub import STUB_TOKEN
+
+os.environ.update(
+    TELEGRAM_BOT_TOKEN=STUB_TOKEN,
+    OPENROUTER_API_KEY="test",
+    OPENROUTER_API_KEYS="",
+    CACHE_DIR=tempfile.mkdtemp(prefix="test_cache_"),
+    LOG_LEVEL="WARNING",
+    TRACE_EXPORTER="none",
+    OPS_PORT="0",
+    LOOP_WATCHDOG_ENABLED="false",
+    DELIVERY_GLOBAL_RATE="1000000",
+    DELIVERY_CHAT_RATE="1000000",
+    DELIVERY_CHAT_BURST="1000000",
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_deadline_cap():
+    """Предел дедлайнов остановки не переходит в следующий тест."""
+    from src.utils.deadline import cap_deadlines
+
+    yield
+    cap_deadlines(None)
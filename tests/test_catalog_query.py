@@ -0,0 +1,36 @@
+"""Разбор фильтрующих запросов каталога."""
+
+import pytest
+
+from src.services.catalog_service import CatalogQuery, parse_catalog_query
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("аниме про спорт 2010-х", CatalogQuery(genres=["sports"], year_from=2010, year_to=2019)),
+    ("спортивное аниме 2019", CatalogQuery(genres=["sports"], year_from=2019, year_to=2019)),
+    ("топ 3 комедии после 2015", CatalogQuery(genres=["comedy"], year_from=2016, limit=3)),
+    ("романтика до 2000", CatalogQuery(genres=["romance"], year_to=1999)),
+    ("фильмы 90-х", CatalogQuery(formats=["movie"], year_from=1990, year_to=1999)),
+    ("аниме с 2005 по 2010", CatalogQuery(year_from=2005, year_to=2010)),
+    ("Аниме про СПОРТ", CatalogQuery(genres=["sports"])),
+])
+def test_filters_are_parsed(text, expected):
+    assert parse_catalog_query(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    # Отрицание меняет смысл - запрос открытый
+    "аниме без романтики",
+    "спорт, но не про футбол",
+    # Слова вне словаря
+    "посоветуй что-нибудь про наруто",
+    # Нет ни одного фильтра
+    "аниме",
+    "",
+])
+def test_open_queries_are_left_to_llm(text):
+    assert parse_catalog_query(text) is None
+
+
+def test_top_limit_is_bounded():
+    assert parse_catalog_query("топ 50 комедий").limit == 10
@@ -0,0 +1,116 @@
+"""Дедлайн обработки обновления и бюджет повторов."""
+
+import asyncio
+import time
+
+import pytest
+
+from src.utils.deadline import (
+    DeadlineExceeded,
+    RetryBudget,
+    attempt_timeout,
+    cap_deadlines,
+    deadline,
+    remaining,
+    within_deadline,
+)
+
+
+def test_no_deadline_outside_block():
+    assert remaining() is None
+    assert attempt_timeout(30, "test") == 30
+
+
+def test_nested_deadline_does_not_extend_outer():
+    with deadline(10):
+        with deadline(100):
+            assert remaining() <= 10
+        with deadline(1):
+            assert remaining() <= 1
+        assert 9 < remaining() <= 10
+    assert remaining() is None
+
+
+def test_attempt_timeout_is_bounded_by_deadline():
+    with deadline(10):
+        assert 9 < attempt_timeout(30, "test") <= 10
+        assert attempt_timeout(3, "test") == 3
+        # После паузы reserve на попытку остается меньше минимума
+        with pytest.raises(DeadlineExceeded):
+            attempt_timeout(30, "test", reserve=9)
+
+
+def test_cap_limits_existing_deadlines():
+    with deadline(45):
+        cap_deadlines(5)
+        assert remaining() <= 5
+    # Предел действует и без дедлайна обновления
+    assert remaining() <= 5
+    cap_deadlines(None)
+    assert remaining() is None
+
+
+async def test_within_deadline_returns_result():
+    async def operation():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    with deadline(5):
+        assert await within_deadline(operation(), "test") == "ok"
+    assert await within_deadline(operation(), "test") == "ok"
+
+
+async def test_within_deadline_interrupts_when_deadline_is_capped():
+    cancelled = asyncio.Event()
+
+    async def slow_request():
+        try:
+            await asyncio.sleep(30)
+        finally:
+            cancelled.set()
+
+    async def stop_soon():
+        await asyncio.sleep(0.1)
+        cap_deadlines(0.2)
+
+    started = time.monotonic()
+    stopper = asyncio.create_task(stop_soon())
+    with deadline(45):
+        with pytest.raises(DeadlineExceeded):
+            await within_deadline(slow_request(), "test")
+    await stopper
+
+    assert time.monotonic() - started < 1
+    assert cancelled.is_set()
+
+
+def test_retry_budget_limits_retries_to_ratio():
+    budget = RetryBudget("test", ratio=0.5, min_per_second=0, window=10)
+    for _ in range(4):
+        budget.record_request()
+
+    assert [budget.try_retry() for _ in range(3)] == [True, True, False]
+
+
+def test_retry_budget_allows_minimum_at_low_traffic():
+    budget = RetryBudget("test", ratio=0.1, min_per_second=0.2, window=10)
+    budget.record_request()
+    # 0.1 * 1 + 0.2 * 10 = 2.1 повтора
+    assert [budget.try_retry() for _ in range(3)] == [True, True, False]
+
+
+def test_negative_ratio_disables_budget():
+    budget = RetryBudget("test", ratio=-1, min_per_second=0)
+    assert all(budget.try_retry() for _ in range(100))
+
+
+def test_retry_budget_window_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    budget = RetryBudget("test", ratio=0, min_per_second=0.1, window=10)
+    assert budget.try_retry()
+    assert not budget.try_retry()
+
+    # Через целое окно прошлые повторы не учитываются
+    now[0] += 11
+    assert budget.try_retry()
@@ -0,0 +1,68 @@
+"""Пул ключей OpenRouter: выбор ключа и карантин."""
+
+from src.services.key_pool import KeyPool, parse_keys
+from src.utils.config import config
+
+
+def test_parse_keys_deduplicates_and_falls_back():
+    assert parse_keys(" a, b ,a,, ", "fallback") == ["a", "b"]
+    assert parse_keys("", "fallback") == ["fallback"]
+
+
+def test_least_loaded_key_is_selected():
+    pool = KeyPool(["key-a", "key-b"])
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+    pool.release(first)
+    assert pool.select() is first
+
+
+def test_rate_limited_key_is_quarantined_for_retry_after():
+    pool = KeyPool(["key-a", "key-b"])
+    key_a, key_b = pool.keys
+    pool.record_failure(key_a, 429, retry_after=60)
+
+    assert key_a.quarantined_until > 0
+    assert [pool.select() for _ in range(3)] == [key_b] * 3
+    assert pool.has_alternative(key_a)
+    assert not pool.has_alternative(key_b)
+
+
+def test_auth_error_quarantines_for_long(monkeypatch):
+    monkeypatch.setattr(config, "KEY_AUTH_QUARANTINE_SECONDS", 3600)
+    monkeypatch.setattr(config, "KEY_QUARANTINE_SECONDS", 30)
+    pool = KeyPool(["key-a", "key-b"])
+    key_a, key_b = pool.keys
+    pool.record_failure(key_a, 401)
+    pool.record_failure(key_b, 429)
+
+    assert key_a.quarantined_until - key_b.quarantined_until > 3000
+    # Все ключи в карантине - берем тот, что освободится раньше
+    assert pool.select() is key_b
+
+
+def test_other_errors_do_not_quarantine():
+    pool = KeyPool(["key-a", "key-b"])
+    pool.record_failure(pool.keys[0], 500)
+    pool.record_failure(pool.keys[0], None)
+    assert pool.keys[0].quarantined_until == 0.0
+
+
+def test_single_key_is_never_quarantined():
+    pool = KeyPool(["only"])
+    key = pool.keys[0]
+    pool.record_failure(key, 429, retry_after=60)
+
+    assert key.quarantined_until == 0.0
+    assert pool.select() is key
+    # Повторять не на чем - перед повтором нужна пауза
+    assert not pool.has_alternative(key)
+
+
+def test_remaining_quota_breaks_ties():
+    pool = KeyPool(["key-a", "key-b"])
+    key_a, key_b = pool.keys
+    pool.record_success(key_a, {"x-ratelimit-remaining": "5"})
+    pool.record_success(key_b, {"x-ratelimit-remaining": "500"})
+    assert pool.select() is key_b
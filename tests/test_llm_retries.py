@@ -0,0 +1,77 @@
+"""Повторы запросов к OpenRouter при 429 (мок OpenRouter)."""
+
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.mock_openrouter import MockOpenRouter, ModelProfile
+from src.utils.config import config
+
+RETRY_AFTER = 1.0
+MESSAGES = [{"role": "user", "content": "Посоветуй аниме"}]
+
+
+async def serve_after_first_429(mock: MockOpenRouter) -> None:
+    """Первый запрос получает 429, следующие - обычный ответ."""
+    while mock.stats.by_outcome.get("429", 0) < 1:
+        await asyncio.sleep(0.01)
+    mock.default = ModelProfile()
+
+
+@pytest.fixture
+async def make_service():
+    """Создает LLMService, который ходит в мок; пулы закрываются после теста."""
+    from src.services.llm_service import LLMService
+
+    services = []
+
+    def factory(mock: MockOpenRouter) -> LLMService:
+        service = LLMService()
+        # Повторы делает сам сервис, а не клиент openai
+        service.client = service.client.with_options(base_url=mock.base_url, max_retries=0)
+        service.retry_delays = 0.01
+        services.append(service)
+        return service
+
+    yield factory
+    for service in services:
+        await service.shutdown()
+
+
+async def test_single_key_waits_retry_after(make_service):
+    profile = ModelProfile(rate_429=1.0, retry_after=RETRY_AFTER)
+    async with MockOpenRouter(default=profile) as mock:
+        service = make_service(mock)
+        switch = asyncio.create_task(serve_after_first_429(mock))
+
+        started = time.monotonic()
+        content, _ = await service._make_api_request(MESSAGES)
+        elapsed = time.monotonic() - started
+        await switch
+
+    assert content
+    assert mock.stats.requests == 2
+    # Повторять не на чем - пауза не короче Retry-After
+    assert elapsed >= RETRY_AFTER
+    assert service.keys.keys[0].quarantined_until == 0.0
+
+
+async def test_rate_limited_key_is_replaced_without_waiting(make_service, monkeypatch):
+    monkeypatch.setattr(config, "OPENROUTER_API_KEYS", "key-a,key-b")
+    profile = ModelProfile(rate_429=1.0, retry_after=30)
+    async with MockOpenRouter(default=profile) as mock:
+        service = make_service(mock)
+        switch = asyncio.create_task(serve_after_first_429(mock))
+
+        started = time.monotonic()
+        content, _ = await service._make_api_request(MESSAGES)
+        elapsed = time.monotonic() - started
+        await switch
+
+    assert content
+    assert mock.stats.requests == 2
+    # Повтор сразу с другим ключом, первый - в карантине на Retry-After
+    assert elapsed < 5
+    limited = [key for key in service.keys.keys if key.quarantined_until > time.monotonic() + 20]
+    assert len(limited) == 1
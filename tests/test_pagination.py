@@ -0,0 +1,110 @@
+"""Пагинация: callback_data кнопок, вытеснение сессий и проверка владельца."""
+
+import pytest
+
+from src.services.pagination_service import (
+    ACTION_CLOSE,
+    ACTION_INFO,
+    PaginationService,
+    encode_callback,
+    parse_callback,
+)
+
+ITEMS = [{"title": f"Аниме {number}", "year": 2000 + number} for number in range(7)]
+
+
+@pytest.mark.parametrize("action", [1, 12, ACTION_INFO, ACTION_CLOSE])
+def test_callback_round_trip(action):
+    data = encode_callback("AbC-12_x", action)
+    assert parse_callback(data) == ("AbC-12_x", str(action))
+
+
+@pytest.mark.parametrize("data", [
+    # Формат до сессий пагинации - кнопки в старых сообщениях
+    "page_3",
+    "pg:abc",
+    "pg::2",
+    "other:abc:2",
+    "pg:abc:2:extra",
+])
+def test_unknown_callback_is_ignored(data):
+    assert parse_callback(data) is None
+
+
+def test_callback_data_limit():
+    with pytest.raises(ValueError):
+        encode_callback("s" * 64, 1)
+
+
+async def test_pages_are_rendered_once_and_cached():
+    service = PaginationService(ttl_seconds=600, max_sessions=10, max_bytes=10**6)
+    state = await service.create_pagination(1, ITEMS, items_per_page=3)
+    assert state.total_pages == 3
+
+    first = await service.render_page(state.session_id, 2, user_id=1)
+    assert first.page == 2
+    assert "Аниме 3" in first.text
+    assert await service.render_page(state.session_id, 2, user_id=1) is first
+    # Номер страницы приводится к допустимому диапазону
+    assert (await service.render_page(state.session_id, 99, user_id=1)).page == 3
+
+
+async def test_least_recent_session_is_evicted():
+    service = PaginationService(ttl_seconds=600, max_sessions=2, max_bytes=10**6)
+    first = await service.create_pagination(1, ITEMS)
+    second = await service.create_pagination(2, ITEMS)
+    # Обращение к первой сессии делает второй самой давней
+    await service.render_page(first.session_id, 1, user_id=1)
+    third = await service.create_pagination(3, ITEMS)
+
+    assert list(service.pagination_states) == [first.session_id, third.session_id]
+    assert await service.render_page(second.session_id, 1, user_id=2) is None
+
+
+async def test_memory_limit_keeps_new_session():
+    service = PaginationService(ttl_seconds=600, max_sessions=10, max_bytes=1)
+    old = await service.create_pagination(1, ITEMS)
+    new = await service.create_pagination(2, ITEMS, prerender=True)
+
+    # Новая сессия больше лимита, но пользователю нужна именно она
+    assert list(service.pagination_states) == [new.session_id]
+    assert old.session_id not in service.pagination_states
+    assert service.total_bytes == new.size_bytes
+
+
+async def test_drop_rendered_frees_memory():
+    service = PaginationService(ttl_seconds=600, max_sessions=10, max_bytes=10**6)
+    state = await service.create_pagination(1, ITEMS, prerender=True)
+    rendered_bytes = service.total_bytes
+
+    service.drop_rendered(state.session_id)
+    assert service.total_bytes < rendered_bytes
+    assert state.rendered_pages == [None] * state.total_pages
+
+    # Страница отрисовывается заново при просмотре
+    assert (await service.render_page(state.session_id, 1, user_id=1)).page == 1
+    await service.clear_pagination(state.session_id)
+    assert service.total_bytes == 0
+
+
+async def test_expired_session_is_dropped():
+    service = PaginationService(ttl_seconds=0, max_sessions=10, max_bytes=10**6)
+    state = await service.create_pagination(1, ITEMS)
+    state.last_access -= 1
+
+    assert await service.render_page(state.session_id, 1, user_id=1) is None
+    assert service.pagination_states == {}
+
+
+async def test_only_owner_can_use_session():
+    service = PaginationService(ttl_seconds=600, max_sessions=10, max_bytes=10**6)
+    state = await service.create_pagination(1, ITEMS)
+
+    assert await service.render_page(state.session_id, 2, user_id=2) is None
+    assert await service.get_total_pages(state.session_id, user_id=2) == 0
+    assert not await service.clear_pagination(state.session_id, user_id=2)
+    assert state.session_id in service.pagination_states
+
+    assert await service.get_total_pages(state.session_id, user_id=1) == 3
+    assert await service.clear_pagination(state.session_id, user_id=1)
+    assert state.session_id not in service.pagination_states
@@ -0,0 +1,108 @@
+"""
+Дообработка принятых обновлений при остановке в режимах webhook и пула процессов.
+
+OpenRouter (мок) не отвечает дольше времени остановки: без сокращения
+дедлайнов обработчики отменялись бы посреди запроса и ответы терялись.
+Проверяется, что каждое сообщение получает ровно один ответ до того, как
+время остановки истечет.
+"""
+
+import asyncio
+import time
+
+import aiohttp
+import pytest
+
+from benchmarks.check_rolling_restart import MockBotAPI
+from benchmarks.mock_openrouter import MockOpenRouter, ModelProfile
+from benchmarks.telegram_stub import make_stub_bot, message_update
+from src.utils.config import config
+
+MESSAGES = 4
+DRAIN_TIMEOUT = 8.0
+
+# Запрос к LLM "висит" дольше времени остановки (но не дольше, чтобы мок
+# быстро остановился: aiohttp ждет завершения обработчиков)
+HANGING = ModelProfile(rate_timeout=1.0, timeout_seconds=DRAIN_TIMEOUT + 2)
+
+
+def make_updates(count: int):
+    """Сообщения разных пользователей с уникальным текстом (мимо кэша ответов)."""
+    return [
+        message_update(update_id, 5000 + update_id, f"Посоветуй аниме на вечер #{update_id}")
+        for update_id in range(1, count + 1)
+    ]
+
+
+async def wait_for(condition, timeout: float) -> None:
+    """Ждать выполнения условия, иначе - ошибка теста."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition was not met in time"
+        await asyncio.sleep(0.05)
+
+
+@pytest.fixture(scope="module")
+def dispatcher():
+    """Диспетчер бота (роутеры подключаются к диспетчеру один раз за процесс)."""
+    from src.bot import create_dispatcher
+
+    return create_dispatcher()
+
+
+async def test_webhook_stop_answers_in_flight_updates(dispatcher):
+    from src.services.delivery_service import delivery_service
+    from src.services.llm_service import llm_service
+    from src.utils.webhook_server import WebhookServer
+
+    bot = make_stub_bot()
+    async with MockOpenRouter(default=HANGING) as mock:
+        llm_service.client = llm_service.client.with_options(base_url=mock.base_url, max_retries=0)
+        server = WebhookServer(bot, dispatcher, path="/webhook", secret="", workers=MESSAGES)
+        await dispatcher.emit_startup(bot=bot, dispatcher=dispatcher)
+        await server.start("127.0.0.1", 0)
+        port = server._runner.addresses[0][1]
+        try:
+            async with aiohttp.ClientSession() as session:
+                for update in make_updates(MESSAGES):
+                    async with session.post(f"http://127.0.0.1:{port}/webhook", json=update) as response:
+                        assert response.status == 200
+            await wait_for(lambda: mock.stats.requests >= MESSAGES, timeout=30)
+
+            started = time.monotonic()
+            await server.stop(drain_timeout=DRAIN_TIMEOUT)
+            stop_seconds = time.monotonic() - started
+        finally:
+            await dispatcher.emit_shutdown(bot=bot, dispatcher=dispatcher)
+            await delivery_service.close()
+
+    # Обработчики завершились сами (ответ об ошибке), а не отменены по таймауту
+    assert stop_seconds < DRAIN_TIMEOUT
+    assert server.stats["processed"] == MESSAGES
+    assert bot.session.sent_messages == MESSAGES
+
+
+async def test_worker_pool_stop_answers_in_flight_updates(monkeypatch):
+    from src.utils.worker_pool import WorkerPool
+
+    async with MockOpenRouter(default=HANGING) as mock, MockBotAPI() as tg:
+        # Воркеры - отдельные процессы: настройки получают через окружение
+        monkeypatch.setenv("TELEGRAM_API_URL", tg.base_url)
+        monkeypatch.setenv("OPENROUTER_BASE_URL", mock.base_url)
+        monkeypatch.setenv("SHUTDOWN_DRAIN_TIMEOUT", str(DRAIN_TIMEOUT))
+        monkeypatch.setattr(config, "SHUTDOWN_DRAIN_TIMEOUT", DRAIN_TIMEOUT)
+
+        pool = WorkerPool(processes=2, concurrency=MESSAGES)
+        await pool.start()
+        try:
+            updates = make_updates(MESSAGES)
+            for update in updates:
+                await pool.dispatch(update)
+            await wait_for(lambda: mock.stats.requests >= MESSAGES, timeout=60)
+        finally:
+            await pool.stop()
+
+        chats = [update["message"]["chat"]["id"] for update in updates]
+        assert [len(tg.replies.get(chat_id, [])) for chat_id in chats] == [1] * MESSAGES
+        # Воркеры вышли сами, фронту не пришлось их завершать
+        assert [process.exitcode for process in pool._processes] == [0, 0]
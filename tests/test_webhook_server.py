@@ -0,0 +1,79 @@
+"""Прием обновлений webhook сервером: коды ответов и устойчивость воркеров."""
+
+import asyncio
+
+import aiohttp
+import pytest
+
+from benchmarks.telegram_stub import make_stub_bot, message_update
+from src.utils.webhook_server import SECRET_HEADER, WebhookServer
+
+SECRET = "webhook-secret"
+
+
+@pytest.fixture
+async def webhook():
+    """Запущенный сервер на свободном порту; обновления складываются в список."""
+    handled = []
+
+    async def update_handler(update):
+        if update.get("update_id") == 0:
+            raise RuntimeError("handler failed")
+        handled.append(update)
+
+    server = WebhookServer(
+        make_stub_bot(), dispatcher=None, path="/webhook", secret=SECRET,
+        queue_size=10, workers=1, update_handler=update_handler
+    )
+    await server.start("127.0.0.1", 0)
+    port = server._runner.addresses[0][1]
+    async with aiohttp.ClientSession(
+        base_url=f"http://127.0.0.1:{port}", headers={SECRET_HEADER: SECRET}
+    ) as session:
+        yield server, session, handled
+    await server.stop(drain_timeout=1)
+
+
+async def test_update_is_queued_and_handled(webhook):
+    server, session, handled = webhook
+    update = message_update(1, 100, "привет")
+    async with session.post("/webhook", json=update) as response:
+        assert response.status == 200
+
+    await asyncio.wait_for(server.queue.join(), timeout=5)
+    assert handled == [update]
+    assert server.stats["accepted"] == 1
+
+
+@pytest.mark.parametrize("body", [b"{not json", b"\xff\xfe", b"[1, 2]", b'"update"', b"null"])
+async def test_malformed_body_is_rejected(webhook, body):
+    server, session, handled = webhook
+    async with session.post("/webhook", data=body) as response:
+        assert response.status == 400
+    assert server.stats["accepted"] == 0
+
+
+async def test_wrong_secret_is_rejected(webhook):
+    server, session, handled = webhook
+    update = message_update(1, 100, "привет")
+    async with session.post("/webhook", json=update, headers={SECRET_HEADER: "wrong"}) as response:
+        assert response.status == 401
+    assert server.stats["accepted"] == 0
+
+
+async def test_worker_survives_handler_error(webhook):
+    server, session, handled = webhook
+    for update_id in (0, 1):
+        async with session.post("/webhook", json=message_update(update_id, 100, "привет")) as response:
+            assert response.status == 200
+
+    await asyncio.wait_for(server.queue.join(), timeout=5)
+    assert [update["update_id"] for update in handled] == [1]
+
+
+async def test_stopped_server_asks_to_retry(webhook):
+    server, session, handled = webhook
+    server._accepting = False
+    async with session.post("/webhook", json=message_update(1, 100, "привет")) as response:
+        assert response.status == 503
+        assert response.headers["Retry-After"] == "1"